@@ -1,36 +1,85 @@
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
 from dotenv import load_dotenv
 
+from app.config.db_metrics import TimedQueuePool, TimedAsyncAdaptedQueuePool, instrument_engine
+
 # Load environment variables
 load_dotenv()
 
 # Database URL from environment variable
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-# Create SQLAlchemy engine
-engine = create_engine(DATABASE_URL)
+# Async driver URL, derived from DATABASE_URL unless set explicitly
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or make_url(DATABASE_URL).set(drivername="postgresql+asyncpg")
+
+# Pool settings of the primary engines; pre-ping and recycle drop connections
+# the server or a proxy closed while they sat idle in the pool
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 60 * 30))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+pool_settings = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT,
+    "pool_recycle": DB_POOL_RECYCLE,
+    "pool_pre_ping": DB_POOL_PRE_PING,
+}
+
+# Generated chat SQL gets its own pool so analytics bursts cannot starve the
+# CRUD routers; point CHAT_DATABASE_URL at a read replica to move it off the primary
+CHAT_DATABASE_URL = make_url(os.getenv("CHAT_DATABASE_URL") or ASYNC_DATABASE_URL).set(drivername="postgresql+asyncpg")
+CHAT_USES_REPLICA = CHAT_DATABASE_URL != make_url(ASYNC_DATABASE_URL).set(drivername="postgresql+asyncpg")
+CHAT_DB_POOL_SIZE = int(os.getenv("CHAT_DB_POOL_SIZE", 5))
+CHAT_DB_MAX_OVERFLOW = int(os.getenv("CHAT_DB_MAX_OVERFLOW", 5))
+CHAT_DB_POOL_TIMEOUT = float(os.getenv("CHAT_DB_POOL_TIMEOUT", 10))
+CHAT_DB_CONNECT_TIMEOUT = float(os.getenv("CHAT_DB_CONNECT_TIMEOUT", 5))
+
+# Sync engine for startup DDL and command line scripts
+engine = create_engine(DATABASE_URL, poolclass=TimedQueuePool, **pool_settings)
 
-# Test the DB connection
-try:
-    with engine.connect() as connection:
-        connection.execute(text("SELECT 1"))
-        print("✅ Database connected successfully")
-except Exception as e:
-    print("❌ Database connection failed:", e)
+# Async engine used by the request handlers, so queries never block the event loop
+async_engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=TimedAsyncAdaptedQueuePool, **pool_settings)
+
+# Read-only engine for chat analytics
+chat_engine = create_async_engine(
+    CHAT_DATABASE_URL,
+    poolclass=TimedAsyncAdaptedQueuePool,
+    pool_size=CHAT_DB_POOL_SIZE,
+    max_overflow=CHAT_DB_MAX_OVERFLOW,
+    pool_timeout=CHAT_DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+    connect_args={
+        "timeout": CHAT_DB_CONNECT_TIMEOUT,
+        "server_settings": {"default_transaction_read_only": "on"},
+    },
+)
+
+instrument_engine("primary", engine)
+instrument_engine("primary_async", async_engine)
+instrument_engine("chat", chat_engine)
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+ChatSessionLocal = async_sessionmaker(chat_engine, autoflush=False, expire_on_commit=False)
 
 # Create Base class for our models
 Base = declarative_base()
 
 # Dependency to get database session
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Dependency to get a read-only session for generated chat SQL
+async def get_chat_db():
+    async with ChatSessionLocal() as db:
         yield db
-    finally:
-        db.close()
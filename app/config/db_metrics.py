@@ -0,0 +1,199 @@
+from collections import deque
+from typing import Dict
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+load_dotenv()
+
+# Per-process database instrumentation: checkout waits are timed inside the
+# pool, connections in use come from pool events and statement durations from
+# cursor events. Statements slower than DB_SLOW_QUERY_MS are kept as samples.
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", 500))
+DB_SLOW_QUERY_SAMPLES = int(os.getenv("DB_SLOW_QUERY_SAMPLES", 20))
+DB_DURATION_WINDOW = int(os.getenv("DB_DURATION_WINDOW", 1000))
+SLOW_QUERY_MAX_CHARS = 1000
+
+class PoolStats:
+    """Checkout wait counters of one connection pool, kept per process"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def record(self, wait_seconds: float, timed_out: bool = False):
+        with self.lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_seconds += wait_seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            attempts = self.checkouts + self.timeouts
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": 1000 * self.wait_seconds / attempts if attempts else 0.0,
+                "max_wait_ms": 1000 * self.max_wait_seconds,
+            }
+
+class TimedPoolMixin:
+    # _do_get is where QueuePool blocks for a free connection, so timing it
+    # gives the checkout wait without the connect time of new connections
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - start)
+        return connection
+
+class TimedQueuePool(TimedPoolMixin, QueuePool):
+    pass
+
+class TimedAsyncAdaptedQueuePool(TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+class EngineStats:
+    """Connections in use and statement durations of one engine"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_use = 0
+        self.reset()
+
+    def reset(self):
+        # Connections currently checked out stay counted
+        with self.lock:
+            self.peak_in_use = self.in_use
+            self.statements = 0
+            self.errors = 0
+            self.total_seconds = 0.0
+            self.max_seconds = 0.0
+            self.durations = deque(maxlen=DB_DURATION_WINDOW)
+            self.slow_queries = deque(maxlen=DB_SLOW_QUERY_SAMPLES)
+
+    def checked_out(self):
+        with self.lock:
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+    def checked_in(self):
+        with self.lock:
+            self.in_use = max(self.in_use - 1, 0)
+
+    def record_statement(self, statement: str, seconds: float):
+        with self.lock:
+            self.statements += 1
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+            self.durations.append(seconds)
+            if 1000 * seconds >= DB_SLOW_QUERY_MS:
+                self.slow_queries.append({
+                    "statement": statement[:SLOW_QUERY_MAX_CHARS],
+                    "duration_ms": 1000 * seconds,
+                    "at": time.time(),
+                })
+
+    def record_error(self):
+        with self.lock:
+            self.errors += 1
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            durations = sorted(self.durations)
+            percentile = lambda p: 1000 * durations[min(int(p * len(durations)), len(durations) - 1)] if durations else 0.0
+            return {
+                "in_use": self.in_use,
+                "peak_in_use": self.peak_in_use,
+                "statements": self.statements,
+                "errors": self.errors,
+                "avg_ms": 1000 * self.total_seconds / self.statements if self.statements else 0.0,
+                "p50_ms": percentile(0.5),
+                "p95_ms": percentile(0.95),
+                "max_ms": 1000 * self.max_seconds,
+                "slow_queries": list(self.slow_queries),
+            }
+
+# name -> (engine, stats); the pool is read from the engine each time since dispose() replaces it
+registered_engines = {}
+
+def instrument_engine(name: str, engine):
+    """Track pool usage and statement timing of `engine` (sync or async) under `name`"""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    stats = EngineStats()
+    registered_engines[name] = (sync_engine, stats)
+
+    @event.listens_for(sync_engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        stats.checked_out()
+
+    @event.listens_for(sync_engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        stats.checked_in()
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info["query_start_time"].pop()
+        # Server-side cursors do their work while rows are fetched; the caller records those
+        if context is None or not context.execution_options.get("stream_results"):
+            stats.record_statement(statement, time.perf_counter() - start)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def on_error(context):
+        starts = context.connection.info.get("query_start_time") if context.connection is not None else None
+        if starts:
+            starts.pop()
+        stats.record_error()
+
+def record_streamed_statement(name: str, statement: str, seconds: float):
+    """Record a statement read through a server-side cursor, from execute to last fetch"""
+    if name in registered_engines:
+        registered_engines[name][1].record_statement(statement, seconds)
+
+def get_pool_stats(pool) -> Dict:
+    capacity = pool.size() + pool._max_overflow if pool._max_overflow >= 0 else None
+    stats = {
+        "size": pool.size(),
+        "max_overflow": pool._max_overflow,
+        "timeout_seconds": pool.timeout(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "saturation": pool.checkedout() / capacity if capacity else 0.0,
+    }
+    if isinstance(pool, TimedPoolMixin):
+        stats.update(pool.stats.snapshot())
+    return stats
+
+def get_all_pool_stats() -> Dict:
+    return {name: get_pool_stats(engine.pool) for name, (engine, _) in registered_engines.items()}
+
+def get_all_statement_stats() -> Dict:
+    return {name: stats.snapshot() for name, (_, stats) in registered_engines.items()}
+
+def reset_db_metrics():
+    for engine, stats in registered_engines.values():
+        stats.reset()
+        if isinstance(engine.pool, TimedPoolMixin):
+            engine.pool.stats = PoolStats()
@@ -0,0 +1,117 @@
+from collections import OrderedDict
+from typing import Dict, Optional
+import hashlib
+import os
+import re
+import threading
+
+import numpy as np
+from dotenv import load_dotenv
+from redis.exceptions import RedisError
+
+from app.config.redis_client import redis_client
+
+load_dotenv()
+
+EMBEDDING_CACHE_LOCAL_SIZE = int(os.getenv("EMBEDDING_CACHE_LOCAL_SIZE", 2048))
+EMBEDDING_CACHE_TTL_SECONDS = int(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", 60 * 60 * 24 * 30))
+
+def normalize_query(query: str) -> str:
+    query = re.sub(r"\s+", " ", query.strip().lower())
+    return query.rstrip("?.! ")
+
+class EmbeddingCache:
+    """Two-tier query embedding cache: an in-process LRU in front of Redis.
+
+    Entries are keyed by a hash of the normalized query text and stored as
+    raw float32 bytes, one Redis key per entry so each expires on its own
+    EMBEDDING_CACHE_TTL_SECONDS after it was written. Counters are kept per process.
+    """
+
+    def __init__(self, model_name: str, local_size: int = EMBEDDING_CACHE_LOCAL_SIZE):
+        self.redis_prefix = f"embedding_cache:{model_name}:"
+        self.local_size = local_size
+        self.local = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"local_hits": 0, "redis_hits": 0, "misses": 0, "embed_seconds": 0.0}
+
+    @staticmethod
+    def text_key(text: str) -> str:
+        return hashlib.sha1(normalize_query(text).encode()).hexdigest()
+
+    def redis_key(self, key: str) -> str:
+        return self.redis_prefix + key
+
+    def _remember(self, key: str, embedding: np.ndarray):
+        with self.lock:
+            self.local[key] = embedding
+            self.local.move_to_end(key)
+            while len(self.local) > self.local_size:
+                self.local.popitem(last=False)
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        key = self.text_key(text)
+        with self.lock:
+            embedding = self.local.get(key)
+            if embedding is not None:
+                self.local.move_to_end(key)
+                self.stats["local_hits"] += 1
+                return embedding
+
+        try:
+            raw = redis_client.get(self.redis_key(key))
+        except RedisError as e:
+            print(f"Error reading embedding cache: {e}")
+            raw = None
+        if raw is None:
+            return None
+
+        embedding = np.frombuffer(raw, dtype=np.float32)
+        self._remember(key, embedding)
+        with self.lock:
+            self.stats["redis_hits"] += 1
+        return embedding
+
+    def contains(self, text: str) -> bool:
+        key = self.text_key(text)
+        with self.lock:
+            if key in self.local:
+                return True
+        try:
+            return bool(redis_client.exists(self.redis_key(key)))
+        except RedisError as e:
+            print(f"Error reading embedding cache: {e}")
+            return False
+
+    def put(self, text: str, embedding: np.ndarray, embed_seconds: float = 0.0, warmup: bool = False):
+        """Store a freshly computed embedding; `embed_seconds` is what the remote call took"""
+        key = self.text_key(text)
+        embedding = np.asarray(embedding, dtype=np.float32)
+        self._remember(key, embedding)
+        if not warmup:
+            with self.lock:
+                self.stats["misses"] += 1
+                self.stats["embed_seconds"] += embed_seconds
+
+        try:
+            redis_client.set(self.redis_key(key), embedding.tobytes(), ex=EMBEDDING_CACHE_TTL_SECONDS)
+        except RedisError as e:
+            print(f"Error writing embedding cache: {e}")
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            stats = dict(self.stats)
+            local_entries = len(self.local)
+        hits = stats["local_hits"] + stats["redis_hits"]
+        lookups = hits + stats["misses"]
+        avg_embed_ms = 1000 * stats["embed_seconds"] / stats["misses"] if stats["misses"] else 0.0
+        return {
+            "local_entries": local_entries,
+            "local_hits": stats["local_hits"],
+            "redis_hits": stats["redis_hits"],
+            "misses": stats["misses"],
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "avg_embed_ms": avg_embed_ms,
+            # Estimated from the average latency of the remote calls that did happen
+            "saved_ms": hits * avg_embed_ms,
+        }
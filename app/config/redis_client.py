@@ -1,4 +1,5 @@
 import redis
+import redis.asyncio as aioredis
 import os
 from dotenv import load_dotenv
 
@@ -7,9 +8,26 @@ load_dotenv()
 REDIS_HOST = os.getenv("REDIS_HOST")
 REDIS_PORT = os.getenv("REDIS_PORT")
 REDIS_PASSWORD = os.getenv("REDIS_PASSWORD")
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 100))
+# How long a coroutine waits for a free pooled connection before failing
+REDIS_POOL_TIMEOUT_SECONDS = float(os.getenv("REDIS_POOL_TIMEOUT_SECONDS", 5))
+# The blocking client still runs inside some request handlers (the embedding
+# cache), so an unreachable Redis must fail fast
+REDIS_SOCKET_TIMEOUT_SECONDS = float(os.getenv("REDIS_SOCKET_TIMEOUT_SECONDS", 1))
 CHAT_TTL_SECONDS = 60 * 30
 
-redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0, password=REDIS_PASSWORD)
+redis_client = redis.Redis(
+    host=REDIS_HOST, port=REDIS_PORT, db=0, password=REDIS_PASSWORD,
+    socket_timeout=REDIS_SOCKET_TIMEOUT_SECONDS, socket_connect_timeout=REDIS_SOCKET_TIMEOUT_SECONDS,
+)
+
+# Shared pool for coroutines; never call the blocking client from the event loop.
+# When all connections are busy, callers wait for one instead of getting an error.
+async_redis_pool = aioredis.BlockingConnectionPool(
+    host=REDIS_HOST, port=REDIS_PORT, db=0, password=REDIS_PASSWORD,
+    max_connections=REDIS_MAX_CONNECTIONS, timeout=REDIS_POOL_TIMEOUT_SECONDS,
+)
+async_redis_client = aioredis.Redis(connection_pool=async_redis_pool)
 
 def get_redis_client():
-    return redis_client
\ No newline at end of file
+    return redis_client
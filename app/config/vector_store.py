@@ -2,26 +2,46 @@ import os
 import chromadb
 from chromadb.utils.embedding_functions import OpenAIEmbeddingFunction
 from dotenv import load_dotenv
-from typing import List, Dict
+from typing import List, Dict, Optional
+import numpy as np
+import re
+import sys
+import threading
+import time
+
+from app.config.embedding_cache import EmbeddingCache, normalize_query
 
 load_dotenv()
 
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# Hybrid retrieval settings for the in-memory schema index
+KEYWORD_BOOST = float(os.getenv("SCHEMA_KEYWORD_BOOST", "0.2"))
+TABLE_TERM_WEIGHT = 2.0
+COLUMN_TERM_WEIGHT = 1.0
+KEYWORD_STOPWORDS = {"int", "string", "date", "datetime", "text", "float", "enum", "the", "and", "for", "with", "all", "how", "many", "what", "which", "show", "list", "are", "from"}
+
 class VectorStore:
     def __init__(self):
         # Ensure the directory exists
         persist_dir = "./chroma_db"
         os.makedirs(persist_dir, exist_ok=True)
         
-        embedding_fn = OpenAIEmbeddingFunction(
+        self.embedding_fn = OpenAIEmbeddingFunction(
             api_key=os.getenv("OPENAI_API_KEY"),
-            model_name="text-embedding-3-small"
+            model_name=EMBEDDING_MODEL
         )
+        self.embedding_cache = EmbeddingCache(EMBEDDING_MODEL)
 
         # Initialize Chroma client with explicit persistence settings
         self.client = chromadb.PersistentClient(path=persist_dir)
         
         # Create collections
-        self.schema_collection = self._get_or_create_collection("batch_schemas", embedding_fn)
+        self.schema_collection = self._get_or_create_collection("batch_schemas", self.embedding_fn)
+
+        # In-memory retrieval index, loaded from the collection on first search
+        self.index_lock = threading.Lock()
+        self.index_matrix = None
     
     def _get_or_create_collection(self, name: str, embedding_fn=None):
         try:
@@ -71,18 +91,153 @@ class VectorStore:
             print(f"Error getting schemas: {e}")
             return {"ids": [], "documents": [], "metadatas": []}
     
-    def search_schema(self, query: str, n_results: int = 3) -> List[Dict]:
+    def embed_query(self, query: str) -> Optional[np.ndarray]:
+        """Embed a query as a unit-length float32 vector"""
+        cached = self.embedding_cache.get(query)
+        if cached is not None:
+            return cached
+
+        try:
+            start = time.perf_counter()
+            embedding = np.asarray(self.embedding_fn([query])[0], dtype=np.float32)
+            embedding = embedding / (np.linalg.norm(embedding) or 1.0)
+            self.embedding_cache.put(query, embedding, time.perf_counter() - start)
+            return embedding
+        except Exception as e:
+            print(f"Error embedding query: {e}")
+            return None
+
+    def warmup_embeddings(self, queries: List[str], batch_size: int = 100) -> int:
+        """Pre-embed frequent queries in batches so their first real request hits the cache"""
+        pending = list(dict.fromkeys(
+            normalize_query(q) for q in queries if q.strip() and not self.embedding_cache.contains(q)
+        ))
+        for i in range(0, len(pending), batch_size):
+            batch = pending[i:i + batch_size]
+            for query, embedding in zip(batch, self.embedding_fn(batch)):
+                embedding = np.asarray(embedding, dtype=np.float32)
+                self.embedding_cache.put(query, embedding / (np.linalg.norm(embedding) or 1.0), warmup=True)
+        return len(pending)
+
+    def load_index(self):
+        """Load the schema embeddings from Chroma into an in-memory matrix and keyword table"""
+        data = self.schema_collection.get(include=["embeddings", "documents", "metadatas"])
+        if not data["ids"]:
+            data["embeddings"] = np.zeros((0, 0), dtype=np.float32)
+        embeddings = data["embeddings"] if data["embeddings"] is not None else [None] * len(data["ids"])
+
+        # Documents persisted without an embedding are embedded once here
+        missing = [i for i, emb in enumerate(embeddings) if emb is None]
+        if missing:
+            computed = self.embedding_fn([data["documents"][i] for i in missing])
+            embeddings = list(embeddings)
+            for i, emb in zip(missing, computed):
+                embeddings[i] = emb
+
+        matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(data["ids"]), -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        self.index_matrix = matrix / np.where(norms == 0, 1.0, norms)
+        self.index_documents = data["documents"]
+        self.index_metadatas = data["metadatas"]
+
+        # Keyword weights: table name terms count double, every term is IDF weighted
+        term_sets = [self._table_terms(meta) for meta in self.index_metadatas]
+        vocabulary = sorted({term for terms in term_sets for term in terms})
+        self.index_vocabulary = {term: i for i, term in enumerate(vocabulary)}
+        weights = np.zeros((len(term_sets), len(vocabulary)), dtype=np.float32)
+        for row, terms in enumerate(term_sets):
+            for term, weight in terms.items():
+                weights[row, self.index_vocabulary[term]] = weight
+        document_frequency = np.count_nonzero(weights, axis=0)
+        idf = np.log((1 + len(term_sets)) / (1 + document_frequency)) + 1.0
+        self.index_keywords = weights * idf
+        self.index_table_terms = [{term for term, weight in terms.items() if weight >= TABLE_TERM_WEIGHT} for terms in term_sets]
+        print(f"Loaded schema index with {len(self.index_documents)} tables")
+
+    def _ensure_index(self):
+        with self.index_lock:
+            if self.index_matrix is None:
+                self.load_index()
+
+    @staticmethod
+    def _terms(text: str) -> List[str]:
+        terms = []
+        for word in re.findall(r"[a-z]+", text.lower()):
+            if len(word) < 3 or word in KEYWORD_STOPWORDS:
+                continue
+            terms.append(word)
+            # Crude singular form so "batches" matches "batch" and "logs" matches "log"
+            if word.endswith("es") and len(word) > 4:
+                terms.append(word[:-2])
+            if word.endswith("s") and len(word) > 3:
+                terms.append(word[:-1])
+        return terms
+
+    def _table_terms(self, metadata: Dict) -> Dict[str, float]:
+        terms = {term: COLUMN_TERM_WEIGHT for term in self._terms(metadata.get("schema", "").split("Columns:", 1)[-1])}
+        for term in self._terms(metadata["table"].replace("_", " ")):
+            terms[term] = TABLE_TERM_WEIGHT
+        return terms
+
+    def _keyword_scores(self, query: str) -> np.ndarray:
+        query_vector = np.zeros(len(self.index_vocabulary), dtype=np.float32)
+        for term in set(self._terms(query)):
+            if term in self.index_vocabulary:
+                query_vector[self.index_vocabulary[term]] = 1.0
+        return self.index_keywords @ query_vector
+
+    def _top_results(self, scores: np.ndarray, n_results: int) -> List[Dict]:
+        n_results = min(n_results, len(scores))
+        if n_results <= 0:
+            return []
+        top = np.argpartition(-scores, n_results - 1)[:n_results]
+        top = top[np.argsort(-scores[top])]
+        return [{
+            'document': self.index_documents[i],
+            'metadata': self.index_metadatas[i],
+            'distance': float(1.0 - scores[i])
+        } for i in top]
+
+    def search_schema_by_keywords(self, query: str, n_results: int = 3) -> List[Dict]:
+        """Match tables by name without an embedding call; empty when no table is named"""
+        try:
+            self._ensure_index()
+            query_terms = set(self._terms(query))
+            if not any(query_terms & table_terms for table_terms in self.index_table_terms):
+                return []
+            scores = self._keyword_scores(query)
+            matched = int(np.count_nonzero(scores))
+            return self._top_results(scores, min(n_results, matched))
+        except Exception as e:
+            print(f"Error searching schemas by keywords: {e}")
+            return []
+
+    def search_schema(self, query: str, n_results: int = 3, query_embedding: Optional[np.ndarray] = None) -> List[Dict]:
         """Search for relevant schema information"""
         try:
-            results = self.schema_collection.query(
-                query_texts=[query],
-                n_results=n_results
-            )
-            return self._format_results(results)
+            self._ensure_index()
+            if not self.index_documents:
+                return []
+            if query_embedding is None:
+                query_embedding = self.embed_query(query)
+            if query_embedding is None:
+                return []
+
+            # Hybrid score: cosine similarity plus a boost for keyword hits
+            keyword_scores = self._keyword_scores(query)
+            if keyword_scores.max() > 0:
+                keyword_scores = keyword_scores / keyword_scores.max()
+            scores = self.index_matrix @ query_embedding.astype(np.float32) + KEYWORD_BOOST * keyword_scores
+            return self._top_results(scores, n_results)
         except Exception as e:
             print(f"Error searching schemas: {e}")
             return []
 
+    def get_all_schema_results(self) -> List[Dict]:
+        """Every table in the search result format, for prompts that always carry the full schema"""
+        self._ensure_index()
+        return [{'document': document, 'metadata': metadata, 'distance': None} for document, metadata in zip(self.index_documents, self.index_metadatas)]
+
     def _format_results(self, results) -> List[Dict]:
         """Format Chroma results for easier use"""
         formatted = []
@@ -133,7 +288,13 @@ def populate_initial_data():
     vector_store.add_schema_info(
         "batch_tracking",
         "Table: batch_tracking, Columns: id(int), batch_id(FK), location(string), status(enum: MANUFACTURED/IN_TRANSIT/DELIVERED), timestamp(datetime), handled_by(FK)",
-        "Captures real-time tracking of manufacturing batches across various locations. Stores current status and timestamps along with the employee responsible for handling the batch at that point."
+        "Full movement history of manufacturing batches: one row per tracking event with its location, status, timestamp and the employee who handled the batch at that point. Use it for past movements and timelines; for where a batch is now or how many batches currently have a status, use batch_current_status."
+    )
+
+    vector_store.add_schema_info(
+        "batch_current_status",
+        "Table: batch_current_status, Columns: batch_id(FK, one row per batch), tracking_id(int), location(string), status(enum: MANUFACTURED/IN_TRANSIT/DELIVERED), timestamp(datetime), handled_by(FK)",
+        "Current location and status of every batch that has been tracked: the latest batch_tracking event of each batch, kept up to date on every tracking update. Answers where a batch is now, which batches are in transit or delivered, and how many batches currently have each status, without scanning the tracking history."
     )
     
     vector_store.add_schema_info(
@@ -166,6 +327,9 @@ def populate_initial_data():
         "Links assets to vendors that have performed service on them. Useful for tracking maintenance history by vendor, service type, and last known service date. Enables asset lifecycle analysis and vendor performance reporting."
     )
     
+    # Rebuild the in-memory index from the fresh collection
+    vector_store.load_index()
+
     # Verify the data was added
     print("\nVerifying added data...")
     all_data = vector_store.get_all_schemas()
@@ -173,7 +337,13 @@ def populate_initial_data():
     for i, schema_id in enumerate(all_data['ids']):
         print(f"- {schema_id}: {all_data['metadatas'][i]['table']}")
 
-# Call this once when setting up the application
+# Call this once when setting up the application,
+# and `warmup <file>` at deploy time with one frequent query per line
 if __name__ == "__main__":
-    populate_initial_data()
-    print("Vector store populated with initial data!")
\ No newline at end of file
+    if len(sys.argv) == 3 and sys.argv[1] == "warmup":
+        with open(sys.argv[2]) as f:
+            count = vector_store.warmup_embeddings(f.read().splitlines())
+        print(f"Embedded {count} new queries into the embedding cache")
+    else:
+        populate_initial_data()
+        print("Vector store populated with initial data!")
\ No newline at end of file
@@ -1,10 +1,16 @@
+from contextlib import asynccontextmanager
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
 from app.models import models
 from app.config.database import engine
-from app.routers import departments, employees, products, batches, assets, maintenance, vendors, chat
+from app.config.vector_store import vector_store
+from app.routers import departments, employees, products, batches, assets, maintenance, vendors, chat, metrics
+from app.utils.cache_utils import register_result_cache_invalidation
+from app.utils.context_utils import get_encoding
+from app.utils.ingest_utils import tracking_buffer
 
 # Load environment variables
 load_dotenv()
@@ -12,8 +18,25 @@ load_dotenv()
 # Create database tables
 models.Base.metadata.create_all(bind=engine)
 
+# Invalidate cached chat query results whenever a table is written
+register_result_cache_invalidation()
+
+# Load the tokenizer and the schema index before serving, since both are read
+# (or downloaded, or embedded) on first use; write out buffered tracking events
+# before the process exits
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await asyncio.to_thread(get_encoding)
+    try:
+        await asyncio.to_thread(vector_store.load_index)
+    except Exception as e:
+        # Retried on the first chat request, off the event loop
+        print(f"Error loading the schema index: {e}")
+    yield
+    await tracking_buffer.close()
+
 # Create FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Define allowed origins
 origins = [
@@ -29,6 +52,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Include routers
@@ -40,6 +64,7 @@ app.include_router(assets.router)
 app.include_router(maintenance.router)
 app.include_router(vendors.router)
 app.include_router(chat.router)
+app.include_router(metrics.router)
 
 @app.get("/")
 def read_root():
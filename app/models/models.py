@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Date, Float, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, DateTime, Date, Float, ForeignKey, Enum, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
@@ -29,6 +29,7 @@ class Department(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
     head_id = Column(Integer, ForeignKey("employees.id"), nullable=True)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     
     # Relationships
     employees = relationship("Employee", back_populates="department", foreign_keys="Employee.department_id")
@@ -44,6 +45,7 @@ class Employee(Base):
     department_id = Column(Integer, ForeignKey("departments.id"))
     designation = Column(String)
     date_joined = Column(Date, default=func.current_date())
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     
     # Relationships
     department = relationship("Department", back_populates="employees", foreign_keys=[department_id])
@@ -58,6 +60,7 @@ class Product(Base):
     name = Column(String, nullable=False)
     category = Column(String)
     unit_price = Column(Float(10, 2))
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     
     # Relationships
     batches = relationship("Batch", back_populates="product")
@@ -74,11 +77,13 @@ class Batch(Base):
     expiry_date = Column(Date)
     created_by = Column(Integer, ForeignKey("employees.id"))
     created_at = Column(DateTime, default=func.now())
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     
     # Relationships
     product = relationship("Product", back_populates="batches")
     creator = relationship("Employee", back_populates="created_batches")
     tracking_records = relationship("BatchTracking", back_populates="batch")
+    current_status = relationship("BatchCurrentStatus", back_populates="batch", uselist=False)
 
 # Batch Tracking Model
 class BatchTracking(Base):
@@ -94,6 +99,24 @@ class BatchTracking(Base):
     # Relationships
     batch = relationship("Batch", back_populates="tracking_records")
     handler = relationship("Employee", back_populates="handled_trackings")
+
+    # Latest event of a batch, used to maintain batch_current_status
+    __table_args__ = (Index("ix_batch_tracking_batch_id_timestamp", "batch_id", "timestamp"),)
+
+# Latest tracking event of every batch, maintained incrementally from batch_tracking
+class BatchCurrentStatus(Base):
+    __tablename__ = "batch_current_status"
+
+    batch_id = Column(Integer, ForeignKey("batches.id"), primary_key=True)
+    tracking_id = Column(Integer, nullable=False)
+    location = Column(String, nullable=False)
+    status = Column(Enum(BatchStatus), nullable=False, index=True)
+    timestamp = Column(DateTime, nullable=False)
+    handled_by = Column(Integer, ForeignKey("employees.id"))
+
+    # Relationships
+    batch = relationship("Batch", back_populates="current_status")
+    handler = relationship("Employee")
     
 class Asset(Base):
     __tablename__ = "assets"
@@ -108,6 +131,7 @@ class Asset(Base):
     assigned_to = Column(Integer, ForeignKey("employees.id"), nullable=True)
     department_id = Column(Integer, ForeignKey("departments.id"), nullable=True)
     status = Column(Enum(AssetStatus), default=AssetStatus.IN_USE)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     # Relationships
     assigned_employee = relationship("Employee", foreign_keys=[assigned_to])
@@ -127,6 +151,7 @@ class MaintenanceLog(Base):
     assigned_vendor_id = Column(Integer, ForeignKey("vendors.id"), nullable=True)
     created_at = Column(DateTime, default=func.now())
     resolved_date = Column(Date)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     # Relationships
     asset = relationship("Asset", back_populates="maintenance_logs")
@@ -143,6 +168,7 @@ class Vendor(Base):
     email = Column(String, nullable=False)
     phone = Column(String)
     address = Column(String)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     # Relationships
     assets_link = relationship("AssetVendorLink", back_populates="vendor")
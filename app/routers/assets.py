@@ -1,8 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from datetime import date
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Response, UploadFile, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.utils import schemas
 from app.config.database import get_db
 from app.models import models
+from app.utils.import_utils import import_rows
+from app.utils.crud_utils import create_row, update_row, delete_row
+from app.utils.list_utils import ListParams, list_query, get_one, equals, in_range
 
 router = APIRouter(
     prefix="/assets",
@@ -10,58 +16,81 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+# Relationships that can be requested with ?expand=
+EXPANSIONS = {
+    "assigned_employee": schemas.Employee,
+    "department": schemas.Department,
+    "maintenance_logs": schemas.MaintenanceLog,
+    "vendors": schemas.AssetVendorLink,
+}
+
 @router.get("/")
-async def get_assets(db: Session = Depends(get_db)):
-    return db.query(models.Asset).all()
+async def get_assets(
+    response: Response,
+    status: Optional[models.AssetStatus] = None,
+    category: Optional[str] = None,
+    department_id: Optional[int] = None,
+    assigned_to: Optional[int] = None,
+    warranty_from: Optional[date] = None,
+    warranty_to: Optional[date] = None,
+    params: ListParams = Depends(),
+    db: AsyncSession = Depends(get_db)
+):
+    return await list_query(db, models.Asset, params, response, expansions=EXPANSIONS, filters=[
+        equals(models.Asset.status, status),
+        equals(models.Asset.category, category),
+        equals(models.Asset.department_id, department_id),
+        equals(models.Asset.assigned_to, assigned_to),
+        in_range(models.Asset.warranty_until, warranty_from, warranty_to),
+    ])
 
 @router.post("/")
-async def create_asset(asset: schemas.AssetCreate, db: Session = Depends(get_db)):
-    new_asset = models.Asset(**asset.model_dump())
-    db.add(new_asset)
-    db.commit()
-    db.refresh(new_asset)
-    return new_asset
+async def create_asset(asset: schemas.AssetCreate, db: AsyncSession = Depends(get_db)):
+    return await create_row(db, models.Asset, asset.model_dump())
+
+@router.post("/import")
+async def import_assets(
+    file: UploadFile,
+    format: Optional[Literal["csv", "ndjson"]] = Query(None, description="Defaults to the file extension"),
+    atomic: bool = Query(False, description="Save nothing if any row is invalid"),
+    db: AsyncSession = Depends(get_db)
+):
+    return await import_rows(db, file, models.Asset, schemas.AssetCreate, format, atomic)
 
 @router.get("/{asset_id}")
-async def get_asset(asset_id: int, db: Session = Depends(get_db)):
-    asset = db.query(models.Asset).filter(models.Asset.id == asset_id).first()
+async def get_asset(asset_id: int, expand: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+    asset = await get_one(db, models.Asset, asset_id, expand, EXPANSIONS)
     if not asset:
         raise HTTPException(status_code=404, detail="Asset not found")
     return asset
 
 @router.put("/{asset_id}")
-async def update_asset(asset_id: int, asset: schemas.Asset, db: Session = Depends(get_db)):
-    db.query(models.Asset).filter(models.Asset.id == asset_id).update(asset.model_dump())
-    db.commit()
-    updated_asset = db.query(models.Asset).filter(models.Asset.id == asset_id).first()
-    if not updated_asset:
-        raise HTTPException(status_code=404, detail="Asset not found")
-    return updated_asset
+async def update_asset(asset_id: int, asset: schemas.AssetUpdate, db: AsyncSession = Depends(get_db)):
+    return await update_row(db, models.Asset, asset_id, asset.model_dump(exclude={"version"}), asset.version, "Asset")
+
+@router.patch("/{asset_id}")
+async def patch_asset(asset_id: int, asset: schemas.AssetPatch, db: AsyncSession = Depends(get_db)):
+    return await update_row(db, models.Asset, asset_id, asset.model_dump(exclude_unset=True, exclude={"version"}), asset.version, "Asset")
 
 @router.delete("/{asset_id}")
-async def delete_asset(asset_id: int, db: Session = Depends(get_db)):
-    asset = db.query(models.Asset).filter(models.Asset.id == asset_id).first()
-    if not asset:
-        raise HTTPException(status_code=404, detail="Asset not found")
-    
-    db.delete(asset)
-    db.commit()
+async def delete_asset(asset_id: int, version: Optional[int] = None, db: AsyncSession = Depends(get_db)):
+    await delete_row(db, models.Asset, asset_id, version, "Asset")
     return {"message": "Asset deleted successfully"}
 
 
 # ========= Asset Vendor Link ========= #
 @router.get("/{asset_id}/vendor")
-async def get_asset_vendors(asset_id: int, db: Session = Depends(get_db)):
-    links = db.query(models.AssetVendorLink).filter(models.AssetVendorLink.asset_id == asset_id).all()
+async def get_asset_vendors(asset_id: int, db: AsyncSession = Depends(get_db)):
+    links = (await db.scalars(select(models.AssetVendorLink).where(models.AssetVendorLink.asset_id == asset_id))).all()
     return links
 
 @router.post("/{asset_id}/vendor")
-async def add_asset_vendor(asset_id: int, link: schemas.AssetVendorLinkCreate, db: Session = Depends(get_db)):
-    asset = db.query(models.Asset).filter(models.Asset.id == asset_id).first()
+async def add_asset_vendor(asset_id: int, link: schemas.AssetVendorLinkCreate, db: AsyncSession = Depends(get_db)):
+    asset = await db.get(models.Asset, asset_id)
     if not asset:
         raise HTTPException(status_code=404, detail="Asset not found")
 
-    vendor = db.query(models.Vendor).filter(models.Vendor.id == link.vendor_id).first()
+    vendor = await db.get(models.Vendor, link.vendor_id)
     if not vendor:
         raise HTTPException(status_code=404, detail="Vendor not found")
 
@@ -74,6 +103,6 @@ async def add_asset_vendor(asset_id: int, link: schemas.AssetVendorLinkCreate, d
     )
 
     db.add(new_link)
-    db.commit()
-    db.refresh(new_link)
+    await db.commit()
+    await db.refresh(new_link)
     return new_link
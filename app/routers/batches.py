@@ -1,8 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from datetime import date, datetime
+from typing import List, Literal, Optional, Union
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.utils import schemas
 from app.config.database import get_db
 from app.models import models
+from app.utils.crud_utils import create_row, update_row, delete_row
+from app.utils.list_utils import ListParams, list_query, get_one, equals, in_range
+from app.utils.import_utils import to_enum
+from app.utils.ingest_utils import BufferFull, tracking_buffer
+from app.utils.status_utils import STATUS_COLUMNS, record_tracking_events, forget_tracking_event
 
 router = APIRouter(
     prefix="/batches",
@@ -10,84 +18,151 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+# Relationships that can be requested with ?expand=
+EXPANSIONS = {
+    "product": schemas.Product,
+    "creator": schemas.Employee,
+    "tracking_records": schemas.BatchTracking,
+    "current_status": schemas.BatchCurrentStatus,
+}
+TRACKING_EXPANSIONS = {
+    "handler": schemas.Employee,
+}
+
 
 @router.get("/")
-async def get_batches(db: Session = Depends(get_db)):
-    batches = db.query(models.Batch).all()
-    return batches
+async def get_batches(
+    response: Response,
+    product_id: Optional[int] = None,
+    created_by: Optional[int] = None,
+    manufactured_from: Optional[date] = None,
+    manufactured_to: Optional[date] = None,
+    params: ListParams = Depends(),
+    db: AsyncSession = Depends(get_db)
+):
+    return await list_query(db, models.Batch, params, response, expansions=EXPANSIONS, sort_columns=("id", "created_at"), filters=[
+        equals(models.Batch.product_id, product_id),
+        equals(models.Batch.created_by, created_by),
+        in_range(models.Batch.manufactured_date, manufactured_from, manufactured_to),
+    ])
 
 @router.post("/")
-async def create_batch(batch: schemas.BatchCreate, db: Session = Depends(get_db)):
-    new_batch = models.Batch(**batch.model_dump())
-    db.add(new_batch)
-    db.commit()
-    db.refresh(new_batch)
-    return new_batch
+async def create_batch(batch: schemas.BatchCreate, db: AsyncSession = Depends(get_db)):
+    return await create_row(db, models.Batch, batch.model_dump())
 
 @router.get("/{batch_id}")
-async def get_batch(batch_id: int, db: Session = Depends(get_db)):
-    batch = db.query(models.Batch).filter(models.Batch.id == batch_id).first()
+async def get_batch(batch_id: int, expand: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+    batch = await get_one(db, models.Batch, batch_id, expand, EXPANSIONS)
     if not batch:
         raise HTTPException(status_code=404, detail="Batch not found")
     return batch
 
 @router.put("/{batch_id}")
-async def update_batch(batch_id: int, batch: schemas.Batch, db: Session = Depends(get_db)):
-    db.query(models.Batch).filter(models.Batch.id == batch_id).update(batch.model_dump())
-    db.commit()
-    updated_batch = db.query(models.Batch).filter(models.Batch.id == batch_id).first()
-    if not updated_batch:
-        raise HTTPException(status_code=404, detail="Batch not found")
-    return updated_batch
+async def update_batch(batch_id: int, batch: schemas.BatchUpdate, db: AsyncSession = Depends(get_db)):
+    return await update_row(db, models.Batch, batch_id, batch.model_dump(exclude={"version"}), batch.version, "Batch")
+
+@router.patch("/{batch_id}")
+async def patch_batch(batch_id: int, batch: schemas.BatchPatch, db: AsyncSession = Depends(get_db)):
+    return await update_row(db, models.Batch, batch_id, batch.model_dump(exclude_unset=True, exclude={"version"}), batch.version, "Batch")
 
 @router.delete("/{batch_id}")
-async def delete_batch(batch_id: int, db: Session = Depends(get_db)):
-    batch = db.query(models.Batch).filter(models.Batch.id == batch_id).first()
-    if not batch:
-        raise HTTPException(status_code=404, detail="Batch not found")
-    
-    db.delete(batch)
-    db.commit()
+async def delete_batch(batch_id: int, version: Optional[int] = None, db: AsyncSession = Depends(get_db)):
+    await delete_row(db, models.Batch, batch_id, version, "Batch")
     return {"message": "Batch deleted successfully"}
 
 
 # ========== batch tracking ==========
 
+@router.post("/trackings/events")
+async def ingest_tracking_events(
+    events: Union[schemas.TrackingEvent, List[schemas.TrackingEvent]],
+    response: Response,
+    ack: Literal["durable", "buffered"] = "durable",
+):
+    """Buffered ingestion for scanners; ack=durable answers once the events are committed"""
+    events = events if isinstance(events, list) else [events]
+    rows, indexes, rejected = [], [], []
+    for index, event in enumerate(events):
+        row = event.model_dump(exclude_none=True)
+        try:
+            row["status"] = to_enum(models.BatchStatus, row["status"])
+        except ValueError:
+            rejected.append({"index": index, "error": f"status: expected one of {[member.value for member in models.BatchStatus]}"})
+            continue
+        rows.append(row)
+        indexes.append(index)
+
+    try:
+        futures = tracking_buffer.add(rows) if rows else []
+    except BufferFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+    if ack == "buffered":
+        # Accepted into memory only; unknown batches are dropped at flush time
+        response.status_code = 202
+        return {"durable": False, "accepted": len(rows), "rejected": rejected}
+
+    ids = []
+    for index, result in zip(indexes, await asyncio.gather(*futures)):
+        if "id" in result:
+            ids.append({"index": index, "id": result["id"]})
+        else:
+            rejected.append({"index": index, "error": result["error"]})
+    rejected.sort(key=lambda item: item["index"])
+    return {"durable": True, "accepted": len(ids), "ids": ids, "rejected": rejected}
+
 @router.get("/{batch_id}/trackings")
-async def get_batch_trackings(batch_id: int, db: Session = Depends(get_db)):
-    batch = db.query(models.Batch).filter(models.Batch.id == batch_id).first()
+async def get_batch_trackings(
+    batch_id: int,
+    response: Response,
+    status: Optional[models.BatchStatus] = None,
+    handled_by: Optional[int] = None,
+    from_time: Optional[datetime] = None,
+    to_time: Optional[datetime] = None,
+    params: ListParams = Depends(),
+    db: AsyncSession = Depends(get_db)
+):
+    batch = await db.get(models.Batch, batch_id)
     if not batch:
         raise HTTPException(status_code=404, detail="Batch not found")
-    return batch.tracking_records
+    return await list_query(db, models.BatchTracking, params, response, expansions=TRACKING_EXPANSIONS, sort_columns=("id", "timestamp"), filters=[
+        equals(models.BatchTracking.batch_id, batch_id),
+        equals(models.BatchTracking.status, status),
+        equals(models.BatchTracking.handled_by, handled_by),
+        in_range(models.BatchTracking.timestamp, from_time, to_time),
+    ])
 
 @router.post("/{batch_id}/trackings")
-async def create_batch_tracking(batch_id: int, tracking: schemas.BatchTrackingCreate, db: Session = Depends(get_db)):
-    batch = db.query(models.Batch).filter(models.Batch.id == batch_id).first()
+async def create_batch_tracking(batch_id: int, tracking: schemas.BatchTrackingCreate, db: AsyncSession = Depends(get_db)):
+    batch = await db.get(models.Batch, batch_id)
     if not batch:
         raise HTTPException(status_code=404, detail="Batch not found")
     new_tracking = models.BatchTracking(**tracking.model_dump())
     new_tracking.batch = batch
     db.add(new_tracking)
-    db.commit()
-    db.refresh(new_tracking)
+    await db.flush()
+    await db.refresh(new_tracking)
+    await record_tracking_events(db, [{column: getattr(new_tracking, column) for column in ("id", "batch_id", *STATUS_COLUMNS)}])
+    await db.commit()
     return new_tracking
 
 @router.get("/{batch_id}/trackings/{tracking_id}")
-async def get_batch_tracking(batch_id: int, tracking_id: int, db: Session = Depends(get_db)):
-    batch = db.query(models.Batch).filter(models.Batch.id == batch_id).first()
+async def get_batch_tracking(batch_id: int, tracking_id: int, db: AsyncSession = Depends(get_db)):
+    batch = await db.get(models.Batch, batch_id)
     if not batch:
         raise HTTPException(status_code=404, detail="Batch not found")
-    tracking = db.query(models.BatchTracking).filter(models.BatchTracking.id == tracking_id).first()
+    tracking = await db.get(models.BatchTracking, tracking_id)
     if not tracking:
         raise HTTPException(status_code=404, detail="Tracking not found")
     return tracking
 
 @router.delete("/{batch_id}/trackings/{tracking_id}")
-async def delete_batch_tracking(batch_id: int, tracking_id: int, db: Session = Depends(get_db)):
-    tracking = db.query(models.BatchTracking).filter(models.BatchTracking.id == tracking_id).first()
+async def delete_batch_tracking(batch_id: int, tracking_id: int, db: AsyncSession = Depends(get_db)):
+    tracking = await db.get(models.BatchTracking, tracking_id)
     if not tracking:
         raise HTTPException(status_code=404, detail="Tracking not found")
     
-    db.delete(tracking)
-    db.commit()
-    return {"message": "Tracking deleted successfully"}
\ No newline at end of file
+    await forget_tracking_event(db, tracking.id)
+    await db.delete(tracking)
+    await db.commit()
+    return {"message": "Tracking deleted successfully"}
@@ -1,21 +1,52 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from langchain.chat_models import init_chat_model
 from langchain.schema import SystemMessage, HumanMessage, AIMessage
-from sqlalchemy import text
-from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional
+import asyncio
+import asyncpg
 import json
+import os
+import time
 
 from app.utils import schemas
-from app.config.database import get_db
+from app.config.database import get_chat_db, ChatSessionLocal
 from app.config.vector_store import vector_store
-from app.utils.prompt_utils import get_prompt, get_final_rag_prompt
+from app.utils.prompt_utils import get_instructions, get_schema_block, get_final_rag_prompt, get_query_rejected_prompt
+from app.utils.stream_utils import format_sse, JsonFieldStreamer
 from app.utils.redis_utils import get_chat_history, append_to_chat_history, clear_chat_history
+from app.utils.context_utils import build_chat_context, with_token_count, count_static_tokens, LLMUsage, get_llm_stats, reset_llm_stats
+from app.utils.intent_utils import match_intent, record_response, get_intent_stats, reset_intent_stats
+from app.utils.render_utils import choose_renderer, render_components, CHAT_RENDER_MODE
+from app.utils.digest_utils import build_result_digest, dump_digest, attach_result
+from app.utils.chart_utils import prepare_chart_components
+from app.utils.cache_utils import (
+    normalize_query, lookup_cached_plan, store_cached_plan, get_semantic_cache_stats, reset_semantic_cache_stats,
+    get_cached_result, store_cached_result, get_result_cache_stats, reset_result_cache_stats
+)
+from app.utils.sql_utils import (
+    fetch_result_page, stream_result_page, get_page_cache_key, get_next_cursor, resolve_cursor,
+    QueryRejected, CHAT_SQL_MAX_RETRIES
+)
+
+# stream_usage makes streamed replies carry token counts too
+model = init_chat_model("gpt-4.1", model_provider="openai", stream_usage=True)
 
-model = init_chat_model("gpt-4.1", model_provider="openai")
+# "full" sends every table schema so the prompt prefix is identical across
+# questions and can be served from the provider's prompt cache; "retrieved"
+# sends only the tables retrieved for the question (fewer, uncached tokens)
+CHAT_PROMPT_SCHEMA_MODE = os.getenv("CHAT_PROMPT_SCHEMA_MODE", "full")
 
 # Redis: mock user id for now
 user_id = "12334245"
 
+NO_SCHEMA_MESSAGE = "Sorry, I couldn't find any relevant schema information."
+QUERY_REJECTED_MESSAGE = "Sorry, I couldn't answer that within the query limits. Could you narrow it down, for example to a date range or a specific record?"
+# Generated SQL that fails for any other reason; asyncpg errors raised while fetching a page are not wrapped
+QUERY_ERRORS = (SQLAlchemyError, asyncpg.PostgresError)
+
 router = APIRouter(
     prefix="/chat",
     tags=["chat"],
@@ -23,73 +54,313 @@ router = APIRouter(
 )
 
 @router.get("/")
-async def get_chat():
-    chat_history = get_chat_history(user_id)
+async def get_chat(turns: Optional[int] = Query(None, ge=1, description="Only return the last N turns")):
+    chat_history = await get_chat_history(user_id, turns)
     return chat_history
 
+def search_schema(query: str):
+    # Queries naming a table are answered from the keyword index without an embedding call
+    results = vector_store.search_schema_by_keywords(query, n_results=4)
+    if results:
+        return None, results
+
+    query_embedding = vector_store.embed_query(normalize_query(query))
+    results = vector_store.search_schema(query, n_results=4, query_embedding=query_embedding)
+    return query_embedding, results
+
+async def retrieve_schema(query: str):
+    # Embedding and Chroma calls are blocking, keep them off the event loop
+    return await asyncio.to_thread(search_schema, query)
+
+async def build_messages(results: List[dict], query: str):
+    """Prompt messages from the most to the least stable segment, see prompt_utils"""
+    # The index is loaded at startup; should that have failed, loading it here must not block the loop
+    schema_results = await asyncio.to_thread(vector_store.get_all_schema_results) if CHAT_PROMPT_SCHEMA_MODE == "full" else results
+    instructions, schema_block = get_instructions(), get_schema_block(schema_results)
+
+    # Recent turns verbatim within the token budget, older ones as a rolling summary
+    history_messages, context_usage = await build_chat_context(user_id)
+    context_usage["prefix_tokens"] = count_static_tokens(instructions) + count_static_tokens(schema_block)
+
+    messages = [SystemMessage(content=instructions), SystemMessage(content=schema_block), *history_messages, HumanMessage(content=query)]
+    return messages, context_usage
+
+async def invoke_model(messages, llm_usage: LLMUsage, step: str) -> str:
+    start = time.perf_counter()
+    reply = await model.ainvoke(messages)
+    llm_usage.record(step, reply, time.perf_counter() - start)
+    return reply.content
+
+async def replan_query(messages: list, data: dict, rejection: QueryRejected, llm_usage: LLMUsage) -> dict:
+    """Send a rejected query back to the model with its plan summary and parse the new reply"""
+    print(f"Generated SQL rejected: {rejection.reason}")
+    messages += [
+        AIMessage(content=json.dumps(data)),
+        HumanMessage(content=get_query_rejected_prompt(rejection.reason, rejection.plan_summary)),
+    ]
+    return json.loads(await invoke_model(messages, llm_usage, "replan"))
+
+def build_sql_components(data: dict, page: dict):
+    return [
+        {"component": "text", "content": data["text"] if len(page["rows"]) else "Sorry, I couldn't find any relevant information."},
+        {"component": data["component"], "content": page["rows"], "next_cursor": page["next_cursor"]}
+    ]
+
+async def render_answer(query: str, plan: dict, page: dict, rag: bool, render: str, llm_usage: LLMUsage):
+    """Components for a SQL result and the renderer used; with rag they are reshaped locally or by the model"""
+    renderer = choose_renderer(render, query, page) if rag else None
+    if renderer == "local":
+        return render_components(plan, page), renderer
+
+    if renderer == "llm":
+        # Only a statistics digest goes to the model; the rows stay here for the UI
+        digest = dump_digest(build_result_digest(page))
+        reply = json.loads(await invoke_model(get_final_rag_prompt(query, digest, page.get("has_more", False)), llm_usage, "rag"))
+        return attach_result(reply, page), renderer
+    return build_sql_components(plan, page), renderer
+
+async def save_turn(query: str, data, sql: Optional[str] = None, row_count: Optional[int] = None):
+    # Store the chat history in Redis
+    now = time.time()
+    assistant_message = {"role": "assistant", "content": data, "ts": now}
+    if sql:
+        assistant_message.update({"sql": sql, "row_count": row_count})
+    await append_to_chat_history(
+        user_id,
+        with_token_count({"role": "user", "content": query, "ts": now}),
+        with_token_count(assistant_message),
+    )
+
 @router.post("/")
-def chat_response(
+async def chat_response(
     user_input: schemas.ChatQuery,
     rag: bool = Query(False, description="Use RAG-based response"),
-    db: Session = Depends(get_db)
+    render: Literal["auto", "local", "llm"] = Query(CHAT_RENDER_MODE, description="Who builds the RAG components: local renderer, model, or auto"),
+    db: AsyncSession = Depends(get_chat_db)
 ):
-    results = vector_store.search_schema(user_input.query, n_results=4)
-    if not results:
-        return {
-            "response": [{"component": "text", "content": "Sorry, I couldn't find any relevant schema information."}]
-        }
-
-    schema_context = "\n".join([f"{r['metadata']['schema']}, Description: {r['document']}" for r in results])
-
-    prompt = get_prompt(schema_context)
-
-    messages = [SystemMessage(content=prompt)]
-    chat_histoy = get_chat_history(user_id)
-    
-    # Add chat history to messages
-    for message in chat_histoy:
-        if message["role"] == "user":
-            messages.append(HumanMessage(content=message["content"]))
-        elif message["role"] == "assistant":
-            messages.append(AIMessage(content= json.dumps(message["content"])))
-
-    messages.append(HumanMessage(content=user_input.query))
-    response = model.predict_messages(messages).content
-    # print(response)
+    start = time.perf_counter()
+    # Common question shapes are answered from a SQL template, without schema retrieval or the model
+    data = await match_intent(user_input.query)
+    intent = data.pop("intent") if data else None
+
+    query_embedding, results, schema_tables = None, None, []
+    if intent is None:
+        query_embedding, results = await retrieve_schema(user_input.query)
+        if not results:
+            return {
+                "response": [{"component": "text", "content": NO_SCHEMA_MESSAGE}]
+            }
+        schema_tables = [r['metadata']['table'] for r in results]
 
     try:
-        data = json.loads(response)
-        
+        # Repeat questions reuse the cached SQL / component plan and skip the model
+        messages, context_usage, llm_usage = None, None, LLMUsage()
+        if data is None:
+            data = await lookup_cached_plan(user_input.query, query_embedding, schema_tables)
+        cached = data is not None
+        path = "intent" if intent else "cache" if cached else "model"
+        if data is None:
+            messages, context_usage = await build_messages(results, user_input.query)
+            response = await invoke_model(messages, llm_usage, "plan")
+            # print(response)
+
+            data = json.loads(response)
+
+        # Plans over the cost budget go back to the model with their EXPLAIN summary
+        page, retries = None, 0
+        while data['type'] == 'sql' and page is None:
+            try:
+                # Only the first bounded page is read; the rest is reachable via next_cursor
+                page = await fetch_result_page(db, data['sql'])
+            except QueryRejected as e:
+                if retries >= CHAT_SQL_MAX_RETRIES:
+                    data = {"type": "text", "text": QUERY_REJECTED_MESSAGE}
+                    break
+                retries += 1
+                if results is None:
+                    # A template plan was rejected, the model needs the schema after all
+                    query_embedding, results = await retrieve_schema(user_input.query)
+                    schema_tables = [r['metadata']['table'] for r in results]
+                if messages is None:
+                    messages, context_usage = await build_messages(results, user_input.query)
+                data, cached = await replan_query(messages, data, e, llm_usage), False
+
+        sql, row_count, renderer = None, None, None
         if data['type'] == 'sql':
-            result = db.execute(text(data['sql']))
-            rows = result.fetchall()
-            columns = result.keys()
-            result_data = [dict(zip(columns, row)) for row in rows]
-            data = [
-                {"component": "text", "content": data["text"] if len(result_data) else "Sorry, I couldn't find any relevant information."},
-                {"component": data["component"], "content": result_data}
-            ]
-            
-            if rag:
-                rag_prompt = get_final_rag_prompt(user_input.query, data)
-                # print(rag_prompt
-                response = model.predict(text=rag_prompt)
-                data = json.loads(response)
+            if not cached:
+                await store_cached_plan(query_embedding, schema_tables, user_input.query, data)
+            sql, row_count = data['sql'], page["row_count"]
+            data, renderer = await render_answer(user_input.query, data, page, rag, render, llm_usage)
+            # Charts get aggregated points of the whole result instead of raw rows
+            data = await prepare_chart_components(db, data, sql, page)
         else:
             data = [{"component": "text", "content": data["text"]}]
 
-        # Store the chat history in Redis
-        append_to_chat_history(user_id, {"role": "user", "content": user_input.query})
-        append_to_chat_history(user_id, {"role": "assistant", "content": data})
+        await save_turn(user_input.query, data, sql, row_count)
+        record_response(path, time.perf_counter() - start)
         
-        return {"response": data}
+        return {"response": data, "usage": {"context": context_usage, "llm": llm_usage.as_dict(), "intent": intent, "renderer": renderer}}
 
     except json.JSONDecodeError:
         raise HTTPException(status_code=500, detail="Model response could not be parsed as JSON")
+    except QUERY_ERRORS as e:
+        print(f"Generated SQL failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Query failed: {e.__class__.__name__}")
+
+async def stream_chat_events(query: str, rag: bool, render: str = CHAT_RENDER_MODE):
+    """Yield the chat pipeline as SSE events: type, text deltas, row chunks, final components"""
+    start = time.perf_counter()
+    data = await match_intent(query)
+    intent = data.pop("intent") if data else None
+
+    query_embedding, results, schema_tables = None, None, []
+    if intent is None:
+        query_embedding, results = await retrieve_schema(query)
+        if not results:
+            yield format_sse("components", [{"component": "text", "content": NO_SCHEMA_MESSAGE}])
+            yield format_sse("done", {})
+            return
+        schema_tables = [r['metadata']['table'] for r in results]
+
+    try:
+        messages, context_usage, llm_usage = None, None, LLMUsage()
+        if data is None:
+            data = await lookup_cached_plan(query, query_embedding, schema_tables)
+        cached = data is not None
+        path = "intent" if intent else "cache" if cached else "model"
+        if data is None:
+            messages, context_usage = await build_messages(results, query)
+
+            # Forward the "type" and "text" fields of the reply while the model is still writing it
+            type_stream, text_stream = JsonFieldStreamer("type"), JsonFieldStreamer("text")
+            reply_type, response = "", ""
+            model_start, first_token, usage_chunk = time.perf_counter(), None, None
+            async for chunk in model.astream(messages):
+                if first_token is None and chunk.content:
+                    first_token = time.perf_counter() - model_start
+                # Token counts arrive on the last chunk
+                if getattr(chunk, "usage_metadata", None):
+                    usage_chunk = chunk
+                response += chunk.content
+                if not type_stream.done:
+                    reply_type += type_stream.feed(chunk.content)
+                    if type_stream.done:
+                        yield format_sse("type", {"type": reply_type})
+                delta = text_stream.feed(chunk.content)
+                if delta:
+                    yield format_sse("text", {"content": delta})
+
+            llm_usage.record("plan", usage_chunk, time.perf_counter() - model_start, first_token)
+            data = json.loads(response)
+        else:
+            yield format_sse("type", {"type": data["type"]})
+            yield format_sse("text", {"content": data["text"]})
+
+        # A "rejected" event tells the client to drop what it has shown for the rejected query
+        page, retries = None, 0
+        while data['type'] == 'sql' and page is None:
+            cache_key = await get_page_cache_key(data['sql'])
+            page = await get_cached_result(cache_key)
+            if page is not None:
+                yield format_sse("rows", {"component": data["component"], "rows": page["rows"]})
+                break
+            try:
+                # The response outlives request-scoped dependencies, so the stream owns its session
+                page = {"rows": []}
+                async with ChatSessionLocal() as db:
+                    async for rows in stream_result_page(db, data['sql'], 0, page):
+                        page["rows"].extend(rows)
+                        yield format_sse("rows", {"component": data["component"], "rows": rows})
+                await store_cached_result(cache_key, page)
+            except QueryRejected as e:
+                page = None
+                yield format_sse("rejected", {"reason": e.reason})
+                if retries >= CHAT_SQL_MAX_RETRIES:
+                    data = {"type": "text", "text": QUERY_REJECTED_MESSAGE}
+                    break
+                retries += 1
+                if results is None:
+                    query_embedding, results = await retrieve_schema(query)
+                    schema_tables = [r['metadata']['table'] for r in results]
+                if messages is None:
+                    messages, context_usage = await build_messages(results, query)
+                data, cached = await replan_query(messages, data, e, llm_usage), False
+                yield format_sse("type", {"type": data["type"]})
+                yield format_sse("text", {"content": data["text"]})
+
+        sql, row_count, renderer = None, None, None
+        if data['type'] == 'sql':
+            if not cached:
+                await store_cached_plan(query_embedding, schema_tables, query, data)
+            page["next_cursor"] = await get_next_cursor(data['sql'], page)
+            sql, row_count = data['sql'], page["row_count"]
+            data, renderer = await render_answer(query, data, page, rag, render, llm_usage)
+            async with ChatSessionLocal() as db:
+                data = await prepare_chart_components(db, data, sql, page)
+        else:
+            data = [{"component": "text", "content": data["text"]}]
+
+        yield format_sse("components", data)
+        yield format_sse("usage", {"context": context_usage, "llm": llm_usage.as_dict(), "intent": intent, "renderer": renderer})
+        await save_turn(query, data, sql, row_count)
+        record_response(path, time.perf_counter() - start)
+        yield format_sse("done", {})
+
+    except json.JSONDecodeError:
+        yield format_sse("error", {"detail": "Model response could not be parsed as JSON"})
+    except QUERY_ERRORS as e:
+        print(f"Generated SQL failed: {e}")
+        yield format_sse("error", {"detail": f"Query failed: {e.__class__.__name__}"})
+
+@router.post("/stream")
+async def chat_stream(
+    user_input: schemas.ChatQuery,
+    rag: bool = Query(False, description="Use RAG-based response"),
+    render: Literal["auto", "local", "llm"] = Query(CHAT_RENDER_MODE, description="Who builds the RAG components: local renderer, model, or auto"),
+):
+    return StreamingResponse(
+        stream_chat_events(user_input.query, rag, render),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/results/{cursor}")
+async def get_result_page(cursor: str, db: AsyncSession = Depends(get_chat_db)):
+    location = await resolve_cursor(cursor)
+    if location is None:
+        raise HTTPException(status_code=404, detail="Result cursor not found or expired")
+
+    sql, offset = location
+    try:
+        page = await fetch_result_page(db, sql, offset)
+    except QueryRejected as e:
+        raise HTTPException(status_code=422, detail=f"Query rejected: {e.reason}")
+    except QUERY_ERRORS as e:
+        print(f"Generated SQL failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Query failed: {e.__class__.__name__}")
+    return {"content": page["rows"], "next_cursor": page["next_cursor"]}
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    return {
+        "semantic": await get_semantic_cache_stats(),
+        "result": await get_result_cache_stats(),
+        "embedding": vector_store.embedding_cache.get_stats(),
+        "prompt": get_llm_stats(),
+        "intent": get_intent_stats(),
+    }
+
+@router.post("/cache/stats/reset")
+async def reset_cache_stats():
+    await reset_semantic_cache_stats()
+    await reset_result_cache_stats()
+    reset_llm_stats()
+    reset_intent_stats()
+    return {"message": "Cache stats reset"}
 
 @router.post("/clear")
 async def clear_chat():
-    clear_chat_history(user_id)
+    await clear_chat_history(user_id)
     return {"message": "Chat history cleared"}
 
 @router.get("/vectors/schemas")
@@ -1,8 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.utils import schemas
 from app.config.database import get_db
 from app.models import models
+from app.utils.crud_utils import create_row, update_row, delete_row
+from app.utils.list_utils import ListParams, list_query, get_one, equals
 
 router = APIRouter(
     prefix="/departments",
@@ -10,49 +13,43 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+# Relationships that can be requested with ?expand=
+EXPANSIONS = {
+    "employees": schemas.Employee,
+    "department_head": schemas.Employee,
+}
+
 @router.get("/")
-async def get_departments(db: Session = Depends(get_db)):
-    departments = db.query(models.Department).all()
-    return departments
+async def get_departments(
+    response: Response,
+    head_id: Optional[int] = None,
+    params: ListParams = Depends(),
+    db: AsyncSession = Depends(get_db)
+):
+    return await list_query(db, models.Department, params, response, expansions=EXPANSIONS, filters=[
+        equals(models.Department.head_id, head_id),
+    ])
 
 @router.get("/{department_id}")
-async def get_department(department_id: int, db: Session = Depends(get_db)):
-    department = db.query(models.Department).filter(models.Department.id == department_id).first()
+async def get_department(department_id: int, expand: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+    department = await get_one(db, models.Department, department_id, expand, EXPANSIONS)
     if not department:
         raise HTTPException(status_code=404, detail="Department not found")
     return department
 
 @router.post("/", response_model=schemas.Department)
-async def create_department(department: schemas.DepartmentCreate, db: Session = Depends(get_db)):
-    new_department = models.Department(**department.model_dump())
-    db.add(new_department)
-    db.commit()
-    db.refresh(new_department)
-    return new_department
+async def create_department(department: schemas.DepartmentCreate, db: AsyncSession = Depends(get_db)):
+    return await create_row(db, models.Department, department.model_dump())
 
 @router.put("/{department_id}", response_model=schemas.Department)
-async def update_department(
-    department_id: int, 
-    department: schemas.Department,
-    db: Session = Depends(get_db)
-):
-    db_department = db.query(models.Department).filter(models.Department.id == department_id).first()
-    if not db_department:
-        raise HTTPException(status_code=404, detail="Department not found")
-    
-    for key, value in department.model_dump().items():
-        setattr(db_department, key, value)
-    
-    db.commit()
-    db.refresh(db_department)
-    return db_department
+async def update_department(department_id: int, department: schemas.DepartmentUpdate, db: AsyncSession = Depends(get_db)):
+    return await update_row(db, models.Department, department_id, department.model_dump(exclude={"version"}), department.version, "Department")
+
+@router.patch("/{department_id}", response_model=schemas.Department)
+async def patch_department(department_id: int, department: schemas.DepartmentPatch, db: AsyncSession = Depends(get_db)):
+    return await update_row(db, models.Department, department_id, department.model_dump(exclude_unset=True, exclude={"version"}), department.version, "Department")
 
 @router.delete("/{department_id}")
-async def delete_department(department_id: int, db: Session = Depends(get_db)):
-    department = db.query(models.Department).filter(models.Department.id == department_id).first()
-    if not department:
-        raise HTTPException(status_code=404, detail="Department not found")
-    
-    db.delete(department)
-    db.commit()
-    return {"message": "Department deleted successfully"}
\ No newline at end of file
+async def delete_department(department_id: int, version: Optional[int] = None, db: AsyncSession = Depends(get_db)):
+    await delete_row(db, models.Department, department_id, version, "Department")
+    return {"message": "Department deleted successfully"}
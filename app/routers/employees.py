@@ -1,8 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from datetime import date
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Response, UploadFile, Query
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.utils import schemas
 from app.config.database import get_db
 from app.models import models
+from app.utils.import_utils import import_rows
+from app.utils.crud_utils import create_row, update_row
+from app.utils.list_utils import ListParams, list_query, get_one, equals, in_range
 
 router = APIRouter(
     prefix="/employees",
@@ -10,32 +15,52 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+# Relationships that can be requested with ?expand=
+EXPANSIONS = {
+    "department": schemas.Department,
+}
+
 
 @router.get("/")
-async def get_employees(db: Session = Depends(get_db)):
-    employees = db.query(models.Employee).all()
-    return employees
+async def get_employees(
+    response: Response,
+    department_id: Optional[int] = None,
+    designation: Optional[str] = None,
+    joined_from: Optional[date] = None,
+    joined_to: Optional[date] = None,
+    params: ListParams = Depends(),
+    db: AsyncSession = Depends(get_db)
+):
+    return await list_query(db, models.Employee, params, response, expansions=EXPANSIONS, filters=[
+        equals(models.Employee.department_id, department_id),
+        equals(models.Employee.designation, designation),
+        in_range(models.Employee.date_joined, joined_from, joined_to),
+    ])
 
 @router.get("/{employee_id}")
-async def get_employee(employee_id: int, db: Session = Depends(get_db)):
-    employee = db.query(models.Employee).filter(models.Employee.id == employee_id).first()
+async def get_employee(employee_id: int, expand: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+    employee = await get_one(db, models.Employee, employee_id, expand, EXPANSIONS)
     if not employee:
         raise HTTPException(status_code=404, detail="Employee not found")
     return employee
 
 @router.post("/")
-async def create_employee(employee: schemas.EmployeeCreate, db: Session = Depends(get_db)):
-    new_employee = models.Employee(**employee.model_dump())
-    db.add(new_employee)
-    db.commit()
-    db.refresh(new_employee)
-    return new_employee
+async def create_employee(employee: schemas.EmployeeCreate, db: AsyncSession = Depends(get_db)):
+    return await create_row(db, models.Employee, employee.model_dump())
+
+@router.post("/import")
+async def import_employees(
+    file: UploadFile,
+    format: Optional[Literal["csv", "ndjson"]] = Query(None, description="Defaults to the file extension"),
+    atomic: bool = Query(False, description="Save nothing if any row is invalid"),
+    db: AsyncSession = Depends(get_db)
+):
+    return await import_rows(db, file, models.Employee, schemas.EmployeeCreate, format, atomic)
 
 @router.put("/{employee_id}")
-async def update_employee(employee_id: int, employee: schemas.Employee, db: Session = Depends(get_db)):
-    db.query(models.Employee).filter(models.Employee.id == employee_id).update(employee.model_dump())
-    db.commit()
-    updated_employee = db.query(models.Employee).filter(models.Employee.id == employee_id).first()
-    if not updated_employee:
-        raise HTTPException(status_code=404, detail="Employee not found")
-    return updated_employee
\ No newline at end of file
+async def update_employee(employee_id: int, employee: schemas.EmployeeUpdate, db: AsyncSession = Depends(get_db)):
+    return await update_row(db, models.Employee, employee_id, employee.model_dump(exclude={"version"}), employee.version, "Employee")
+
+@router.patch("/{employee_id}")
+async def patch_employee(employee_id: int, employee: schemas.EmployeePatch, db: AsyncSession = Depends(get_db)):
+    return await update_row(db, models.Employee, employee_id, employee.model_dump(exclude_unset=True, exclude={"version"}), employee.version, "Employee")
@@ -1,8 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from datetime import date
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.utils import schemas
 from app.config.database import get_db
 from app.models import models
+from app.utils.crud_utils import create_row, update_row
+from app.utils.list_utils import ListParams, list_query, get_one, equals, in_range
 
 router = APIRouter(
     prefix="/maintenance",
@@ -10,30 +14,51 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+# Relationships that can be requested with ?expand=
+EXPANSIONS = {
+    "asset": schemas.Asset,
+    "reporter": schemas.Employee,
+    "assigned_employee": schemas.Employee,
+    "assigned_vendor": schemas.Vendor,
+}
+
 @router.get("/")
-async def get_maintenance(db: Session = Depends(get_db)):
-    return db.query(models.MaintenanceLog).all()
+async def get_maintenance_logs(
+    response: Response,
+    status: Optional[models.MaintenanceStatus] = None,
+    asset_id: Optional[int] = None,
+    reported_by: Optional[int] = None,
+    assigned_employee_id: Optional[int] = None,
+    assigned_vendor_id: Optional[int] = None,
+    created_from: Optional[date] = None,
+    created_to: Optional[date] = None,
+    params: ListParams = Depends(),
+    db: AsyncSession = Depends(get_db)
+):
+    return await list_query(db, models.MaintenanceLog, params, response, expansions=EXPANSIONS, sort_columns=("id", "created_at"), filters=[
+        equals(models.MaintenanceLog.status, status),
+        equals(models.MaintenanceLog.asset_id, asset_id),
+        equals(models.MaintenanceLog.reported_by, reported_by),
+        equals(models.MaintenanceLog.assigned_employee_id, assigned_employee_id),
+        equals(models.MaintenanceLog.assigned_vendor_id, assigned_vendor_id),
+        in_range(models.MaintenanceLog.created_at, created_from, created_to),
+    ])
 
 @router.post("/")
-async def create_maintenance(maintenance: schemas.MaintenanceLogCreate, db: Session = Depends(get_db)):
-    new_maintenance = models.MaintenanceLog(**maintenance.model_dump())
-    db.add(new_maintenance)
-    db.commit()
-    db.refresh(new_maintenance)
-    return new_maintenance
+async def create_maintenance(maintenance: schemas.MaintenanceLogCreate, db: AsyncSession = Depends(get_db)):
+    return await create_row(db, models.MaintenanceLog, maintenance.model_dump())
 
 @router.get("/{maintenance_id}")
-async def get_maintenance(maintenance_id: int, db: Session = Depends(get_db)):
-    maintenance = db.query(models.MaintenanceLog).filter(models.MaintenanceLog.id == maintenance_id).first()
+async def get_maintenance(maintenance_id: int, expand: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+    maintenance = await get_one(db, models.MaintenanceLog, maintenance_id, expand, EXPANSIONS)
     if not maintenance:
         raise HTTPException(status_code=404, detail="Maintenance not found")
     return maintenance
 
 @router.put("/{maintenance_id}")
-async def update_maintenance(maintenance_id: int, maintenance: schemas.MaintenanceLog, db: Session = Depends(get_db)):
-    db.query(models.MaintenanceLog).filter(models.MaintenanceLog.id == maintenance_id).update(maintenance.model_dump())
-    db.commit()
-    updated_maintenance = db.query(models.MaintenanceLog).filter(models.MaintenanceLog.id == maintenance_id).first()
-    if not updated_maintenance:
-        raise HTTPException(status_code=404, detail="Maintenance not found")
-    return updated_maintenance
\ No newline at end of file
+async def update_maintenance(maintenance_id: int, maintenance: schemas.MaintenanceLogUpdate, db: AsyncSession = Depends(get_db)):
+    return await update_row(db, models.MaintenanceLog, maintenance_id, maintenance.model_dump(exclude={"version"}), maintenance.version, "Maintenance")
+
+@router.patch("/{maintenance_id}")
+async def patch_maintenance(maintenance_id: int, maintenance: schemas.MaintenanceLogPatch, db: AsyncSession = Depends(get_db)):
+    return await update_row(db, models.MaintenanceLog, maintenance_id, maintenance.model_dump(exclude_unset=True, exclude={"version"}), maintenance.version, "Maintenance")
@@ -0,0 +1,31 @@
+from fastapi import APIRouter
+
+from app.config.db_metrics import get_all_pool_stats, get_all_statement_stats, reset_db_metrics
+from app.utils.ingest_utils import tracking_buffer
+
+router = APIRouter(
+    prefix="/metrics",
+    tags=["metrics"],
+    responses={404: {"description": "Not found"}},
+)
+
+@router.get("/")
+async def get_metrics():
+    return {"pools": get_all_pool_stats(), "statements": get_all_statement_stats()}
+
+@router.get("/pools")
+async def get_pool_metrics():
+    return get_all_pool_stats()
+
+@router.get("/statements")
+async def get_statement_metrics():
+    return get_all_statement_stats()
+
+@router.get("/ingest")
+async def get_ingest_metrics():
+    return {"trackings": tracking_buffer.get_stats()}
+
+@router.post("/reset")
+async def reset_metrics():
+    reset_db_metrics()
+    return {"message": "Database metrics reset"}
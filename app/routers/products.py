@@ -1,8 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Response, UploadFile, Query
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.utils import schemas
 from app.config.database import get_db
 from app.models import models
+from app.utils.import_utils import import_rows
+from app.utils.crud_utils import create_row, update_row, delete_row
+from app.utils.list_utils import ListParams, list_query, equals, in_range
 
 router = APIRouter(
     prefix="/products",
@@ -11,40 +15,48 @@ router = APIRouter(
 )
 
 @router.get("/{product_id}")
-async def get_product(product_id: int, db: Session = Depends(get_db)):
-    product = db.query(models.Product).filter(models.Product.id == product_id).first()
+async def get_product(product_id: int, db: AsyncSession = Depends(get_db)):
+    product = await db.get(models.Product, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     return product
 
 @router.get("/")
-async def get_products(db: Session = Depends(get_db)):
-    products = db.query(models.Product).all()
-    return products
+async def get_products(
+    response: Response,
+    category: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    params: ListParams = Depends(),
+    db: AsyncSession = Depends(get_db)
+):
+    return await list_query(db, models.Product, params, response, filters=[
+        equals(models.Product.category, category),
+        in_range(models.Product.unit_price, min_price, max_price),
+    ])
 
 @router.post("/")
-async def create_product(product: schemas.ProductCreate, db: Session = Depends(get_db)):
-    new_product = models.Product(**product.model_dump())
-    db.add(new_product)
-    db.commit()
-    db.refresh(new_product)
-    return new_product
+async def create_product(product: schemas.ProductCreate, db: AsyncSession = Depends(get_db)):
+    return await create_row(db, models.Product, product.model_dump())
+
+@router.post("/import")
+async def import_products(
+    file: UploadFile,
+    format: Optional[Literal["csv", "ndjson"]] = Query(None, description="Defaults to the file extension"),
+    atomic: bool = Query(False, description="Save nothing if any row is invalid"),
+    db: AsyncSession = Depends(get_db)
+):
+    return await import_rows(db, file, models.Product, schemas.ProductCreate, format, atomic)
 
 @router.put("/{product_id}")
-async def update_product(product_id: int, product: schemas.Product, db: Session = Depends(get_db)):
-    db.query(models.Product).filter(models.Product.id == product_id).update(product.model_dump())
-    db.commit()
-    updated_product = db.query(models.Product).filter(models.Product.id == product_id).first()
-    if not updated_product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    return updated_product
+async def update_product(product_id: int, product: schemas.ProductUpdate, db: AsyncSession = Depends(get_db)):
+    return await update_row(db, models.Product, product_id, product.model_dump(exclude={"version"}), product.version, "Product")
+
+@router.patch("/{product_id}")
+async def patch_product(product_id: int, product: schemas.ProductPatch, db: AsyncSession = Depends(get_db)):
+    return await update_row(db, models.Product, product_id, product.model_dump(exclude_unset=True, exclude={"version"}), product.version, "Product")
 
 @router.delete("/{product_id}")
-async def delete_product(product_id: int, db: Session = Depends(get_db)):
-    product = db.query(models.Product).filter(models.Product.id == product_id).first()
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    
-    db.delete(product)
-    db.commit()
-    return {"message": "Product deleted successfully"}
\ No newline at end of file
+async def delete_product(product_id: int, version: Optional[int] = None, db: AsyncSession = Depends(get_db)):
+    await delete_row(db, models.Product, product_id, version, "Product")
+    return {"message": "Product deleted successfully"}
@@ -1,8 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Response, UploadFile, Query
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.utils import schemas
 from app.config.database import get_db
 from app.models import models
+from app.utils.import_utils import import_rows
+from app.utils.crud_utils import create_row, update_row, delete_row
+from app.utils.list_utils import ListParams, list_query, get_one, equals
 
 router = APIRouter(
     prefix="/vendors",
@@ -10,41 +14,52 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+# Relationships that can be requested with ?expand=
+EXPANSIONS = {
+    "assets_link": schemas.AssetVendorLink,
+}
+
 @router.get("/")
-async def get_vendors(db: Session = Depends(get_db)):
-    return db.query(models.Vendor).all()
+async def get_vendors(
+    response: Response,
+    name: Optional[str] = None,
+    params: ListParams = Depends(),
+    db: AsyncSession = Depends(get_db)
+):
+    return await list_query(db, models.Vendor, params, response, expansions=EXPANSIONS, filters=[
+        equals(models.Vendor.name, name),
+    ])
 
 @router.post("/")
-async def create_vendor(vendor: schemas.VendorCreate, db: Session = Depends(get_db)):
-    new_vendor = models.Vendor(**vendor.model_dump())
-    db.add(new_vendor)
-    db.commit()
-    db.refresh(new_vendor)
-    return new_vendor
+async def create_vendor(vendor: schemas.VendorCreate, db: AsyncSession = Depends(get_db)):
+    return await create_row(db, models.Vendor, vendor.model_dump())
+
+@router.post("/import")
+async def import_vendors(
+    file: UploadFile,
+    format: Optional[Literal["csv", "ndjson"]] = Query(None, description="Defaults to the file extension"),
+    atomic: bool = Query(False, description="Save nothing if any row is invalid"),
+    db: AsyncSession = Depends(get_db)
+):
+    return await import_rows(db, file, models.Vendor, schemas.VendorCreate, format, atomic)
 
 @router.get("/{vendor_id}")
-async def get_vendor(vendor_id: int, db: Session = Depends(get_db)):
-    vendor = db.query(models.Vendor).filter(models.Vendor.id == vendor_id).first()
+async def get_vendor(vendor_id: int, expand: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+    vendor = await get_one(db, models.Vendor, vendor_id, expand, EXPANSIONS)
     if not vendor:
         raise HTTPException(status_code=404, detail="Vendor not found")
     return vendor
 
 @router.put("/{vendor_id}")
-async def update_vendor(vendor_id: int, vendor: schemas.Vendor, db: Session = Depends(get_db)):
-    db.query(models.Vendor).filter(models.Vendor.id == vendor_id).update(vendor.model_dump())
-    db.commit()
-    updated_vendor = db.query(models.Vendor).filter(models.Vendor.id == vendor_id).first()
-    if not updated_vendor:
-        raise HTTPException(status_code=404, detail="Vendor not found")
-    return updated_vendor
+async def update_vendor(vendor_id: int, vendor: schemas.VendorUpdate, db: AsyncSession = Depends(get_db)):
+    return await update_row(db, models.Vendor, vendor_id, vendor.model_dump(exclude={"version"}), vendor.version, "Vendor")
+
+@router.patch("/{vendor_id}")
+async def patch_vendor(vendor_id: int, vendor: schemas.VendorPatch, db: AsyncSession = Depends(get_db)):
+    return await update_row(db, models.Vendor, vendor_id, vendor.model_dump(exclude_unset=True, exclude={"version"}), vendor.version, "Vendor")
 
 @router.delete("/{vendor_id}")
-async def delete_vendor(vendor_id: int, db: Session = Depends(get_db)):
-    vendor = db.query(models.Vendor).filter(models.Vendor.id == vendor_id).first()
-    if not vendor:
-        raise HTTPException(status_code=404, detail="Vendor not found")
-    
-    db.delete(vendor)
-    db.commit()
+async def delete_vendor(vendor_id: int, version: Optional[int] = None, db: AsyncSession = Depends(get_db)):
+    await delete_row(db, models.Vendor, vendor_id, version, "Vendor")
     return {"message": "Vendor deleted successfully"}
 
@@ -0,0 +1,315 @@
+from typing import List, Dict, Optional
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+
+import numpy as np
+from dotenv import load_dotenv
+from redis.exceptions import RedisError
+from sqlalchemy import event, inspect as sa_inspect
+from sqlalchemy.orm import Session
+
+from app.models import models
+from app.config.database import CHAT_USES_REPLICA
+from app.config.redis_client import redis_client, async_redis_client
+from app.config.vector_store import EMBEDDING_MODEL
+from app.config.embedding_cache import normalize_query
+
+load_dotenv()
+
+# ========= Semantic answer cache ========= #
+# Caches the model's parsed reply (type / component / text / sql) for a query,
+# bucketed by the set of schema tables retrieved for it. A lookup first tries
+# the exact normalized query text, then (when the query was embedded) compares
+# the embedding against every live entry of the bucket and returns the best
+# match above SEMANTIC_CACHE_THRESHOLD. Buckets are sorted sets scored by last
+# access, so trimming them evicts the least recently used entries.
+# Questions that differ only in a literal ("batch B-1001" vs "batch B-1002")
+# embed almost identically, so a similarity hit also needs the same literal
+# tokens: numbers, codes, quoted strings, dates and month names.
+# Redis errors degrade to a cache miss, as in EmbeddingCache.
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_TTL_SECONDS = int(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", 60 * 60 * 24))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", 200))
+
+SEMANTIC_CACHE_STATS_KEY = "semantic_cache:stats"
+
+LITERAL_TOKEN = re.compile(
+    r"'[^']*'|\"[^\"]*\""
+    r"|\b\d{1,4}[-/.]\d{1,2}[-/.]\d{1,4}\b"
+    r"|\b(?:[a-z]+-)*[a-z]*\d[\w-]*"
+    r"|\b(?:january|february|march|april|may|june|july|august|september|october|november|december)\b"
+)
+
+def get_literal_tokens(query: str) -> List[str]:
+    return sorted(LITERAL_TOKEN.findall(normalize_query(query)))
+
+def get_semantic_bucket_key(tables: List[str]) -> str:
+    schema_set = ",".join(sorted(set(tables)))
+    digest = hashlib.sha1(f"{EMBEDDING_MODEL}:{schema_set}".encode()).hexdigest()
+    return f"semantic_cache:{digest}"
+
+def get_semantic_exact_key(bucket_key: str, query: str) -> str:
+    digest = hashlib.sha1(f"{bucket_key}:{normalize_query(query)}".encode()).hexdigest()
+    return f"semantic_cache:exact:{digest}"
+
+def get_semantic_entry_key(entry_id: str) -> str:
+    return f"semantic_cache:entry:{entry_id}"
+
+async def _record_plan_hit(bucket_key: str, entry_id: str):
+    pipe = async_redis_client.pipeline()
+    pipe.zadd(bucket_key, {entry_id: time.time()})
+    pipe.expire(get_semantic_entry_key(entry_id), SEMANTIC_CACHE_TTL_SECONDS)
+    pipe.hincrby(SEMANTIC_CACHE_STATS_KEY, "hits", 1)
+    await pipe.execute()
+
+async def lookup_cached_plan(query: str, embedding: Optional[np.ndarray], tables: List[str]) -> Optional[Dict]:
+    """Return the cached model reply for the same query text, or the one closest to `embedding`"""
+    if not SEMANTIC_CACHE_ENABLED:
+        return None
+    try:
+        return await _lookup_cached_plan(query, embedding, tables)
+    except RedisError as e:
+        print(f"Error reading semantic cache: {e}")
+        return None
+
+async def _lookup_cached_plan(query: str, embedding: Optional[np.ndarray], tables: List[str]) -> Optional[Dict]:
+    bucket_key = get_semantic_bucket_key(tables)
+    entry_id = await async_redis_client.get(get_semantic_exact_key(bucket_key, query))
+    if entry_id:
+        plan = await async_redis_client.hget(get_semantic_entry_key(entry_id.decode()), "plan")
+        if plan:
+            await _record_plan_hit(bucket_key, entry_id.decode())
+            return json.loads(plan)
+
+    if embedding is not None:
+        entry_ids = await async_redis_client.zrevrange(bucket_key, 0, SEMANTIC_CACHE_MAX_ENTRIES - 1)
+
+        pipe = async_redis_client.pipeline()
+        for entry_id in entry_ids:
+            pipe.hmget(get_semantic_entry_key(entry_id.decode()), "embedding", "plan", "query")
+        entries = await pipe.execute() if entry_ids else []
+
+        # Entries cached for keyword-routed queries carry no embedding
+        literals = get_literal_tokens(query)
+        live = [
+            (entry_id, emb, plan) for entry_id, (emb, plan, cached_query) in zip(entry_ids, entries)
+            if emb is not None and cached_query is not None and get_literal_tokens(cached_query.decode()) == literals
+        ]
+        expired = [entry_id for entry_id, (_, plan, _) in zip(entry_ids, entries) if plan is None]
+        if expired:
+            await async_redis_client.zrem(bucket_key, *expired)
+
+        if live:
+            matrix = np.frombuffer(b"".join(emb for _, emb, _ in live), dtype=np.float32).reshape(len(live), -1)
+            scores = matrix @ embedding.astype(np.float32)
+            best = int(np.argmax(scores))
+
+            if scores[best] >= SEMANTIC_CACHE_THRESHOLD:
+                entry_id, _, plan = live[best]
+                await _record_plan_hit(bucket_key, entry_id.decode())
+                return json.loads(plan)
+
+    await async_redis_client.hincrby(SEMANTIC_CACHE_STATS_KEY, "misses", 1)
+    return None
+
+async def store_cached_plan(embedding: Optional[np.ndarray], tables: List[str], query: str, plan: Dict):
+    if not SEMANTIC_CACHE_ENABLED:
+        return
+
+    bucket_key = get_semantic_bucket_key(tables)
+    entry_id = uuid.uuid4().hex
+    entry_key = get_semantic_entry_key(entry_id)
+
+    entry = {"plan": json.dumps(plan, default=str), "query": query}
+    if embedding is not None:
+        entry["embedding"] = embedding.astype(np.float32).tobytes()
+
+    try:
+        pipe = async_redis_client.pipeline()
+        pipe.hset(entry_key, mapping=entry)
+        pipe.expire(entry_key, SEMANTIC_CACHE_TTL_SECONDS)
+        pipe.set(get_semantic_exact_key(bucket_key, query), entry_id, ex=SEMANTIC_CACHE_TTL_SECONDS)
+        pipe.zadd(bucket_key, {entry_id: time.time()})
+        # Keep only the most recently used entries of the bucket
+        pipe.zremrangebyrank(bucket_key, 0, -(SEMANTIC_CACHE_MAX_ENTRIES + 1))
+        pipe.expire(bucket_key, SEMANTIC_CACHE_TTL_SECONDS)
+        await pipe.execute()
+    except RedisError as e:
+        print(f"Error writing semantic cache: {e}")
+
+async def get_semantic_cache_stats() -> Dict:
+    stats = await async_redis_client.hgetall(SEMANTIC_CACHE_STATS_KEY)
+    hits = int(stats.get(b"hits", 0))
+    misses = int(stats.get(b"misses", 0))
+    return {
+        "enabled": SEMANTIC_CACHE_ENABLED,
+        "threshold": SEMANTIC_CACHE_THRESHOLD,
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+    }
+
+async def reset_semantic_cache_stats():
+    await async_redis_client.delete(SEMANTIC_CACHE_STATS_KEY)
+
+# ========= SQL result cache ========= #
+# Result sets of generated SQL are cached under the SQL text plus
+# the current version of every table it reads. Writes from the CRUD routers
+# bump those versions on commit (see register_result_cache_invalidation), so
+# a stale entry can never be addressed again and simply ages out via its TTL.
+# Session events are synchronous callbacks. Inside the event loop (the async
+# CRUD routers) the INCRs are handed to the async client as a task, which runs
+# as soon as the request yields, so a slow Redis never blocks the loop; scripts
+# and other sync callers use the blocking client, bounded by its socket
+# timeout. A failed bump is logged and the old entries age out via their TTL.
+# Versions are bumped when the primary commits, but a replica may not have
+# replayed the write yet: a result read from it right after the bump would be
+# cached as current. With CHAT_DATABASE_URL on a replica the cache is off
+# unless SQL_RESULT_CACHE_ON_REPLICA accepts results up to the replica's lag.
+SQL_RESULT_CACHE_ON_REPLICA = os.getenv("SQL_RESULT_CACHE_ON_REPLICA", "false").lower() == "true"
+SQL_RESULT_CACHE_ENABLED = (
+    os.getenv("SQL_RESULT_CACHE_ENABLED", "true").lower() == "true"
+    and (SQL_RESULT_CACHE_ON_REPLICA or not CHAT_USES_REPLICA)
+)
+SQL_RESULT_CACHE_TTL_SECONDS = int(os.getenv("SQL_RESULT_CACHE_TTL_SECONDS", 60 * 10))
+
+SQL_RESULT_CACHE_STATS_KEY = "sql_result_cache:stats"
+
+# Results depending on the clock or randomness are never cached
+VOLATILE_SQL_PATTERN = re.compile(r"\b(now|random|clock_timestamp|current_date|current_time|current_timestamp|localtime|localtimestamp)\b", re.IGNORECASE)
+
+def normalize_sql(sql: str) -> str:
+    return re.sub(r"\s+", " ", sql.strip()).rstrip(";").strip()
+
+def strip_sql(sql: str) -> str:
+    """`sql` as written, minus surrounding whitespace and a trailing semicolon"""
+    sql = sql.strip()
+    return sql[:-1].rstrip() if sql.endswith(";") else sql
+
+def get_sql_tables(sql: str) -> List[str]:
+    """Known tables referenced anywhere in `sql`"""
+    tokens = set(re.findall(r"[a-z_][a-z0-9_]*", sql.lower()))
+    return sorted(table for table in models.Base.metadata.tables if table in tokens)
+
+def get_table_version_key(table: str) -> str:
+    return f"sql_table_version:{table}"
+
+async def get_result_cache_key(sql: str, variant: str = "") -> Optional[str]:
+    """Cache key for `sql` (and a derived result `variant`) at the current table versions, or None if it must not be cached"""
+    # Normalized text only decides what is cacheable; the key hashes the SQL as
+    # written, since collapsing whitespace would merge different string literals
+    normalized = normalize_sql(sql)
+    tables = get_sql_tables(normalized)
+    if not SQL_RESULT_CACHE_ENABLED or not tables or VOLATILE_SQL_PATTERN.search(normalized):
+        return None
+
+    try:
+        versions = await async_redis_client.mget([get_table_version_key(table) for table in tables])
+    except RedisError as e:
+        # Without the table versions a cached result cannot be trusted
+        print(f"Error reading table versions: {e}")
+        return None
+    signature = ",".join(f"{table}={int(version or 0)}" for table, version in zip(tables, versions))
+    key = f"{strip_sql(sql)}|{signature}|{variant}" if variant else f"{strip_sql(sql)}|{signature}"
+    digest = hashlib.sha1(key.encode()).hexdigest()
+    return f"sql_result:{digest}"
+
+async def get_cached_result(cache_key: Optional[str]) -> Optional[Dict]:
+    if cache_key is None:
+        return None
+
+    try:
+        raw = await async_redis_client.get(cache_key)
+        await async_redis_client.hincrby(SQL_RESULT_CACHE_STATS_KEY, "hits" if raw else "misses", 1)
+    except RedisError as e:
+        print(f"Error reading SQL result cache: {e}")
+        return None
+    return json.loads(raw) if raw else None
+
+async def store_cached_result(cache_key: Optional[str], result: Dict):
+    if cache_key is None:
+        return
+    try:
+        await async_redis_client.set(cache_key, json.dumps(result, separators=(",", ":"), default=str), ex=SQL_RESULT_CACHE_TTL_SECONDS)
+    except RedisError as e:
+        print(f"Error writing SQL result cache: {e}")
+
+# Strong references to in-flight invalidation tasks, so they are not collected early
+_pending_invalidations = set()
+
+async def _invalidate_tables_async(tables: List[str]):
+    try:
+        pipe = async_redis_client.pipeline(transaction=False)
+        for table in tables:
+            pipe.incr(get_table_version_key(table))
+        await pipe.execute()
+    except RedisError as e:
+        print(f"Error invalidating cached results of {', '.join(tables)}: {e}")
+
+def invalidate_tables(tables):
+    """Bump the version of every table in `tables`"""
+    tables = sorted(tables)
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+
+    if loop is not None:
+        task = loop.create_task(_invalidate_tables_async(tables))
+        _pending_invalidations.add(task)
+        task.add_done_callback(_pending_invalidations.discard)
+        return
+
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for table in tables:
+            pipe.incr(get_table_version_key(table))
+        pipe.execute()
+    except RedisError as e:
+        print(f"Error invalidating cached results of {', '.join(tables)}: {e}")
+
+def _track_flushed_tables(session, flush_context):
+    written = session.info.setdefault("written_tables", set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        written.add(sa_inspect(obj).mapper.local_table.name)
+
+def _track_executed_tables(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, "table", None)
+        if table is not None:
+            orm_execute_state.session.info.setdefault("written_tables", set()).add(table.name)
+
+def _invalidate_committed_tables(session):
+    written = session.info.pop("written_tables", None)
+    if written:
+        invalidate_tables(written)
+
+def _discard_written_tables(session):
+    session.info.pop("written_tables", None)
+
+def register_result_cache_invalidation():
+    """Bump table versions whenever a session commits writes to them"""
+    event.listen(Session, "after_flush", _track_flushed_tables)
+    event.listen(Session, "do_orm_execute", _track_executed_tables)
+    event.listen(Session, "after_commit", _invalidate_committed_tables)
+    event.listen(Session, "after_rollback", _discard_written_tables)
+
+async def get_result_cache_stats() -> Dict:
+    stats = await async_redis_client.hgetall(SQL_RESULT_CACHE_STATS_KEY)
+    hits = int(stats.get(b"hits", 0))
+    misses = int(stats.get(b"misses", 0))
+    return {
+        "enabled": SQL_RESULT_CACHE_ENABLED,
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+    }
+
+async def reset_result_cache_stats():
+    await async_redis_client.delete(SQL_RESULT_CACHE_STATS_KEY)
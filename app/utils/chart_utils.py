@@ -0,0 +1,209 @@
+from typing import Dict, List, Optional, Tuple
+import os
+
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.utils.cache_utils import get_result_cache_key, get_cached_result, store_cached_result
+from app.utils.digest_utils import to_datetime
+from app.utils.render_utils import describe_columns
+from app.utils.sql_utils import strip_sql, stream_result_page, QueryRejected
+
+load_dotenv()
+
+# ========= Chart preparation ========= #
+# Chart components carry aggregated points, never raw rows. Charts are built
+# from the whole result with numpy group-by and binning:
+# - pie charts: the top CHAT_CHART_PIE_SLICES - 1 labels plus "Other";
+# - bar charts over categories: the same with CHAT_CHART_MAX_POINTS bars;
+# - bar charts over a date column: raw events are counted (or summed) per
+#   minute / hour / day / month / year, the finest unit that fits; series
+#   that already have one row per time are downsampled with LTTB.
+# Results that are already small enough are passed through unchanged.
+# When the first page did not hold the whole result it is read again, through
+# the same guarded page reader: category charts as a GROUP BY of the label in
+# SQL, date series as just the label and value columns. Either read stops at
+# CHAT_CHART_MAX_ROWS rows or CHAT_CHART_MAX_BYTES of encoded JSON.
+CHAT_CHART_MAX_POINTS = int(os.getenv("CHAT_CHART_MAX_POINTS", 200))
+CHAT_CHART_PIE_SLICES = int(os.getenv("CHAT_CHART_PIE_SLICES", 8))
+CHAT_CHART_MAX_ROWS = int(os.getenv("CHAT_CHART_MAX_ROWS", 50_000))
+CHAT_CHART_MAX_BYTES = int(os.getenv("CHAT_CHART_MAX_BYTES", 8 * 1024 * 1024))
+
+CHART_COMPONENTS = ("pie_chart", "bar_chart")
+OTHER_LABEL = "Other"
+COUNT_COLUMN = "count"
+# numpy datetime64 units, finest first
+BUCKET_UNITS = {"m": "minute", "h": "hour", "D": "day", "M": "month", "Y": "year"}
+
+def is_key_column(name: str) -> bool:
+    return name == "id" or name.endswith("_id")
+
+def get_series_columns(rows: List[Dict]) -> Optional[Dict]:
+    """Label column (a date column first, then text) and value column (None to count rows)"""
+    columns = describe_columns(rows)
+    dates = [name for name, column in columns.items() if column["kind"] == "date"]
+    texts = [name for name, column in columns.items() if column["kind"] == "text"]
+    numbers = [name for name, column in columns.items() if column["kind"] == "number" and not is_key_column(name)]
+    if not dates and not texts:
+        return None
+    return {"dates": dates, "texts": texts, "value": numbers[0] if numbers else None}
+
+def choose_series(component: str, rows: List[Dict]) -> Optional[Dict]:
+    """Label and value column (None to count rows) of a chart, and whether the label is bucketed by time"""
+    columns = get_series_columns(rows)
+    if columns is None:
+        # Only numbers: a pie still slices by its first column, so it can get an Other slice
+        names = list(rows[0].keys())
+        if component != "pie_chart" or len(names) > 2:
+            return None
+        return {"label": names[0], "value": names[1] if len(names) == 2 else None, "date": False}
+
+    label = columns["dates"][0] if component == "bar_chart" and columns["dates"] else (columns["texts"] or columns["dates"])[0]
+    return {"label": label, "value": columns["value"], "date": component == "bar_chart" and label in columns["dates"]}
+
+def get_values(rows: List[Dict], column: Optional[str]) -> np.ndarray:
+    if column is None:
+        return np.ones(len(rows))
+    return np.fromiter((row.get(column) or 0 for row in rows), dtype=np.float64, count=len(rows))
+
+def round_total(value: float):
+    return int(value) if float(value).is_integer() else round(float(value), 4)
+
+def group_top(labels: np.ndarray, values: np.ndarray, limit: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Totals per label, largest first, with everything past the first `limit - 1` labels summed into Other"""
+    uniques, inverse = np.unique(labels, return_inverse=True)
+    totals = np.bincount(inverse, weights=values, minlength=len(uniques))
+    order = np.argsort(-totals, kind="stable")
+    if len(order) <= limit:
+        return uniques[order], totals[order]
+    kept = order[:limit - 1]
+    return np.append(uniques[kept], OTHER_LABEL), np.append(totals[kept], totals[order[limit - 1:]].sum())
+
+def get_bucket_unit(times: np.ndarray, max_points: int) -> str:
+    """Finest unit whose buckets between the first and last time fit `max_points`"""
+    for unit in BUCKET_UNITS:
+        first, last = times.min().astype(f"datetime64[{unit}]"), times.max().astype(f"datetime64[{unit}]")
+        if int((last - first).astype(np.int64)) + 1 <= max_points:
+            return unit
+    return "Y"
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Indexes of `threshold` points keeping the shape of the series (Largest-Triangle-Three-Buckets)"""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # First and last points are kept, the rest is split into threshold - 2 buckets
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = [0]
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_x, next_y = x[end:next_end].mean(), y[end:next_end].mean()
+        a = selected[-1]
+        area = np.abs((x[a] - next_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (next_y - y[a]))
+        selected.append(start + int(area.argmax()))
+    selected.append(n - 1)
+    return np.array(selected)
+
+def prepare_series(rows: List[Dict], label: str, value: Optional[str], max_points: int) -> Tuple[List[Dict], str]:
+    rows = [row for row in rows if row.get(label) is not None]
+    if not rows:
+        return [], "none"
+    times = np.array([to_datetime(row[label]) for row in rows])
+    values = get_values(rows, value)
+    value_name = value or COUNT_COLUMN
+
+    if value is not None and np.unique(times).size == len(times):
+        # Already one point per time: keep the original points, just fewer of them
+        order = np.argsort(times, kind="stable")
+        x = times[order].astype(np.int64).astype(np.float64)
+        indexes = order[lttb(x, values[order], max_points)]
+        return [{label: rows[i][label], value_name: rows[i][value]} for i in indexes], "lttb"
+
+    # Every bucket between the first and last time, empty ones as 0
+    unit = get_bucket_unit(times, max_points)
+    buckets = times.astype(f"datetime64[{unit}]")
+    first = buckets.min()
+    totals = np.bincount((buckets - first).astype(np.int64), weights=values)
+    uniques = first + np.arange(len(totals))
+    if len(uniques) > max_points:
+        # Only when the result spans more than max_points years
+        kept = lttb(uniques.astype(np.int64).astype(np.float64), totals, max_points)
+        uniques, totals = uniques[kept], totals[kept]
+    return [
+        {label: str(bucket), value_name: round_total(total)} for bucket, total in zip(np.datetime_as_string(uniques), totals)
+    ], f"{BUCKET_UNITS[unit]}_buckets"
+
+def prepare_chart(component: str, rows: List[Dict], max_points: int = CHAT_CHART_MAX_POINTS) -> Tuple[List[Dict], str]:
+    """Bounded chart points for `rows` and the method used to get them"""
+    limit = min(CHAT_CHART_PIE_SLICES, max_points) if component == "pie_chart" else max_points
+    series = choose_series(component, rows) if rows else None
+    if series is None:
+        return rows[:limit], "truncated" if len(rows) > limit else "none"
+
+    label, value = series["label"], series["value"]
+    labels = [row.get(label) for row in rows]
+    if len(rows) <= limit and None not in labels and len(set(labels)) == len(rows):
+        return rows, "none"
+
+    if series["date"]:
+        return prepare_series(rows, label, value, max_points)
+
+    value_name = value or COUNT_COLUMN
+    labels = np.array(["(none)" if item is None else str(item) for item in labels], dtype=object)
+    uniques, totals = group_top(labels, get_values(rows, value), limit)
+    return [{label: item, value_name: round_total(total)} for item, total in zip(uniques, totals)], "top_n"
+
+def quote_column(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+def get_chart_source_sql(sql: str, series: Dict) -> str:
+    """`sql` reduced to what the chart needs: label totals, or the label and value columns of a time series"""
+    label = quote_column(series["label"])
+    source = f"(\n{strip_sql(sql)}\n) AS chart_source"
+    if series["date"]:
+        columns = f"{label}, {quote_column(series['value'])}" if series["value"] else label
+        return f"SELECT {columns} FROM {source}"
+    total = f"SUM({quote_column(series['value'])}) AS {quote_column(series['value'])}" if series["value"] else f"COUNT(*) AS {COUNT_COLUMN}"
+    return f"SELECT {label}, {total} FROM {source} GROUP BY 1 ORDER BY 2 DESC NULLS LAST"
+
+async def fetch_chart_rows(db: AsyncSession, component: str, sql: str, page: Dict) -> Tuple[List[Dict], bool]:
+    """Rows to chart the whole result of `sql` from, within CHAT_CHART_MAX_ROWS / CHAT_CHART_MAX_BYTES, and whether they cover it all"""
+    if not page.get("has_more"):
+        return page["rows"], True
+
+    series = choose_series(component, page["rows"]) if page["rows"] else None
+    if series is None:
+        # Nothing to group on; the chart shows the first rows
+        return page["rows"], False
+
+    full = {"rows": []}
+    try:
+        async for chunk in stream_result_page(db, get_chart_source_sql(sql, series), 0, full, page_size=CHAT_CHART_MAX_ROWS, max_bytes=CHAT_CHART_MAX_BYTES):
+            full["rows"].extend(chunk)
+    except QueryRejected as e:
+        # E.g. the full read timed out; chart the first page instead
+        print(f"Chart rows not read: {e.reason}")
+        return page["rows"], False
+    return full["rows"], not full["has_more"]
+
+async def prepare_chart_components(db: AsyncSession, components: List[Dict], sql: str, page: Dict) -> List[Dict]:
+    """Replace the raw rows of chart components with prepared points"""
+    for component in components if isinstance(components, list) else []:
+        if not isinstance(component, dict) or component.get("component") not in CHART_COMPONENTS or not isinstance(component.get("content"), list):
+            continue
+
+        variant = f"chart:{component['component']}:{CHAT_CHART_MAX_POINTS}:{CHAT_CHART_PIE_SLICES}:{CHAT_CHART_MAX_ROWS}:{CHAT_CHART_MAX_BYTES}"
+        cache_key = await get_result_cache_key(sql, variant) if page.get("has_more") else None
+        chart = await get_cached_result(cache_key)
+        if chart is None:
+            rows, complete = await fetch_chart_rows(db, component["component"], sql, page)
+            points, method = prepare_chart(component["component"], rows)
+            chart = {"points": points, "info": {"method": method, "source_rows": len(rows), "points": len(points), "complete": complete}}
+            if complete:
+                await store_cached_result(cache_key, chart)
+
+        component.update({"content": chart["points"], "next_cursor": None, "chart": chart["info"]})
+    return components
@@ -0,0 +1,206 @@
+from functools import lru_cache
+from typing import List, Dict, Optional, Tuple
+import asyncio
+import json
+import os
+import threading
+
+import tiktoken
+from dotenv import load_dotenv
+from langchain.chat_models import init_chat_model
+from langchain.schema import SystemMessage, HumanMessage, AIMessage, BaseMessage
+
+from app.utils.prompt_utils import get_summary_prompt
+from app.utils.redis_utils import get_chat_tail, get_chat_summary, set_chat_summary
+
+load_dotenv()
+
+# The most recent turns are replayed verbatim while they fit the token budget;
+# everything older is folded into a rolling summary cached in Redis. Only the
+# last CHAT_CONTEXT_MAX_MESSAGES messages are read, and each carries the token
+# count it was saved with, so a turn never re-encodes the history. Once a turn
+# that is not in the summary falls out of the budget, it is folded in by a
+# background task together with the oldest verbatim turns, CHAT_SUMMARY_EVERY_TURNS
+# turns at a time, so the next few turns fit again and the summary model is
+# called once every few turns and never inline. Until the summary is written
+# the turn is left out of the prompt rather than going over the budget.
+CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", 2000))
+CHAT_CONTEXT_MAX_MESSAGES = int(os.getenv("CHAT_CONTEXT_MAX_MESSAGES", 40))
+CHAT_CONTEXT_SAMPLE_ROWS = int(os.getenv("CHAT_CONTEXT_SAMPLE_ROWS", 3))
+CHAT_SUMMARY_EVERY_TURNS = int(os.getenv("CHAT_SUMMARY_EVERY_TURNS", 4))
+CHAT_SUMMARY_MODEL = os.getenv("CHAT_SUMMARY_MODEL", "gpt-4.1-mini")
+
+summary_model = init_chat_model(CHAT_SUMMARY_MODEL, model_provider="openai")
+
+@lru_cache(maxsize=1)
+def get_encoding():
+    # Tokenizer of the gpt-4.1 family; tiktoken downloads it on first use
+    try:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        print(f"Tokenizer unavailable, estimating token counts: {e}")
+        return None
+
+def count_tokens(text: str) -> int:
+    encoding = get_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+def render_assistant_message(message: Dict) -> str:
+    """Show result tables to the model as their SQL plus row count and a small sample"""
+    components = message["content"] if isinstance(message["content"], list) else [message["content"]]
+    compact = []
+    for component in components:
+        content = component.get("content") if isinstance(component, dict) else None
+        if isinstance(content, list) and content and isinstance(content[0], dict):
+            compact.append({
+                "component": component.get("component"),
+                "row_count": message.get("row_count", len(content)),
+                "sample": content[:CHAT_CONTEXT_SAMPLE_ROWS],
+            })
+        else:
+            compact.append(component)
+
+    rendered = {"components": compact}
+    if message.get("sql"):
+        rendered["sql"] = message["sql"]
+    return json.dumps(rendered, separators=(",", ":"), default=str)
+
+def render_message(message: Dict) -> str:
+    if message["role"] == "assistant":
+        return render_assistant_message(message)
+    return message["content"]
+
+def get_message_tokens(message: Dict) -> int:
+    # Messages saved before token counts were stored are counted on the fly
+    tokens = message.get("tokens")
+    return tokens if tokens is not None else count_tokens(render_message(message))
+
+def with_token_count(message: Dict) -> Dict:
+    """`message` with the token count of its rendered form, as stored in the history"""
+    return {**message, "tokens": count_tokens(render_message(message))}
+
+# Users whose summary is being extended, and strong references to those tasks
+_summaries_in_progress = set()
+_summary_tasks = set()
+
+async def extend_summary(user_id: str, summary: str, pending: List[Dict]):
+    try:
+        conversation = "\n".join(f"{m['role']}: {render_message(m)}" for m in pending)
+        summary = (await summary_model.ainvoke(get_summary_prompt(summary, conversation))).content
+        await set_chat_summary(user_id, summary, max(m.get("ts", 0) for m in pending))
+    except Exception as e:
+        # The pending turns stay verbatim and are folded on a later turn
+        print(f"Error updating the chat summary: {e}")
+    finally:
+        _summaries_in_progress.discard(user_id)
+
+def schedule_summary(user_id: str, summary: str, pending: List[Dict]):
+    if user_id in _summaries_in_progress:
+        return
+    _summaries_in_progress.add(user_id)
+    task = asyncio.create_task(extend_summary(user_id, summary, pending))
+    _summary_tasks.add(task)
+    task.add_done_callback(_summary_tasks.discard)
+
+async def build_chat_context(user_id: str) -> Tuple[List[BaseMessage], Dict]:
+    """History messages for the prompt, plus token counts for the turn"""
+    (history, history_length), cached = await asyncio.gather(
+        get_chat_tail(user_id, CHAT_CONTEXT_MAX_MESSAGES), get_chat_summary(user_id)
+    )
+    tokens = [get_message_tokens(message) for message in history]
+    summary = cached["summary"]
+    # Turns the summary already covers are never replayed
+    first = next((index for index, message in enumerate(history) if message.get("ts", 0) > cached["covered_until"]), len(history))
+
+    # Take whole user/assistant turns from the end while they fit the budget
+    start, used = len(history), 0
+    while start > first:
+        turn_start = max(first, start - 2)
+        turn_tokens = sum(tokens[turn_start:start])
+        if used + turn_tokens > CHAT_CONTEXT_TOKEN_BUDGET and start < len(history):
+            break
+        used += turn_tokens
+        start = turn_start
+
+    # Fold what did not fit, plus the oldest verbatim turns up to a full batch; never the latest turn
+    if start > first:
+        fold_until = max(start, min(first + 2 * CHAT_SUMMARY_EVERY_TURNS, len(history) - 2))
+        schedule_summary(user_id, summary, history[first:fold_until])
+    verbatim = range(start, len(history))
+
+    messages = []
+    if summary:
+        messages.append(SystemMessage(content=f"Summary of the earlier conversation:\n{summary}"))
+    for index in verbatim:
+        message = history[index]
+        if message["role"] == "user":
+            messages.append(HumanMessage(content=render_message(message)))
+        elif message["role"] == "assistant":
+            messages.append(AIMessage(content=render_message(message)))
+
+    verbatim_tokens = sum(tokens[index] for index in verbatim)
+    summary_tokens = count_tokens(summary) if summary else 0
+    usage = {
+        "history_messages": history_length,
+        "verbatim_messages": len(verbatim),
+        "summarized_messages": history_length - len(verbatim),
+        "pending_summary_messages": start - first,
+        "verbatim_tokens": verbatim_tokens,
+        "summary_tokens": summary_tokens,
+        "context_tokens": verbatim_tokens + summary_tokens,
+    }
+    return messages, usage
+
+@lru_cache(maxsize=256)
+def count_static_tokens(text: str) -> int:
+    """count_tokens for the memoized prompt segments, which repeat on every request"""
+    return count_tokens(text)
+
+# ========= Model usage ========= #
+# Token counts as reported by the provider for every model call of a request,
+# plus process-wide totals, so the prompt cache hit rate can be checked.
+_llm_lock = threading.Lock()
+_llm_totals = {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0, "seconds": 0.0}
+
+def get_message_usage(message) -> Dict:
+    metadata = getattr(message, "usage_metadata", None) or {}
+    return {
+        "prompt_tokens": metadata.get("input_tokens", 0),
+        "cached_tokens": (metadata.get("input_token_details") or {}).get("cache_read", 0),
+        "completion_tokens": metadata.get("output_tokens", 0),
+    }
+
+def get_cache_hit_rate(usage: Dict) -> float:
+    return round(usage["cached_tokens"] / usage["prompt_tokens"], 4) if usage["prompt_tokens"] else 0.0
+
+class LLMUsage:
+    def __init__(self):
+        self.calls = []
+
+    def record(self, step: str, message, seconds: float, first_token_seconds: Optional[float] = None):
+        usage = get_message_usage(message)
+        call = {"step": step, **usage, "ms": round(1000 * seconds, 1)}
+        if first_token_seconds is not None:
+            call["first_token_ms"] = round(1000 * first_token_seconds, 1)
+        self.calls.append(call)
+        with _llm_lock:
+            _llm_totals["calls"] += 1
+            _llm_totals["seconds"] += seconds
+            for key, value in usage.items():
+                _llm_totals[key] += value
+
+    def as_dict(self) -> Dict:
+        totals = {key: sum(call[key] for call in self.calls) for key in ("prompt_tokens", "cached_tokens", "completion_tokens")}
+        return {"calls": self.calls, **totals, "cache_hit_rate": get_cache_hit_rate(totals)}
+
+def get_llm_stats() -> Dict:
+    with _llm_lock:
+        totals = dict(_llm_totals)
+    seconds = totals.pop("seconds")
+    return {**totals, "cache_hit_rate": get_cache_hit_rate(totals), "avg_ms": round(1000 * seconds / totals["calls"], 1) if totals["calls"] else 0.0}
+
+def reset_llm_stats():
+    with _llm_lock:
+        _llm_totals.update({"calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0, "seconds": 0.0})
@@ -0,0 +1,83 @@
+from typing import Dict, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Writes from the CRUD routers are single statements that hand back the row
+# they touched with RETURNING, so a create, update or delete is one round
+# trip instead of a write followed by a SELECT. They run in autocommit mode:
+# a lone statement is atomic anyway, and this saves the BEGIN and COMMIT.
+# Rows carry a version that every update increments; a client that sends the
+# version it read only overwrites the row if nobody changed it in between.
+AUTOCOMMIT = {"isolation_level": "AUTOCOMMIT"}
+
+# Core statements do not null out child foreign keys the way the ORM did, so
+# deleting a row that is still referenced, or writing a duplicate unique value
+# or a dangling reference, fails in Postgres. Those become 409 Conflict; a
+# missing required value or a failed check becomes 422.
+INTEGRITY_STATUS_CODES = {
+    "23502": 422,  # not_null_violation
+    "23503": 409,  # foreign_key_violation
+    "23505": 409,  # unique_violation
+    "23514": 422,  # check_violation
+}
+DEFAULT_INTEGRITY_STATUS_CODE = 409
+
+def integrity_error_to_http(e: IntegrityError) -> HTTPException:
+    """409/422 with Postgres' message and "Key (...)" detail, for a write the database refused"""
+    # asyncpg keeps the SQLSTATE and the detail on the original exception
+    orig = getattr(e.orig, "__cause__", None) or e.orig
+    sqlstate = getattr(orig, "sqlstate", None) or getattr(e.orig, "pgcode", None)
+    detail, key = str(orig).strip().splitlines()[0], getattr(orig, "detail", None)
+    if key and key.startswith("Key "):
+        detail = f"{detail}. {key}"
+    return HTTPException(status_code=INTEGRITY_STATUS_CODES.get(sqlstate, DEFAULT_INTEGRITY_STATUS_CODE), detail=detail)
+
+async def _execute_write(db: AsyncSession, stmt):
+    try:
+        return await db.execute(stmt)
+    except IntegrityError as e:
+        await db.rollback()
+        raise integrity_error_to_http(e) from e
+
+async def _raise_not_written(db: AsyncSession, model, id: int, name: str):
+    # Only reached when no row matched, to tell a missing row from a stale version
+    current = await db.scalar(select(model.__table__.c.version).where(model.__table__.c.id == id))
+    if current is None:
+        raise HTTPException(status_code=404, detail=f"{name} not found")
+    raise HTTPException(status_code=409, detail=f"{name} was changed by someone else, it is now at version {current}")
+
+async def create_row(db: AsyncSession, model, values: Dict) -> Dict:
+    table = model.__table__
+    await db.connection(execution_options=AUTOCOMMIT)
+    row = (await _execute_write(db, insert(table).values(**values).returning(*table.c))).mappings().one()
+    await db.commit()
+    return dict(row)
+
+async def update_row(db: AsyncSession, model, id: int, values: Dict, version: Optional[int] = None, name: str = "Row") -> Dict:
+    """Set `values` on row `id` and return it; with `version`, only if the row is still at that version"""
+    table = model.__table__
+    stmt = update(table).where(table.c.id == id)
+    if version is not None:
+        stmt = stmt.where(table.c.version == version)
+
+    await db.connection(execution_options=AUTOCOMMIT)
+    row = (await _execute_write(db, stmt.values(**values, version=table.c.version + 1).returning(*table.c))).mappings().first()
+    if row is None:
+        await _raise_not_written(db, model, id, name)
+    await db.commit()
+    return dict(row)
+
+async def delete_row(db: AsyncSession, model, id: int, version: Optional[int] = None, name: str = "Row"):
+    table = model.__table__
+    stmt = delete(table).where(table.c.id == id)
+    if version is not None:
+        stmt = stmt.where(table.c.version == version)
+
+    await db.connection(execution_options=AUTOCOMMIT)
+    deleted = (await _execute_write(db, stmt.returning(table.c.id))).scalar()
+    if deleted is None:
+        await _raise_not_written(db, model, id, name)
+    await db.commit()
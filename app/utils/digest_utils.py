@@ -0,0 +1,126 @@
+from typing import Dict, List
+import json
+import os
+
+import numpy as np
+from dotenv import load_dotenv
+
+from app.utils.context_utils import count_tokens
+from app.utils.render_utils import get_column_kind
+
+load_dotenv()
+
+# ========= Result digest ========= #
+# The model never sees the result rows themselves. It gets a columnar digest:
+# per-column statistics computed with numpy (counts, min/max, numeric
+# aggregates, top categories) plus a few rows spread evenly over the result,
+# shrunk until it fits CHAT_DIGEST_TOKEN_BUDGET. Tables and charts in its
+# reply point at the result, and attach_result puts the rows back in.
+# The statistics describe the rows of the page only; when more rows exist the
+# digest says so ("scope": "first_page") and the prompt forbids presenting
+# them as totals of the whole result.
+CHAT_DIGEST_TOKEN_BUDGET = int(os.getenv("CHAT_DIGEST_TOKEN_BUDGET", 1500))
+CHAT_DIGEST_TOP_K = int(os.getenv("CHAT_DIGEST_TOP_K", 5))
+CHAT_DIGEST_SAMPLE_ROWS = int(os.getenv("CHAT_DIGEST_SAMPLE_ROWS", 8))
+CHAT_DIGEST_MAX_TEXT_CHARS = 80
+
+DATA_COMPONENTS = ("table", "pie_chart", "bar_chart")
+
+def shorten(value):
+    if isinstance(value, str) and len(value) > CHAT_DIGEST_MAX_TEXT_CHARS:
+        return value[:CHAT_DIGEST_MAX_TEXT_CHARS] + "..."
+    return value
+
+def round_number(value: float):
+    return int(value) if float(value).is_integer() else round(float(value), 4)
+
+def get_top_values(values: np.ndarray, top_k: int) -> List[List]:
+    uniques, counts = np.unique(values, return_counts=True)
+    order = np.argsort(-counts, kind="stable")[:top_k]
+    return [[shorten(uniques[i]), int(counts[i])] for i in order]
+
+def to_datetime(value: str) -> np.datetime64:
+    date, _, time = value.replace("T", " ").partition(" ")
+    if date[2] == "-":
+        # DD-MM-YYYY, as the chat SQL formats dates
+        date = f"{date[6:10]}-{date[3:5]}-{date[0:2]}"
+    return np.datetime64(f"{date}T{time}" if time else date, "us")
+
+def describe_column(values: List, top_k: int) -> Dict:
+    """Statistics of one result column"""
+    kind = get_column_kind(values)
+    present = [value for value in values if value is not None]
+    stats = {"kind": kind, "nulls": len(values) - len(present)}
+    if not present:
+        return stats
+
+    if kind == "number":
+        array = np.fromiter((float(value) for value in present), dtype=np.float64, count=len(present))
+        stats.update({
+            "min": round_number(array.min()),
+            "max": round_number(array.max()),
+            "mean": round_number(array.mean()),
+            "median": round_number(np.median(array)),
+            "sum": round_number(array.sum()),
+        })
+        stats["distinct"] = int(np.unique(array).size)
+    elif kind == "date":
+        array = np.array([to_datetime(value) for value in present])
+        stats.update({"min": present[int(array.argmin())], "max": present[int(array.argmax())]})
+        stats["distinct"] = int(np.unique(array).size)
+    else:
+        array = np.array([str(value) for value in present], dtype=object)
+        stats["distinct"] = int(np.unique(array).size)
+        stats["top"] = get_top_values(array, top_k)
+    return stats
+
+def get_sample_indexes(row_count: int, sample_rows: int) -> np.ndarray:
+    """Rows spread evenly over the result, always including the first and last"""
+    if sample_rows <= 0 or row_count == 0:
+        return np.array([], dtype=int)
+    return np.unique(np.linspace(0, row_count - 1, num=min(sample_rows, row_count)).round().astype(int))
+
+def build_digest(rows: List[Dict], has_more: bool, column_stats: Dict, sample_rows: int, top_k: int) -> Dict:
+    stats = {}
+    for name, column in column_stats.items():
+        stats[name] = dict(column, top=column["top"][:top_k]) if "top" in column else column
+
+    return {
+        "scope": "first_page" if has_more else "full_result",
+        "row_count": len(rows),
+        "more_rows": has_more,
+        "columns": stats,
+        "sample": [{name: shorten(rows[i].get(name)) for name in stats} for i in get_sample_indexes(len(rows), sample_rows)],
+    }
+
+def dump_digest(digest: Dict) -> str:
+    return json.dumps(digest, separators=(",", ":"), default=str)
+
+def build_result_digest(page: Dict, token_budget: int = CHAT_DIGEST_TOKEN_BUDGET) -> Dict:
+    """Digest of a result page that fits `token_budget`: fewer sample rows first, then fewer top values, then fewer columns"""
+    rows, has_more = page["rows"], page.get("has_more", False)
+    columns = list(rows[0].keys()) if rows else []
+    column_stats = {name: describe_column([row.get(name) for row in rows], CHAT_DIGEST_TOP_K) for name in columns}
+
+    steps = [(CHAT_DIGEST_SAMPLE_ROWS, CHAT_DIGEST_TOP_K), (CHAT_DIGEST_SAMPLE_ROWS // 2, CHAT_DIGEST_TOP_K), (2, 3), (0, 3), (0, 1)]
+    for sample_rows, top_k in steps:
+        digest = build_digest(rows, has_more, column_stats, sample_rows, top_k)
+        if count_tokens(dump_digest(digest)) <= token_budget:
+            return digest
+
+    # Still too large: keep as many leading columns as fit
+    while len(column_stats) > 1:
+        column_stats.popitem()
+        digest = build_digest(rows, has_more, column_stats, 0, 1)
+        digest["columns_not_shown"] = len(columns) - len(column_stats)
+        if count_tokens(dump_digest(digest)) <= token_budget:
+            break
+    return digest
+
+def attach_result(components: List[Dict], page: Dict) -> List[Dict]:
+    """Put the result rows into the table / chart components the model pointed at the result"""
+    for component in components if isinstance(components, list) else []:
+        if isinstance(component, dict) and component.get("component") in DATA_COMPONENTS and not isinstance(component.get("content"), list):
+            component["content"] = page["rows"]
+            component["next_cursor"] = page.get("next_cursor")
+    return components
@@ -0,0 +1,148 @@
+from typing import Dict, Iterator, List, Optional, Tuple, Type
+import asyncio
+import codecs
+import csv
+import enum
+import itertools
+import json
+import os
+import time
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, UploadFile
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import Enum, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.utils.crud_utils import integrity_error_to_http
+
+load_dotenv()
+
+# Bulk imports validate the upload row by row while it is read and insert the
+# valid rows in multi-row INSERT batches, all in one transaction. Invalid rows
+# are reported back with their row number instead of failing the upload.
+# Reading and validating a batch is CPU work on a blocking file, so it runs
+# in a worker thread while the event loop keeps serving other requests.
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 1000))
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", 1000))
+
+def get_format(file: UploadFile, format: Optional[str]) -> str:
+    if format:
+        return format
+    name = (file.filename or "").lower()
+    if name.endswith((".ndjson", ".jsonl")) or "ndjson" in (file.content_type or ""):
+        return "ndjson"
+    return "csv"
+
+def iter_records(file: UploadFile, format: str) -> Iterator[Tuple[int, Dict]]:
+    """Yield (row number, raw record) without reading the whole upload into memory"""
+    lines = codecs.iterdecode(file.file, "utf-8-sig")
+    if format == "csv":
+        for number, record in enumerate(csv.DictReader(lines), start=1):
+            # Empty CSV cells mean "not given", so optional fields fall back to their defaults
+            yield number, {key: value for key, value in record.items() if key is not None and value != ""}
+        return
+
+    number = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            yield number, json.loads(line)
+        except json.JSONDecodeError as e:
+            yield number, e
+
+def to_enum(enum_class: Type[enum.Enum], value):
+    """Accept an enum member by name (IN_USE) or by value (In Use)"""
+    if isinstance(value, enum_class) or value is None:
+        return value
+    if value in enum_class.__members__:
+        return enum_class[value]
+    return enum_class(value)
+
+def validate_record(model, schema: Type[BaseModel], record) -> Tuple[Optional[Dict], List[str]]:
+    if isinstance(record, Exception):
+        return None, [f"invalid JSON: {record}"]
+    if not isinstance(record, dict):
+        return None, ["expected a JSON object"]
+    try:
+        row = schema.model_validate(record).model_dump()
+    except ValidationError as e:
+        return None, [f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()]
+
+    errors = []
+    for column in model.__table__.c:
+        if isinstance(column.type, Enum) and column.type.enum_class and column.key in row:
+            try:
+                row[column.key] = to_enum(column.type.enum_class, row[column.key])
+            except ValueError:
+                errors.append(f"{column.key}: expected one of {[member.value for member in column.type.enum_class]}")
+    return (None, errors) if errors else (row, [])
+
+def read_batch(records: Iterator[Tuple[int, Dict]], model, schema: Type[BaseModel], progress: Dict) -> Tuple[List[Dict], List[Dict]]:
+    """Parse and validate up to IMPORT_BATCH_SIZE records; blocking, run it in a thread"""
+    rows, failures = [], []
+    for number, record in itertools.islice(records, IMPORT_BATCH_SIZE):
+        progress["received"] += 1
+        row, row_errors = validate_record(model, schema, record)
+        if row_errors:
+            failures.append({"row": number, "errors": row_errors})
+        else:
+            rows.append(row)
+    return rows, failures
+
+async def import_rows(
+    db: AsyncSession,
+    file: UploadFile,
+    model,
+    schema: Type[BaseModel],
+    format: Optional[str] = None,
+    atomic: bool = False,
+) -> Dict:
+    """Validate an uploaded CSV/NDJSON file against `schema` and insert its valid rows into `model`"""
+    format = get_format(file, format)
+    start = time.perf_counter()
+    records, progress = iter_records(file, format), {"received": 0}
+    imported, failed, errors = 0, 0, []
+
+    try:
+        while True:
+            rows, failures = await asyncio.to_thread(read_batch, records, model, schema, progress)
+            if not rows and not failures:
+                break
+            failed += len(failures)
+            errors.extend(failures[:IMPORT_MAX_ERRORS - len(errors)])
+            if rows:
+                await db.execute(insert(model), rows)
+                imported += len(rows)
+
+        if atomic and failed:
+            await db.rollback()
+            imported = 0
+        else:
+            await db.commit()
+    except UnicodeDecodeError as e:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail=f"Upload is not valid UTF-8: {e}")
+    except csv.Error as e:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail=f"Malformed CSV near row {progress['received'] + 1}: {e}")
+    except IntegrityError as e:
+        # Constraint violations (duplicate keys, unknown foreign keys) abort the whole transaction,
+        # and are reported like the same violation on a single write
+        await db.rollback()
+        raise integrity_error_to_http(e) from e
+
+    seconds = time.perf_counter() - start
+    return {
+        "format": format,
+        "rows_received": progress["received"],
+        "rows_imported": imported,
+        "rows_failed": failed,
+        "errors": errors,
+        "errors_truncated": failed > len(errors),
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(progress["received"] / seconds, 1) if seconds else 0.0,
+    }
@@ -0,0 +1,124 @@
+from typing import Dict, List
+import asyncio
+import os
+import time
+
+from dotenv import load_dotenv
+from sqlalchemy import insert, select
+
+from app.config.database import AsyncSessionLocal
+from app.models import models
+from app.utils.status_utils import record_tracking_events
+
+load_dotenv()
+
+# Tracking events are group-committed: they collect in an in-process buffer
+# that is flushed as one multi-row INSERT once TRACKING_FLUSH_SIZE events are
+# waiting or TRACKING_FLUSH_INTERVAL_MS after the first one arrived. Batch and
+# employee references are checked with one SELECT ... IN per flush. Events
+# still in the buffer are lost if the process dies, so callers that need
+# durability wait for the flush that commits their events. The same
+# transaction moves batch_current_status to the newest event of each batch.
+TRACKING_FLUSH_SIZE = int(os.getenv("TRACKING_FLUSH_SIZE", 500))
+TRACKING_FLUSH_INTERVAL_MS = int(os.getenv("TRACKING_FLUSH_INTERVAL_MS", 50))
+TRACKING_MAX_PENDING = int(os.getenv("TRACKING_MAX_PENDING", 20000))
+
+class BufferFull(Exception):
+    pass
+
+class TrackingBuffer:
+    def __init__(self, flush_size: int = TRACKING_FLUSH_SIZE, flush_interval_ms: int = TRACKING_FLUSH_INTERVAL_MS, max_pending: int = TRACKING_MAX_PENDING):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_pending = max_pending
+        self.pending = []
+        self.timer = None
+        self.tasks = set()
+        self.stats = {"events": 0, "committed": 0, "rejected": 0, "failed": 0, "flushes": 0, "flush_seconds": 0.0}
+
+    def add(self, rows: List[Dict]) -> List[asyncio.Future]:
+        """Queue rows for the next flush; each future resolves to {"id": ...} or {"error": ...}"""
+        if len(self.pending) + len(rows) > self.max_pending:
+            raise BufferFull(f"{len(self.pending)} tracking events are already waiting to be written")
+
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in rows]
+        self.pending.extend(zip(rows, futures))
+        self.stats["events"] += len(rows)
+
+        if len(self.pending) >= self.flush_size:
+            self.start_flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.flush_interval, self.start_flush)
+        return futures
+
+    def start_flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        while self.pending:
+            events, self.pending = self.pending[:self.flush_size], self.pending[self.flush_size:]
+            task = asyncio.create_task(self.flush(events))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def flush(self, events: List):
+        start = time.perf_counter()
+        results = [None] * len(events)
+        try:
+            async with AsyncSessionLocal() as db:
+                batch_ids = {row["batch_id"] for row, _ in events}
+                employee_ids = {row["handled_by"] for row, _ in events}
+                known_batches = set(await db.scalars(select(models.Batch.id).where(models.Batch.id.in_(batch_ids))))
+                known_employees = set(await db.scalars(select(models.Employee.id).where(models.Employee.id.in_(employee_ids))))
+
+                accepted = []
+                for i, (row, _) in enumerate(events):
+                    if row["batch_id"] not in known_batches:
+                        results[i] = {"error": "Batch not found"}
+                    elif row["handled_by"] not in known_employees:
+                        results[i] = {"error": "Employee not found"}
+                    else:
+                        accepted.append(i)
+
+                if accepted:
+                    table = models.BatchTracking.__table__
+                    stmt = insert(models.BatchTracking).returning(*table.c, sort_by_parameter_order=True)
+                    inserted = (await db.execute(stmt, [events[i][0] for i in accepted])).mappings().all()
+                    await record_tracking_events(db, inserted)
+                    await db.commit()
+                    for i, row in zip(accepted, inserted):
+                        results[i] = {"id": row["id"]}
+            self.stats["committed"] += len(accepted)
+            self.stats["rejected"] += len(events) - len(accepted)
+        except Exception as e:
+            print(f"Error flushing tracking events: {e}")
+            results = [{"error": "Events could not be written"}] * len(events)
+            self.stats["failed"] += len(events)
+
+        self.stats["flushes"] += 1
+        self.stats["flush_seconds"] += time.perf_counter() - start
+        for (_, future), result in zip(events, results):
+            # A durable caller that disconnected has cancelled its future
+            if not future.done():
+                future.set_result(result)
+
+    async def close(self):
+        """Write out everything still buffered, e.g. on shutdown"""
+        self.start_flush()
+        while self.tasks:
+            await asyncio.gather(*list(self.tasks))
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        flushes = stats.pop("flushes")
+        flush_seconds = stats.pop("flush_seconds")
+        return {
+            **stats,
+            "pending": len(self.pending),
+            "flushes": flushes,
+            "avg_flush_size": (stats["committed"] + stats["rejected"] + stats["failed"]) / flushes if flushes else 0.0,
+            "avg_flush_ms": 1000 * flush_seconds / flushes if flushes else 0.0,
+        }
+
+tracking_buffer = TrackingBuffer()
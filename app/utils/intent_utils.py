@@ -0,0 +1,286 @@
+from datetime import datetime
+from difflib import SequenceMatcher
+from typing import Dict, Optional, Tuple
+import asyncio
+import os
+import re
+import threading
+import time
+
+from dotenv import load_dotenv
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql
+
+from app.config.database import ChatSessionLocal
+from app.config.embedding_cache import normalize_query
+from app.models import models
+
+load_dotenv()
+
+# ========= Intent templates ========= #
+# Most chat traffic is a handful of question shapes. Each one is a template:
+# patterns over the normalized question, whose named groups are slots, plus
+# the SQL and text the model would have produced. A slot only resolves to a
+# value the database actually holds (department names, batch codes, enum
+# values) or to a parsed date, and the whole match is dropped when a slot is
+# unknown or ambiguous, so anything uncertain still goes to the model.
+CHAT_INTENT_ENABLED = os.getenv("CHAT_INTENT_ENABLED", "true").lower() == "true"
+CHAT_INTENT_MIN_SIMILARITY = float(os.getenv("CHAT_INTENT_MIN_SIMILARITY", "0.85"))
+CHAT_INTENT_AMBIGUITY_MARGIN = 0.05
+CHAT_INTENT_VOCABULARY_TTL_SECONDS = int(os.getenv("CHAT_INTENT_VOCABULARY_TTL_SECONDS", 300))
+CHAT_INTENT_VOCABULARY_MAX_VALUES = int(os.getenv("CHAT_INTENT_VOCABULARY_MAX_VALUES", 100_000))
+
+DEPARTMENT = r"(?:the )?(?P<department>.+?)(?: department| dept| team)?"
+BATCH_CODE = r"(?P<batch_code>[\w.\-/]+)"
+DATE = r"(?P<date>.+)"
+
+INTENT_TEMPLATES = [
+    {
+        "name": "employee_count_by_department",
+        "patterns": [
+            rf"how many (?:employees|people|staff)(?: are there| are| work| do we have)? (?:in|at|on) {DEPARTMENT}",
+            rf"(?:number|count) of (?:employees|people|staff) (?:in|at|on) {DEPARTMENT}",
+        ],
+        "component": "number",
+        "text": "Number of employees in {department}.",
+        "sql": "SELECT COUNT(*) AS employee_count FROM employees e JOIN departments d ON d.id = e.department_id WHERE d.name = :department",
+    },
+    {
+        "name": "employees_in_department",
+        "patterns": [
+            rf"(?:list|show|show me|who are)(?: all)?(?: the)? (?:employees|people|staff) (?:in|of|from|at) {DEPARTMENT}",
+        ],
+        "component": "table",
+        "text": "Employees in {department}.",
+        "sql": (
+            "SELECT e.name, e.email, e.designation, to_char(e.date_joined, 'DD-MM-YYYY') AS date_joined "
+            "FROM employees e JOIN departments d ON d.id = e.department_id WHERE d.name = :department ORDER BY e.name"
+        ),
+    },
+    {
+        "name": "batch_status",
+        "patterns": [
+            rf"(?:what is |what's )?(?:the )?(?:current |latest )?status of batch {BATCH_CODE}",
+            rf"where is batch {BATCH_CODE}(?: now| right now)?",
+        ],
+        "component": "table",
+        "text": "Current status of batch {batch_code}.",
+        "sql": (
+            "SELECT b.batch_code, s.status, s.location, to_char(s.timestamp, 'DD-MM-YYYY HH24:MI') AS updated_at, e.name AS handled_by "
+            "FROM batches b JOIN batch_current_status s ON s.batch_id = b.id LEFT JOIN employees e ON e.id = s.handled_by "
+            "WHERE b.batch_code = :batch_code"
+        ),
+    },
+    {
+        "name": "batch_count_by_status",
+        "patterns": [
+            r"how many batches are(?: currently)? (?P<batch_status>.+?)(?: right now| now)?",
+        ],
+        "component": "number",
+        "text": "Number of batches that are {batch_status}.",
+        "sql": "SELECT COUNT(*) AS batch_count FROM batch_current_status WHERE status = :batch_status",
+    },
+    {
+        "name": "assets_warranty_expiring",
+        "patterns": [
+            rf"(?:list |show |show me |which )?(?:all )?(?:the )?assets (?:with (?:a )?|have )?warranty (?:expiring|ending|that expires|that ends) before {DATE}",
+            rf"(?:list |show |show me |which )?(?:all )?(?:the )?assets whose warranty (?:expires|ends) before {DATE}",
+        ],
+        "component": "table",
+        "text": "Assets with a warranty expiring before {date}.",
+        "sql": (
+            "SELECT asset_tag, name, category, location, to_char(warranty_until, 'DD-MM-YYYY') AS warranty_until "
+            "FROM assets WHERE warranty_until < :date ORDER BY warranty_until, asset_tag"
+        ),
+    },
+]
+for template in INTENT_TEMPLATES:
+    template["patterns"] = [re.compile(pattern) for pattern in template["patterns"]]
+
+DATE_FORMATS = ("%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y", "%d.%m.%Y", "%d %B %Y", "%d %b %Y", "%B %d %Y", "%b %d %Y")
+
+# ========= Slot values ========= #
+# Slot name -> (column holding its values, fuzzy matching allowed). Batch codes
+# must match exactly, names tolerate small spelling mistakes.
+VOCABULARY_COLUMNS = {
+    "department": (models.Department.name, True),
+    "batch_code": (models.Batch.batch_code, False),
+}
+# Enum slots only match their display values or these synonyms, exactly:
+# "undelivered" is one edit away from "delivered" but means the opposite
+ENUM_SYNONYMS = {
+    "batch_status": {
+        models.BatchStatus.MANUFACTURED: ("manufactured", "produced", "made"),
+        models.BatchStatus.IN_TRANSIT: ("in transit", "on the way", "en route", "being shipped", "shipping"),
+        models.BatchStatus.DELIVERED: ("delivered", "received", "arrived"),
+    },
+}
+# Enum slots: phrase -> (persisted name, display value)
+ENUM_SLOTS = {
+    slot: {phrase: (member.name, member.value) for member, phrases in synonyms.items() for phrase in phrases}
+    for slot, synonyms in ENUM_SYNONYMS.items()
+}
+# Negated phrases are never fuzzy-matched to a value without the negation
+NEGATION_PATTERN = re.compile(r"^(?:un|non)-?\w|\b(?:not|no|never|without|except|isn't|aren't)\b")
+
+_vocabulary = {"loaded_at": None, "values": {}}
+_vocabulary_lock = asyncio.Lock()
+
+async def get_vocabulary() -> Dict[str, Optional[Dict[str, Tuple[str, str]]]]:
+    """Known slot values by casefolded text, reloaded every CHAT_INTENT_VOCABULARY_TTL_SECONDS"""
+    loaded_at = _vocabulary["loaded_at"]
+    if loaded_at is not None and time.monotonic() - loaded_at < CHAT_INTENT_VOCABULARY_TTL_SECONDS:
+        return _vocabulary["values"]
+
+    async with _vocabulary_lock:
+        if _vocabulary["loaded_at"] != loaded_at:
+            return _vocabulary["values"]
+        values = {}
+        async with ChatSessionLocal() as db:
+            for slot, (column, _) in VOCABULARY_COLUMNS.items():
+                stmt = select(column).where(column.isnot(None)).distinct().limit(CHAT_INTENT_VOCABULARY_MAX_VALUES + 1)
+                rows = (await db.scalars(stmt)).all()
+                # Too many values to hold: the slot never resolves and its questions go to the model
+                values[slot] = {value.casefold(): (value, value) for value in rows} if len(rows) <= CHAT_INTENT_VOCABULARY_MAX_VALUES else None
+        _vocabulary.update(loaded_at=time.monotonic(), values=values)
+        return values
+
+def resolve_value(phrase: str, values: Dict[str, Tuple[object, str]], fuzzy: bool) -> Optional[Tuple[object, str, float]]:
+    """(value, display, similarity) of the known value closest to `phrase`; None when unknown or ambiguous"""
+    key = phrase.strip().casefold()
+    if key in values:
+        return (*values[key], 1.0)
+    if not fuzzy or not values:
+        return None
+
+    negated = bool(NEGATION_PATTERN.search(key))
+    scored = sorted(
+        (SequenceMatcher(None, key, candidate).ratio(), candidate)
+        for candidate in values if bool(NEGATION_PATTERN.search(candidate)) == negated
+    )[::-1]
+    if not scored:
+        return None
+    best, candidate = scored[0]
+    if best < CHAT_INTENT_MIN_SIMILARITY:
+        return None
+    if len(scored) > 1 and best - scored[1][0] < CHAT_INTENT_AMBIGUITY_MARGIN:
+        return None
+    return (*values[candidate], best)
+
+def parse_date(phrase: str) -> Optional[Tuple[object, str, float]]:
+    phrase = re.sub(r"(\d)(st|nd|rd|th)\b", r"\1", phrase.replace(",", " "))
+    phrase = re.sub(r"\s+", " ", phrase).strip()
+    for date_format in DATE_FORMATS:
+        try:
+            parsed = datetime.strptime(phrase, date_format).date()
+        except ValueError:
+            continue
+        return parsed, parsed.strftime("%d-%m-%Y"), 1.0
+    return None
+
+def resolve_slot(slot: str, phrase: str, vocabulary: Dict) -> Optional[Tuple[object, str, float]]:
+    if slot == "date":
+        return parse_date(phrase)
+    if slot in ENUM_SLOTS:
+        return resolve_value(phrase, ENUM_SLOTS[slot], fuzzy=False)
+    values = vocabulary.get(slot)
+    if values is None:
+        return None
+    return resolve_value(phrase, values, fuzzy=VOCABULARY_COLUMNS[slot][1])
+
+def render_sql(sql: str, params: Dict) -> str:
+    """Inline the slot values as escaped literals; result paging and caching work on the SQL text"""
+    statement = text(sql).bindparams(**params)
+    return str(statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+def find_matches(query: str):
+    for template in INTENT_TEMPLATES:
+        for pattern in template["patterns"]:
+            match = pattern.fullmatch(query)
+            if match is not None:
+                yield template, match
+
+def build_plan(template: Dict, match: re.Match, vocabulary: Dict) -> Optional[Dict]:
+    params, display, confidence = {}, {}, 1.0
+    for slot, phrase in match.groupdict().items():
+        resolved = resolve_slot(slot, phrase, vocabulary)
+        if resolved is None:
+            return None
+        params[slot], display[slot], score = resolved
+        confidence = min(confidence, score)
+
+    return {
+        "type": "sql",
+        "component": template["component"],
+        "text": template["text"].format(**display),
+        "sql": render_sql(template["sql"], params),
+        "intent": {"name": template["name"], "confidence": round(confidence, 3)},
+    }
+
+def pick_plan(matches, vocabulary: Dict) -> Optional[Dict]:
+    """Plan of the first (template, match) whose slots all resolve"""
+    for template, match in matches:
+        plan = build_plan(template, match, vocabulary)
+        if plan is not None:
+            return plan
+    return None
+
+async def match_intent(query: str) -> Optional[Dict]:
+    """A ready SQL plan for questions that fit a template, None when the model has to plan it"""
+    if not CHAT_INTENT_ENABLED:
+        return None
+
+    start = time.perf_counter()
+    matches = list(find_matches(normalize_query(query)))
+    plan = pick_plan(matches, await get_vocabulary()) if matches else None
+    pattern_matched = bool(matches)
+
+    seconds = time.perf_counter() - start
+    if plan is not None:
+        plan["intent"]["match_ms"] = round(1000 * seconds, 2)
+    record_match(plan["intent"]["name"] if plan else None, pattern_matched, seconds)
+    return plan
+
+# ========= Stats ========= #
+# Coverage is the share of chat requests answered by a template; latency is
+# kept per path (intent / cache / model) so the fast path can be compared.
+_intent_lock = threading.Lock()
+_intent_stats = {"requests": 0, "matched": 0, "unresolved": 0, "match_seconds": 0.0, "intents": {}}
+_path_latency = {}
+
+def record_match(intent: Optional[str], pattern_matched: bool, seconds: float):
+    with _intent_lock:
+        _intent_stats["requests"] += 1
+        _intent_stats["match_seconds"] += seconds
+        if intent is not None:
+            _intent_stats["matched"] += 1
+            _intent_stats["intents"][intent] = _intent_stats["intents"].get(intent, 0) + 1
+        elif pattern_matched:
+            # Question had a known shape but a slot value was unknown or ambiguous
+            _intent_stats["unresolved"] += 1
+
+def record_response(path: str, seconds: float):
+    with _intent_lock:
+        count, total = _path_latency.get(path, (0, 0.0))
+        _path_latency[path] = (count + 1, total + seconds)
+
+def get_intent_stats() -> Dict:
+    with _intent_lock:
+        stats = dict(_intent_stats, intents=dict(_intent_stats["intents"]))
+        latency = dict(_path_latency)
+    requests = stats["requests"]
+    return {
+        "enabled": CHAT_INTENT_ENABLED,
+        "requests": requests,
+        "matched": stats["matched"],
+        "unresolved": stats["unresolved"],
+        "coverage": round(stats["matched"] / requests, 4) if requests else 0.0,
+        "avg_match_ms": round(1000 * stats["match_seconds"] / requests, 3) if requests else 0.0,
+        "intents": stats["intents"],
+        "latency": {path: {"requests": count, "avg_ms": round(1000 * total / count, 1)} for path, (count, total) in latency.items()},
+    }
+
+def reset_intent_stats():
+    with _intent_lock:
+        _intent_stats.update({"requests": 0, "matched": 0, "unresolved": 0, "match_seconds": 0.0, "intents": {}})
+        _path_latency.clear()
@@ -0,0 +1,174 @@
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Literal, Optional, Sequence, Type
+import base64
+import json
+import os
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, Query, Response
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from sqlalchemy import DateTime, and_, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, load_only, selectinload
+
+load_dotenv()
+
+# List endpoints read one keyset page at a time: rows come back ordered by
+# (sort column, id) and the next page starts after the last row seen, so a
+# deep page costs the same index seek as the first one. The cursor for the
+# next page is sent in the X-Next-Cursor header; the body stays a plain list.
+# Related rows are only returned when named in `expand=`, and are loaded with
+# a fixed number of queries whatever the page size: a JOIN for many-to-one
+# relationships and one extra SELECT ... IN per collection.
+LIST_DEFAULT_LIMIT = int(os.getenv("LIST_DEFAULT_LIMIT", 100))
+LIST_MAX_LIMIT = int(os.getenv("LIST_MAX_LIMIT", 1000))
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+class ListParams:
+    def __init__(
+        self,
+        limit: int = Query(LIST_DEFAULT_LIMIT, ge=1, le=LIST_MAX_LIMIT),
+        cursor: Optional[str] = Query(None, description=f"Value of the {NEXT_CURSOR_HEADER} header of the previous page"),
+        sort: str = Query("id", description="Column to page on; rows without a value are left out when it is not id"),
+        order: Literal["asc", "desc"] = Query("asc"),
+        fields: Optional[str] = Query(None, description="Comma separated columns to return, e.g. id,name"),
+        expand: Optional[str] = Query(None, description="Comma separated relationships to include, e.g. product,creator"),
+    ):
+        self.limit = limit
+        self.cursor = cursor
+        self.sort = sort
+        self.order = order
+        self.fields = fields
+        self.expand = expand
+
+# ========= Expansions ========= #
+def get_expansions(expand: Optional[str], expansions: Dict[str, Type[BaseModel]]) -> List[str]:
+    if not expand:
+        return []
+    requested = [name.strip() for name in expand.split(",") if name.strip()]
+    unknown = [name for name in requested if name not in expansions]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Cannot expand {unknown}, choose from {list(expansions)}")
+    return requested
+
+def get_loader_options(model, names: List[str]) -> List:
+    options = []
+    for name in names:
+        relationship = getattr(model, name)
+        # A JOIN per collection would repeat the parent row, collections get their own SELECT ... IN
+        options.append(selectinload(relationship) if relationship.property.uselist else joinedload(relationship))
+    return options
+
+def serialize(obj, fields: List[str], names: List[str], expansions: Dict[str, Type[BaseModel]]) -> Dict:
+    item = {field: getattr(obj, field) for field in fields}
+    for name in names:
+        related, schema = getattr(obj, name), expansions[name]
+        if isinstance(related, list):
+            item[name] = [schema.model_validate(value) for value in related]
+        else:
+            item[name] = schema.model_validate(related) if related is not None else None
+    return item
+
+async def get_one(db: AsyncSession, model, id: int, expand: Optional[str] = None, expansions: Optional[Dict[str, Type[BaseModel]]] = None):
+    """The row with primary key `id` and its requested expansions, or None"""
+    expansions = expansions or {}
+    names = get_expansions(expand, expansions)
+    obj = await db.get(model, id, options=get_loader_options(model, names))
+    if obj is None or not names:
+        return obj
+    return serialize(obj, list(model.__table__.c.keys()), names, expansions)
+
+# ========= Filters ========= #
+def equals(column, value):
+    return None if value is None else column == value
+
+def in_range(column, start: Optional[date] = None, end: Optional[date] = None):
+    """Inclusive range; a plain date as the end of a timestamp range covers that whole day"""
+    conditions = []
+    if start is not None:
+        conditions.append(column >= start)
+    if end is not None:
+        if isinstance(column.type, DateTime) and not isinstance(end, datetime):
+            conditions.append(column < end + timedelta(days=1))
+        else:
+            conditions.append(column <= end)
+    return and_(*conditions) if conditions else None
+
+# ========= Cursors ========= #
+def encode_cursor(sort: str, values: Sequence) -> str:
+    raw = json.dumps({"sort": sort, "values": jsonable_encoder(list(values))}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort: str, columns: Sequence) -> List:
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if raw["sort"] != sort or len(raw["values"]) != len(columns):
+            raise ValueError("cursor belongs to another sort order")
+        values = []
+        for column, value in zip(columns, raw["values"]):
+            python_type = column.type.python_type
+            values.append(python_type.fromisoformat(value) if python_type in (date, datetime) else python_type(value))
+        return values
+    except (ValueError, KeyError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {e}")
+
+# ========= Query ========= #
+def get_fields(model, fields: Optional[str]) -> List[str]:
+    columns = list(model.__table__.c.keys())
+    if not fields:
+        return columns
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in columns]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields {unknown}, choose from {columns}")
+    return requested
+
+async def list_query(
+    db: AsyncSession,
+    model,
+    params: ListParams,
+    response: Response,
+    filters: Iterable = (),
+    sort_columns: Sequence[str] = ("id",),
+    expansions: Optional[Dict[str, Type[BaseModel]]] = None,
+) -> List[Dict]:
+    """One keyset page of `model` rows, with only the requested columns selected"""
+    expansions = expansions or {}
+    if params.sort not in sort_columns:
+        raise HTTPException(status_code=400, detail=f"Cannot sort on {params.sort}, choose from {list(sort_columns)}")
+
+    table = model.__table__
+    fields = get_fields(model, params.fields)
+    names = get_expansions(params.expand, expansions)
+    keys = [table.c.id] if params.sort == "id" else [table.c[params.sort], table.c.id]
+
+    # Key columns are read even when not requested, the next cursor is built from them
+    columns = [table.c[field] for field in fields] + [key for key in keys if key.key not in fields]
+    if names:
+        stmt = select(model).options(load_only(*[getattr(model, column.key) for column in columns]), *get_loader_options(model, names))
+    else:
+        stmt = select(*columns)
+    stmt = stmt.where(*[condition for condition in filters if condition is not None])
+    if params.sort != "id":
+        stmt = stmt.where(keys[0].isnot(None))
+
+    if params.cursor:
+        values = decode_cursor(params.cursor, params.sort, keys)
+        position = tuple_(*keys) if len(keys) > 1 else keys[0]
+        after = tuple_(*values) if len(values) > 1 else values[0]
+        stmt = stmt.where(position > after if params.order == "asc" else position < after)
+
+    stmt = stmt.order_by(*[key.asc() if params.order == "asc" else key.desc() for key in keys])
+    # One extra row tells whether another page exists
+    result = await db.execute(stmt.limit(params.limit + 1))
+    rows = result.unique().scalars().all() if names else result.mappings().all()
+
+    if len(rows) > params.limit:
+        rows = rows[:params.limit]
+        last = rows[-1]
+        values = [getattr(last, key.key) if names else last[key.key] for key in keys]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(params.sort, values)
+    if names:
+        return [serialize(row, fields, names, expansions) for row in rows]
+    return [{field: row[field] for field in fields} for row in rows]
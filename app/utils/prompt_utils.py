@@ -1,7 +1,15 @@
+from functools import lru_cache
+from typing import Iterable, Tuple
 
+# Prompts are assembled from the most to the least stable segment: static
+# instructions, then the schema block, then history, then the user's query.
+# Provider-side prompt caching matches on the longest common prefix, so
+# nothing that changes per request may appear before a part that does not.
+# The static segments are rendered once and reused byte for byte.
 
-def get_prompt(schema_context: str):
- return  f"""
+@lru_cache(maxsize=1)
+def get_instructions() -> str:
+ return  """
     You are 'Lark AI', an intelligent chatbot assistant integrated into an organization's dashboard.
     Users will ask questions in **natural language**, and possibly ask **follow-up questions** based on earlier parts of the conversation.
 
@@ -16,6 +24,7 @@ def get_prompt(schema_context: str):
     - Only generate valid SELECT SQL queries.
     - Format dates in "DD-MM-YYYY" format.
     - Select only relevant columns.
+    - When a query can return many rows, end it with an ORDER BY whose last column is unique (e.g. id) so the result can be paged.
     - Translate vague time expressions (e.g., "this quarter" → actual dates)
     - If user query is demanding for relationship between tables, generate a valid SQL query with JOINs.
     - SQL should be compatible with Python SQLAlchemy and Postgres and ready to run via: db.execute(text(sql_query)) 
@@ -46,31 +55,48 @@ def get_prompt(schema_context: str):
     - "I'm sorry, I need more specific information to assist you."
     - "This query appears to be outside the current scope of supported questions."
 
-    Schemas:
-    {schema_context}
-
     Respond in JSON:
-    {{
+    {
         "type": "sql" | "generic" | "out_of_scope" | "need_more_info",
         "component": "table" | "text" | "number" | "pie_chart" | "bar_chart",
         "text": "Natural language explanation or response for UI display",
         "sql": "SELECT ..."
-    }}
+    }
+
+    The schemas of the tables you can query follow.
     """
 
-def get_final_rag_prompt(user_query: str, data: object):
+@lru_cache(maxsize=256)
+def _render_schema_block(schemas: Tuple[Tuple[str, str, str], ...]) -> str:
+    lines = "\n".join(f"{schema}, Description: {description}" for _, schema, description in schemas)
+    return f"Schemas:\n{lines}"
+
+def get_schema_block(results: Iterable[dict]) -> str:
+    """Schema segment for retrieved tables, in table order so the same set always renders the same text"""
+    schemas = sorted({(r['metadata']['table'], r['metadata']['schema'], r['document']) for r in results})
+    return _render_schema_block(tuple(schemas))
+
+def get_final_rag_prompt(user_query: str, digest: str, partial: bool = False):
+    if partial:
+        statistics_rule = (
+            "- The statistics cover only the first row_count rows; the full result has more rows. "
+            "Do not present them as counts or totals of the whole result: say they describe the first row_count rows."
+        )
+    else:
+        statistics_rule = "- Base counts, totals and ranges on the column statistics, not on the sample."
     return f"""
         You are 'Lark AI', an intelligent chatbot assistant integrated into an organization's dashboard.
         
-        Here is the data to anwer the user's query:
+        Here is a digest of the data that answers the user's query: per-column statistics of the result rows and a sample of them.
         query: {user_query}
-        data: {data}
+        digest: {digest}
         
-        Your objective is to answer the user's query effectively using the provided data.
+        Your objective is to answer the user's query effectively using the digest.
         In the UI, present the results in the most relevant format, which could include text, lists, tables, charts, or a combination of these components.
         
         ## Guidelines:
-        - Do not modify the data provided for tables and charts.
+        - Tables and charts always show the full result: set their "content" to "result" instead of copying rows.
+        {statistics_rule}
         - For long textual content, split paragraphs into separate `text` components for better readability.
         
         response in JSON:
@@ -80,4 +106,33 @@ def get_final_rag_prompt(user_query: str, data: object):
                 "content": string | object
             }}
         ]
-    """
\ No newline at end of file
+    """
+
+def get_summary_prompt(summary: str, conversation: str):
+    return f"""
+        You are maintaining a running summary of a conversation between a user and 'Lark AI', a dashboard assistant that answers questions about organizational data with SQL.
+
+        Current summary:
+        {summary or "(empty)"}
+
+        New messages to fold into the summary:
+        {conversation}
+
+        ## Guidelines:
+        - Keep the entities, filters, time ranges and SQL the user may refer back to in follow-up questions.
+        - Do not copy result rows; mention row counts or notable values only.
+        - Reply with the updated summary as plain text, at most 200 words.
+    """
+
+
+def get_query_rejected_prompt(reason: str, plan_summary: str):
+    return f"""
+        The SQL query you generated was not executed: {reason}.
+
+        Postgres query plan:
+        {plan_summary or "(not available)"}
+
+        Rewrite it as a cheaper query that still answers the question, for example by filtering on a date range or a specific record, aggregating instead of listing rows, or avoiding unnecessary joins.
+        If that is not possible, respond with "type": "need_more_info" and ask the user to narrow the question down.
+        Respond in the same JSON format as before.
+    """
@@ -1,29 +1,78 @@
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 import json
+import os
+import zlib
 
-from app.config.redis_client import redis_client
+from app.config.redis_client import async_redis_client
+
+# Chat history is a Redis list with one compact JSON entry per message, so a
+# turn is a single pipelined RPUSH + LTRIM + EXPIRE instead of a rewrite of
+# the whole conversation. Entries carrying large table payloads are stored
+# zlib-compressed behind a one byte marker (JSON itself never starts with it).
+CHAT_HISTORY_MAX_MESSAGES = int(os.getenv("CHAT_HISTORY_MAX_MESSAGES", 200))
+CHAT_COMPRESS_MIN_BYTES = int(os.getenv("CHAT_COMPRESS_MIN_BYTES", 2048))
+COMPRESSED_MARKER = b"z"
 
 def get_chat_key(user_id: str) -> str:
-    return f"user_chat:{user_id}"
+    return f"user_chat_log:{user_id}"
+
+def encode_message(message: Dict) -> bytes:
+    raw = json.dumps(message, separators=(",", ":"), default=str).encode()
+    if len(raw) >= CHAT_COMPRESS_MIN_BYTES:
+        return COMPRESSED_MARKER + zlib.compress(raw)
+    return raw
+
+def decode_message(raw: bytes) -> Dict:
+    if raw.startswith(COMPRESSED_MARKER):
+        raw = zlib.decompress(raw[len(COMPRESSED_MARKER):])
+    return json.loads(raw)
 
-def check_chat_exists(user_id: str) -> bool:
+async def check_chat_exists(user_id: str) -> bool:
     key = get_chat_key(user_id)
-    return redis_client.exists(key)
+    return await async_redis_client.exists(key)
 
-def get_chat_history(user_id: str) -> List[Dict]:
+async def get_chat_history(user_id: str, last_turns: Optional[int] = None) -> List[Dict]:
+    """Return the conversation, or only its last `last_turns` user/assistant pairs"""
     key = get_chat_key(user_id)
-    raw = redis_client.get(key)
-    if raw:
-        return json.loads(raw)
-    return []
-
-def append_to_chat_history(user_id: str, message: Dict, CHAT_TTL_SECONDS: int = 60 * 10):
-    history = get_chat_history(user_id)
-    history.append(message)
+    start = -2 * last_turns if last_turns else 0
+    raw = await async_redis_client.lrange(key, start, -1)
+    return [decode_message(item) for item in raw]
+
+async def get_chat_tail(user_id: str, max_messages: int) -> Tuple[List[Dict], int]:
+    """The last `max_messages` messages and the length of the whole conversation"""
     key = get_chat_key(user_id)
-    redis_client.set(key, json.dumps(history, indent=4, default=str))
-    redis_client.expire(key, CHAT_TTL_SECONDS)
+    pipe = async_redis_client.pipeline(transaction=False)
+    pipe.lrange(key, -max_messages, -1)
+    pipe.llen(key)
+    raw, length = await pipe.execute()
+    return [decode_message(item) for item in raw], length
 
-def clear_chat_history(user_id: str):
+async def append_to_chat_history(user_id: str, *messages: Dict, CHAT_TTL_SECONDS: int = 60 * 10):
     key = get_chat_key(user_id)
-    redis_client.delete(key)
\ No newline at end of file
+    pipe = async_redis_client.pipeline(transaction=True)
+    pipe.rpush(key, *[encode_message(message) for message in messages])
+    pipe.ltrim(key, -CHAT_HISTORY_MAX_MESSAGES, -1)
+    pipe.expire(key, CHAT_TTL_SECONDS)
+    await pipe.execute()
+
+async def clear_chat_history(user_id: str):
+    key = get_chat_key(user_id)
+    await async_redis_client.delete(key, get_summary_key(user_id))
+
+# ========= Rolling summary of older turns ========= #
+def get_summary_key(user_id: str) -> str:
+    return f"user_chat_summary:{user_id}"
+
+async def get_chat_summary(user_id: str) -> Dict:
+    raw = await async_redis_client.hgetall(get_summary_key(user_id))
+    return {
+        "summary": raw.get(b"summary", b"").decode(),
+        "covered_until": float(raw.get(b"covered_until", 0)),
+    }
+
+async def set_chat_summary(user_id: str, summary: str, covered_until: float, CHAT_TTL_SECONDS: int = 60 * 10):
+    key = get_summary_key(user_id)
+    pipe = async_redis_client.pipeline(transaction=True)
+    pipe.hset(key, mapping={"summary": summary, "covered_until": covered_until})
+    pipe.expire(key, CHAT_TTL_SECONDS)
+    await pipe.execute()
@@ -0,0 +1,147 @@
+from typing import Dict, List, Optional
+import os
+import re
+
+from dotenv import load_dotenv
+
+from app.config.embedding_cache import normalize_query
+
+load_dotenv()
+
+# ========= Local component rendering ========= #
+# With rag=true the query result used to go back to the model only to be
+# reshaped into text / list / table / chart components. The local renderer
+# builds the same components from the result's shape: column kinds, distinct
+# values and row count pick a number, list, chart or table, and the narrative
+# is the plan's text plus templated facts. The model is still used when the
+# question asks for an explanation or the result holds long free text.
+# Per request: render=local | llm | auto (default CHAT_RENDER_MODE).
+CHAT_RENDER_MODE = os.getenv("CHAT_RENDER_MODE", "auto")
+CHAT_RENDER_PIE_MAX_SLICES = int(os.getenv("CHAT_RENDER_PIE_MAX_SLICES", 8))
+CHAT_RENDER_BAR_MAX_BARS = int(os.getenv("CHAT_RENDER_BAR_MAX_BARS", 50))
+CHAT_RENDER_LIST_MAX_FIELDS = int(os.getenv("CHAT_RENDER_LIST_MAX_FIELDS", 12))
+CHAT_RENDER_LONG_TEXT_CHARS = int(os.getenv("CHAT_RENDER_LONG_TEXT_CHARS", 200))
+
+NO_ROWS_MESSAGE = "Sorry, I couldn't find any relevant information."
+
+EXPLANATION_TERMS = re.compile(
+    r"\b(why|explain|explanation|summari[sz]e|summary|compare|comparison|insights?|analy[sz]e|analysis|recommend|suggest|interpret|reasons?)\b"
+)
+# Rows are JSON-encoded, so dates arrive as ISO or the prompt's DD-MM-YYYY strings
+DATE_VALUE = re.compile(r"^(\d{4}-\d{2}-\d{2}|\d{2}-\d{2}-\d{4})([ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?$")
+
+def get_column_kind(values: List) -> str:
+    present = [value for value in values if value is not None]
+    if not present:
+        return "empty"
+    if all(isinstance(value, bool) for value in present):
+        return "boolean"
+    if all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in present):
+        return "number"
+    if all(isinstance(value, str) and DATE_VALUE.match(value) for value in present):
+        return "date"
+    return "text"
+
+def describe_columns(rows: List[Dict]) -> Dict[str, Dict]:
+    """Kind, distinct count and longest text of every column of `rows`"""
+    described = {}
+    for column in rows[0].keys() if rows else []:
+        values = [row.get(column) for row in rows]
+        present = [value for value in values if value is not None]
+        described[column] = {
+            "kind": get_column_kind(values),
+            "distinct": len({str(value) for value in present}),
+            "max_length": max((len(value) for value in present if isinstance(value, str)), default=0),
+        }
+    return described
+
+def needs_explanation(query: str, page: Dict) -> bool:
+    if EXPLANATION_TERMS.search(normalize_query(query)):
+        return True
+    columns = describe_columns(page["rows"])
+    return any(column["kind"] == "text" and column["max_length"] > CHAT_RENDER_LONG_TEXT_CHARS for column in columns.values())
+
+def choose_renderer(mode: str, query: str, page: Dict) -> str:
+    """"local" or "llm" for building the rag=true components of a result page"""
+    if mode in ("local", "llm"):
+        return mode
+    return "llm" if needs_explanation(query, page) else "local"
+
+def format_value(value) -> str:
+    if isinstance(value, bool) or value is None:
+        return str(value)
+    if isinstance(value, int):
+        return f"{value:,}"
+    if isinstance(value, float):
+        return f"{value:,.0f}" if value.is_integer() else f"{value:,.2f}"
+    return str(value)
+
+def get_label(column: str) -> str:
+    return column.replace("_", " ")
+
+def get_chart_columns(columns: Dict[str, Dict]) -> Optional[Dict]:
+    """Label and value columns when the result is one category or date column plus numbers"""
+    labels = [name for name, column in columns.items() if column["kind"] in ("text", "date")]
+    values = [name for name, column in columns.items() if column["kind"] == "number"]
+    if len(labels) != 1 or not values or len(labels) + len(values) != len(columns):
+        return None
+    return {"label": labels[0], "values": values, "date": columns[labels[0]]["kind"] == "date"}
+
+def choose_component(hint: Optional[str], rows: List[Dict], columns: Dict[str, Dict]) -> str:
+    """Component for a non-empty result; the plan's component is kept when the shape allows it"""
+    if len(rows) == 1 and len(columns) == 1:
+        return "number" if next(iter(columns.values()))["kind"] == "number" else "text"
+    if len(rows) == 1 and len(columns) <= CHAT_RENDER_LIST_MAX_FIELDS:
+        return "list"
+
+    chart = get_chart_columns(columns)
+    if chart is not None:
+        label_values = [row[chart["label"]] for row in rows]
+        unique_labels = None not in label_values and columns[chart["label"]]["distinct"] == len(rows)
+        pie = (
+            unique_labels and not chart["date"] and len(chart["values"]) == 1
+            and len(rows) <= CHAT_RENDER_PIE_MAX_SLICES
+            and all((row[chart["values"][0]] or 0) >= 0 for row in rows)
+        )
+        if hint == "pie_chart" and pie:
+            return "pie_chart"
+        if hint != "table" and unique_labels and len(rows) <= CHAT_RENDER_BAR_MAX_BARS:
+            return "bar_chart"
+    return "table"
+
+def describe_chart(rows: List[Dict], label: str, value: str, share: bool) -> str:
+    top = max(rows, key=lambda row: row[value] or 0)
+    text = f"The highest {get_label(value)} is {format_value(top[value])} for {top[label]}"
+    total = sum(row[value] or 0 for row in rows)
+    if share and total:
+        text += f", {100 * (top[value] or 0) / total:.0f}% of the total {format_value(total)}"
+    return text + "."
+
+def render_components(plan: Dict, page: Dict) -> List[Dict]:
+    """Text / list / number / chart / table components for a result page, without a model call"""
+    rows = page["rows"]
+    if not rows:
+        return [{"component": "text", "content": NO_ROWS_MESSAGE}]
+
+    columns = describe_columns(rows)
+    component = choose_component(plan.get("component"), rows, columns)
+    facts = []
+
+    if component in ("number", "text"):
+        column, value = next(iter(rows[0].items()))
+        facts.append(f"{get_label(column).capitalize()}: {format_value(value)}.")
+    elif component == "list":
+        content = [f"{get_label(column).capitalize()}: {format_value(value)}" for column, value in rows[0].items()]
+    elif component in ("pie_chart", "bar_chart"):
+        chart = get_chart_columns(columns)
+        facts.append(describe_chart(rows, chart["label"], chart["values"][0], component == "pie_chart"))
+    else:
+        facts.append(f"{format_value(len(rows))} rows" + (", more are available." if page.get("has_more") else "."))
+
+    text = " ".join(part for part in [plan.get("text", "").strip(), *facts] if part)
+    components = [{"component": "text", "content": text}]
+    if component == "list":
+        components.append({"component": "list", "content": content})
+    elif component != "text":
+        components.append({"component": component, "content": rows, "next_cursor": page.get("next_cursor")})
+    return components
@@ -1,8 +1,18 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, create_model
 from datetime import date, datetime
-from typing import Optional, List
+from typing import Optional, List, Type
 from decimal import Decimal
 
+# ========= Updates ========= #
+class Versioned(BaseModel):
+    # Version the client last read; the write is refused if the row has moved on since
+    version: Optional[int] = None
+
+def partial(schema: Type[BaseModel]) -> Type[BaseModel]:
+    """PATCH body for `schema`: every field optional, only the fields sent are written"""
+    fields = {name: (Optional[field.annotation], None) for name, field in schema.model_fields.items()}
+    return create_model(schema.__name__.replace("Create", "Patch"), __base__=Versioned, **fields)
+
 # ======== Schema for Employee ========= #
 class EmployeeBase(BaseModel):
     name: str
@@ -12,10 +22,16 @@ class EmployeeBase(BaseModel):
 class EmployeeCreate(EmployeeBase):
     department_id: Optional[int] = None
 
+class EmployeeUpdate(EmployeeCreate, Versioned):
+    pass
+
+EmployeePatch = partial(EmployeeCreate)
+
 class Employee(EmployeeBase):
     id: int
     department_id: Optional[int]
     date_joined: date
+    version: int
     
     class Config:
         from_attributes = True
@@ -27,9 +43,15 @@ class DepartmentBase(BaseModel):
 class DepartmentCreate(DepartmentBase):
     head_id: Optional[int] = None
 
+class DepartmentUpdate(DepartmentCreate, Versioned):
+    pass
+
+DepartmentPatch = partial(DepartmentCreate)
+
 class Department(DepartmentBase):
     id: int
     head_id: Optional[int]
+    version: int
     
     class Config:
         from_attributes = True
@@ -43,8 +65,14 @@ class ProductBase(BaseModel):
 class ProductCreate(ProductBase):
     pass
 
+class ProductUpdate(ProductCreate, Versioned):
+    pass
+
+ProductPatch = partial(ProductCreate)
+
 class Product(ProductBase):
     id: int
+    version: int
     
     class Config:
         from_attributes = True
@@ -60,11 +88,17 @@ class BatchCreate(BatchBase):
     product_id: int
     created_by: int
 
+class BatchUpdate(BatchCreate, Versioned):
+    pass
+
+BatchPatch = partial(BatchCreate)
+
 class Batch(BatchBase):
     id: int
     product_id: int
     created_by: int
     created_at: datetime
+    version: int
     product: Product
     
     class Config:
@@ -79,6 +113,10 @@ class BatchTrackingCreate(BatchTrackingBase):
     batch_id: int
     handled_by: int
 
+class TrackingEvent(BatchTrackingCreate):
+    # Scan time; the insert time is used when the scanner does not send one
+    timestamp: Optional[datetime] = None
+
 class BatchTracking(BatchTrackingBase):
     id: int
     batch_id: int
@@ -88,6 +126,15 @@ class BatchTracking(BatchTrackingBase):
     class Config:
         from_attributes = True
         
+class BatchCurrentStatus(BatchTrackingBase):
+    batch_id: int
+    tracking_id: int
+    timestamp: datetime
+    handled_by: Optional[int]
+
+    class Config:
+        from_attributes = True
+
 # ========= Schema for Asset ========= #
 class AssetBase(BaseModel):
     asset_tag: str
@@ -103,8 +150,14 @@ class AssetBase(BaseModel):
 class AssetCreate(AssetBase):
     pass
 
+class AssetUpdate(AssetCreate, Versioned):
+    pass
+
+AssetPatch = partial(AssetCreate)
+
 class Asset(AssetBase):
     id: int
+    version: int
 
     class Config:
         from_attributes = True
@@ -122,8 +175,14 @@ class MaintenanceLogBase(BaseModel):
 class MaintenanceLogCreate(MaintenanceLogBase):
     pass
 
+class MaintenanceLogUpdate(MaintenanceLogCreate, Versioned):
+    pass
+
+MaintenanceLogPatch = partial(MaintenanceLogCreate)
+
 class MaintenanceLog(MaintenanceLogBase):
     id: int
+    version: int
 
     class Config:
         from_attributes = True
@@ -139,8 +198,14 @@ class VendorBase(BaseModel):
 class VendorCreate(VendorBase):
     pass
 
+class VendorUpdate(VendorCreate, Versioned):
+    pass
+
+VendorPatch = partial(VendorCreate)
+
 class Vendor(VendorBase):
     id: int
+    version: int
 
     class Config:
         from_attributes = True
@@ -0,0 +1,200 @@
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import json
+import os
+import re
+import time
+
+import asyncpg
+from dotenv import load_dotenv
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config.db_metrics import record_streamed_statement
+from app.config.redis_client import async_redis_client
+from app.utils.cache_utils import strip_sql, get_result_cache_key, get_cached_result, store_cached_result
+from app.utils.workload_utils import log_statement
+
+load_dotenv()
+
+# Generated SQL is read one bounded page at a time through a server-side
+# cursor: a page stops at CHAT_RESULT_PAGE_SIZE rows or CHAT_RESULT_MAX_BYTES
+# of encoded JSON, whichever comes first, so worker memory stays flat no
+# matter how large the underlying table is. Later pages are addressed by a
+# continuation cursor "<query id>:<offset>" and never call the model again.
+# Pages are separate statements, and Postgres only returns rows in the same
+# order each time when the query says so: a cursor is only issued for SQL
+# with a top-level ORDER BY, which should end on a unique column.
+CHAT_RESULT_PAGE_SIZE = int(os.getenv("CHAT_RESULT_PAGE_SIZE", 500))
+CHAT_RESULT_MAX_BYTES = int(os.getenv("CHAT_RESULT_MAX_BYTES", 1024 * 1024))
+CHAT_RESULT_FETCH_SIZE = int(os.getenv("CHAT_RESULT_FETCH_SIZE", 200))
+CHAT_RESULT_CURSOR_TTL_SECONDS = int(os.getenv("CHAT_RESULT_CURSOR_TTL_SECONDS", 60 * 30))
+
+# Execution guard: every page runs in its own read-only transaction with a
+# statement timeout, after an EXPLAIN of the exact paginated statement. Plans
+# over the cost or (unpaginated) row estimate limits are rejected with a plan
+# summary the model can use to write a cheaper query.
+CHAT_SQL_MAX_COST = float(os.getenv("CHAT_SQL_MAX_COST", 1_000_000))
+CHAT_SQL_MAX_ROWS = float(os.getenv("CHAT_SQL_MAX_ROWS", 10_000_000))
+CHAT_SQL_STATEMENT_TIMEOUT_MS = int(os.getenv("CHAT_SQL_STATEMENT_TIMEOUT_MS", 5000))
+CHAT_SQL_MAX_RETRIES = int(os.getenv("CHAT_SQL_MAX_RETRIES", 1))
+PLAN_SUMMARY_MAX_LINES = 12
+
+# Postgres SQLSTATEs surfaced to the model instead of failing the request
+QUERY_CANCELED = "57014"
+READ_ONLY_SQL_TRANSACTION = "25006"
+
+SQL_LITERAL_OR_COMMENT = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|--[^\n]*|/\*.*?\*/", re.DOTALL)
+ORDER_BY = re.compile(r"\border\s+by\b")
+
+class QueryRejected(Exception):
+    def __init__(self, reason: str, plan_summary: str = ""):
+        super().__init__(reason)
+        self.reason = reason
+        self.plan_summary = plan_summary
+
+def paginate_sql(sql: str, limit: int, offset: int) -> str:
+    # The statement is kept verbatim: collapsing whitespace would change string
+    # literals and let a "-- comment" swallow the rest of the query. The line
+    # breaks end such a comment before the closing parenthesis.
+    return f"SELECT * FROM (\n{strip_sql(sql)}\n) AS chat_result LIMIT {int(limit)} OFFSET {int(offset)}"
+
+def get_query_id(sql: str) -> str:
+    # The text as written: normalizing would merge queries that differ only inside a string literal
+    return hashlib.sha1(strip_sql(sql).encode()).hexdigest()[:16]
+
+def has_order_by(sql: str) -> bool:
+    """Whether `sql` orders its own result, ignoring literals, comments and subqueries"""
+    sql = SQL_LITERAL_OR_COMMENT.sub(" ", sql).lower()
+    depth, top_level = 0, []
+    for char in sql:
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif depth == 0:
+            top_level.append(char)
+    return bool(ORDER_BY.search("".join(top_level)))
+
+def get_result_query_key(query_id: str) -> str:
+    return f"chat_result_query:{query_id}"
+
+async def get_next_cursor(sql: str, page: Dict) -> Optional[str]:
+    if not page["has_more"] or not has_order_by(sql):
+        return None
+    query_id = get_query_id(sql)
+    await async_redis_client.set(get_result_query_key(query_id), strip_sql(sql), ex=CHAT_RESULT_CURSOR_TTL_SECONDS)
+    return f"{query_id}:{page['offset'] + page['row_count']}"
+
+async def resolve_cursor(cursor: str) -> Optional[Tuple[str, int]]:
+    """Return the (sql, offset) a continuation cursor points at, if it is still alive"""
+    query_id, _, offset = cursor.partition(":")
+    if not offset.isdigit():
+        return None
+    sql = await async_redis_client.get(get_result_query_key(query_id))
+    if sql is None:
+        return None
+    return sql.decode(), int(offset)
+
+async def get_page_cache_key(sql: str, offset: int = 0) -> Optional[str]:
+    return await get_result_cache_key(paginate_sql(sql, CHAT_RESULT_PAGE_SIZE, offset))
+
+def summarize_plan(node: Dict, depth: int = 0, lines: Optional[List[str]] = None) -> List[str]:
+    lines = [] if lines is None else lines
+    if len(lines) < PLAN_SUMMARY_MAX_LINES:
+        relation = f" on {node['Relation Name']}" if "Relation Name" in node else ""
+        lines.append(f"{'  ' * depth}-> {node['Node Type']}{relation} (cost={node['Total Cost']:.0f} rows={node['Plan Rows']:.0f})")
+        for child in node.get("Plans", []):
+            summarize_plan(child, depth + 1, lines)
+    return lines
+
+async def check_sql_cost(db: AsyncSession, statement: str) -> Dict:
+    """EXPLAIN `statement` and raise QueryRejected when its plan is over budget"""
+    plan = (await db.execute(text(f"EXPLAIN (FORMAT JSON) {statement}"))).scalar()
+    root = (json.loads(plan) if isinstance(plan, str) else plan)[0]["Plan"]
+    # The paginated statement is capped by LIMIT; its child carries the full row estimate
+    unpaginated_rows = root["Plans"][0]["Plan Rows"] if root["Node Type"] == "Limit" and root.get("Plans") else root["Plan Rows"]
+    summary = "\n".join(summarize_plan(root))
+
+    if root["Total Cost"] > CHAT_SQL_MAX_COST:
+        raise QueryRejected(f"estimated cost {root['Total Cost']:.0f} exceeds the limit of {CHAT_SQL_MAX_COST:.0f}", summary)
+    if unpaginated_rows > CHAT_SQL_MAX_ROWS:
+        raise QueryRejected(f"estimated {unpaginated_rows:.0f} rows exceeds the limit of {CHAT_SQL_MAX_ROWS:.0f}", summary)
+    return {"total_cost": root["Total Cost"], "rows": unpaginated_rows}
+
+async def begin_guarded_transaction(db: AsyncSession):
+    await db.execute(text("SET TRANSACTION READ ONLY"))
+    await db.execute(text(f"SET LOCAL statement_timeout = {int(CHAT_SQL_STATEMENT_TIMEOUT_MS)}"))
+
+async def stream_result_page(
+    db: AsyncSession, sql: str, offset: int, page: Dict,
+    page_size: int = CHAT_RESULT_PAGE_SIZE, max_bytes: Optional[int] = CHAT_RESULT_MAX_BYTES,
+):
+    """Yield JSON-ready row chunks of one page; `page` receives offset, row_count and has_more"""
+    page.update({"offset": offset, "row_count": 0, "has_more": False})
+    size = 0
+
+    # One extra row tells whether another page exists
+    statement = paginate_sql(sql, page_size + 1, offset)
+    status, start = "error", time.perf_counter()
+    try:
+        await begin_guarded_transaction(db)
+        try:
+            page["plan"] = await check_sql_cost(db, statement)
+        except QueryRejected:
+            status = "rejected"
+            raise
+
+        stream_start = time.perf_counter()
+        result = await db.stream(text(statement))
+        try:
+            columns = list(result.keys())
+            async for partition in result.partitions(CHAT_RESULT_FETCH_SIZE):
+                chunk = []
+                for row in partition:
+                    item = jsonable_encoder(dict(zip(columns, row)))
+                    if max_bytes is not None:
+                        size += len(json.dumps(item, separators=(",", ":"), default=str))
+                    if page["row_count"] >= page_size or (max_bytes is not None and size > max_bytes and page["row_count"]):
+                        page["has_more"] = True
+                        break
+                    chunk.append(item)
+                    page["row_count"] += 1
+                if chunk:
+                    yield chunk
+                if page["has_more"]:
+                    break
+        finally:
+            await result.close()
+            record_streamed_statement("chat", statement, time.perf_counter() - stream_start)
+        status = "ok"
+    except (DBAPIError, asyncpg.PostgresError) as e:
+        # asyncpg errors raised while fetching from the server-side cursor are not wrapped
+        orig = getattr(e, "orig", e)
+        sqlstate = getattr(orig, "sqlstate", None) or getattr(orig, "pgcode", None)
+        if sqlstate == QUERY_CANCELED:
+            status = "timeout"
+            raise QueryRejected(f"the query ran longer than {CHAT_SQL_STATEMENT_TIMEOUT_MS} ms and was cancelled") from e
+        if sqlstate == READ_ONLY_SQL_TRANSACTION:
+            status = "read_only"
+            raise QueryRejected("only read-only SELECT queries are allowed") from e
+        raise
+    finally:
+        # Nothing to commit; ending the transaction lets the next page start a fresh guarded one
+        await db.rollback()
+        await log_statement(strip_sql(sql), offset, status, time.perf_counter() - start, page["row_count"], page.get("plan"))
+
+async def fetch_result_page(db: AsyncSession, sql: str, offset: int = 0) -> Dict:
+    """One bounded page of `sql` with its continuation cursor, from the result cache when possible"""
+    cache_key = await get_page_cache_key(sql, offset)
+    page = await get_cached_result(cache_key)
+    if page is None:
+        page = {"rows": []}
+        async for chunk in stream_result_page(db, sql, offset, page):
+            page["rows"].extend(chunk)
+        await store_cached_result(cache_key, page)
+
+    page["next_cursor"] = await get_next_cursor(sql, page)
+    return page
@@ -0,0 +1,82 @@
+from typing import Dict, Iterable, List
+
+from sqlalchemy import delete, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import models
+
+# batch_current_status holds the latest tracking event of every batch, so
+# "where is batch X" and "how many batches are in transit" read one row per
+# batch instead of a greatest-per-group scan over the whole history. It is
+# kept current in the same transaction as every tracking write:
+# - a new event replaces the batch's row only if it is at least as recent,
+#   so events that arrive out of order cannot move a batch backwards;
+# - deleting the event a row points at re-reads that batch's latest event.
+# rebuild_current_status recomputes the whole table from batch_tracking.
+STATUS_COLUMNS = ("location", "status", "timestamp", "handled_by")
+
+def get_latest_events(rows: Iterable[Dict]) -> List[Dict]:
+    """The most recent of `rows` (tracking rows with id) for each batch"""
+    latest = {}
+    for row in rows:
+        current = latest.get(row["batch_id"])
+        if current is None or (row["timestamp"], row["id"]) >= (current["timestamp"], current["id"]):
+            latest[row["batch_id"]] = row
+    return list(latest.values())
+
+async def record_tracking_events(db: AsyncSession, rows: Iterable[Dict]):
+    """Move batches to the newest of the given, already inserted, tracking events"""
+    events = get_latest_events(rows)
+    if not events:
+        return
+
+    table = models.BatchCurrentStatus.__table__
+    stmt = insert(table).values([
+        {"batch_id": row["batch_id"], "tracking_id": row["id"], **{column: row[column] for column in STATUS_COLUMNS}}
+        for row in events
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.batch_id],
+        set_={column: stmt.excluded[column] for column in ("tracking_id",) + STATUS_COLUMNS},
+        where=tuple_(table.c.timestamp, table.c.tracking_id) <= tuple_(stmt.excluded.timestamp, stmt.excluded.tracking_id),
+    )
+    await db.execute(stmt)
+
+def select_latest_events(*where):
+    tracking = models.BatchTracking.__table__
+    return (
+        select(tracking.c.batch_id, tracking.c.id, *[tracking.c[column] for column in STATUS_COLUMNS])
+        .where(*where)
+        .distinct(tracking.c.batch_id)
+        .order_by(tracking.c.batch_id, tracking.c.timestamp.desc(), tracking.c.id.desc())
+    )
+
+async def forget_tracking_event(db: AsyncSession, tracking_id: int):
+    """Call after deleting a tracking event; falls back to the batch's previous event if it was the current one"""
+    table = models.BatchCurrentStatus.__table__
+    batch_id = await db.scalar(delete(table).where(table.c.tracking_id == tracking_id).returning(table.c.batch_id))
+    if batch_id is None:
+        return
+
+    tracking = models.BatchTracking.__table__
+    latest = select_latest_events(tracking.c.batch_id == batch_id, tracking.c.id != tracking_id)
+    await db.execute(insert(table).from_select(["batch_id", "tracking_id", *STATUS_COLUMNS], latest))
+
+def rebuild_current_status(conn) -> int:
+    """Recompute the whole table from batch_tracking (sync connection, inside a transaction)"""
+    table = models.BatchCurrentStatus.__table__
+    conn.execute(delete(table))
+    return conn.execute(insert(table).from_select(["batch_id", "tracking_id", *STATUS_COLUMNS], select_latest_events())).rowcount
+
+# Run `python -m app.utils.status_utils` once after upgrading, and whenever
+# batch_tracking was written around the API (e.g. a manual import)
+if __name__ == "__main__":
+    from app.config.database import engine
+
+    models.BatchCurrentStatus.__table__.create(engine, checkfirst=True)
+    for index in models.BatchTracking.__table__.indexes:
+        index.create(engine, checkfirst=True)
+    with engine.begin() as conn:
+        count = rebuild_current_status(conn)
+    print(f"Rebuilt batch_current_status: {count} batches")
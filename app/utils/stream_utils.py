@@ -0,0 +1,57 @@
+import json
+import re
+
+def format_sse(event: str, data) -> str:
+    """Encode one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+class JsonFieldStreamer:
+    """Incrementally extracts a top-level string field from JSON text streamed in chunks"""
+
+    ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f"}
+
+    def __init__(self, field: str):
+        self.pattern = re.compile(rf'"{re.escape(field)}"\s*:\s*"')
+        self.buffer = ""
+        self.position = None
+        self.done = False
+
+    def feed(self, chunk: str) -> str:
+        """Add a chunk of the document and return the newly decoded part of the field"""
+        self.buffer += chunk
+        if self.done:
+            return ""
+
+        if self.position is None:
+            match = self.pattern.search(self.buffer)
+            if not match:
+                return ""
+            self.position = match.end()
+
+        decoded = []
+        i = self.position
+        while i < len(self.buffer):
+            char = self.buffer[i]
+            if char == "\\":
+                # Wait for the rest of an escape sequence split across chunks
+                if i + 1 >= len(self.buffer):
+                    break
+                escape = self.buffer[i + 1]
+                if escape == "u":
+                    if i + 6 > len(self.buffer):
+                        break
+                    decoded.append(chr(int(self.buffer[i + 2:i + 6], 16)))
+                    i += 6
+                else:
+                    decoded.append(self.ESCAPES.get(escape, escape))
+                    i += 2
+                continue
+            if char == '"':
+                self.done = True
+                i += 1
+                break
+            decoded.append(char)
+            i += 1
+
+        self.position = i
+        return "".join(decoded)
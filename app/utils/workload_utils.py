@@ -0,0 +1,59 @@
+from typing import Dict, List, Optional
+import json
+import os
+import time
+
+from dotenv import load_dotenv
+from redis.exceptions import RedisError
+
+from app.config.redis_client import async_redis_client, redis_client
+from app.utils.cache_utils import normalize_sql
+
+load_dotenv()
+
+# Every page of generated SQL that reaches the database is appended to a
+# capped Redis list with its outcome and timing. The index advisor
+# (python -m scripts.index_advisor) reads it back to find the columns the
+# model keeps filtering, joining and sorting on.
+CHAT_SQL_WORKLOAD_ENABLED = os.getenv("CHAT_SQL_WORKLOAD_ENABLED", "true").lower() == "true"
+CHAT_SQL_WORKLOAD_MAX_ENTRIES = int(os.getenv("CHAT_SQL_WORKLOAD_MAX_ENTRIES", 10000))
+CHAT_SQL_WORKLOAD_KEY = "chat_sql_workload"
+
+async def log_statement(sql: str, offset: int, status: str, seconds: float, rows: int = 0, plan: Optional[Dict] = None):
+    """Record one executed page; status is ok, rejected, timeout, read_only or error"""
+    if not CHAT_SQL_WORKLOAD_ENABLED:
+        return
+    entry = {
+        "sql": sql,
+        "offset": offset,
+        "status": status,
+        "ms": round(1000 * seconds, 2),
+        "rows": rows,
+        "cost": (plan or {}).get("total_cost"),
+        "at": round(time.time(), 3),
+    }
+    try:
+        pipe = async_redis_client.pipeline(transaction=False)
+        pipe.lpush(CHAT_SQL_WORKLOAD_KEY, json.dumps(entry, separators=(",", ":")))
+        pipe.ltrim(CHAT_SQL_WORKLOAD_KEY, 0, CHAT_SQL_WORKLOAD_MAX_ENTRIES - 1)
+        await pipe.execute()
+    except RedisError as e:
+        # The log is advisory; never fail a chat request over it
+        print(f"Error logging chat SQL workload: {e}")
+
+def get_workload(limit: Optional[int] = None) -> List[Dict]:
+    """Logged entries, newest first"""
+    raw = redis_client.lrange(CHAT_SQL_WORKLOAD_KEY, 0, (limit or 0) - 1)
+    return [json.loads(item) for item in raw]
+
+def summarize_workload(entries: List[Dict]) -> List[Dict]:
+    """One row per distinct statement, heaviest total time first"""
+    statements = {}
+    for entry in entries:
+        # Grouped on the normalized text; "sql" keeps a runnable copy as logged
+        summary = statements.setdefault(normalize_sql(entry["sql"]), {"sql": entry["sql"], "count": 0, "total_ms": 0.0, "max_ms": 0.0, "statuses": {}})
+        summary["count"] += 1
+        summary["total_ms"] += entry["ms"]
+        summary["max_ms"] = max(summary["max_ms"], entry["ms"])
+        summary["statuses"][entry["status"]] = summary["statuses"].get(entry["status"], 0) + 1
+    return sorted(statements.values(), key=lambda summary: summary["total_ms"], reverse=True)
@@ -0,0 +1,77 @@
+"""Concurrent-request benchmark for the CRUD routers.
+
+Start the app, then run for example:
+
+    python scripts/benchmark_crud.py --base-url http://localhost:8000 --concurrency 50 --requests 2000
+
+Run it once against the old build and once against the new one with the same
+settings to compare throughput and latency.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+DEFAULT_PATHS = ["/departments/", "/employees/", "/products/", "/batches/", "/assets/", "/vendors/", "/maintenance/"]
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(p * len(values)), len(values) - 1)]
+
+async def run(base_url: str, paths, concurrency: int, total: int, timeout: float):
+    latencies, errors = [], 0
+    counter = iter(range(total))
+
+    async def worker(client):
+        nonlocal errors
+        for i in counter:
+            path = paths[i % len(paths)]
+            start = time.perf_counter()
+            try:
+                response = await client.get(path)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+        # One warm-up round so connection setup is not part of the measurement
+        await asyncio.gather(*[client.get(path) for path in paths])
+
+        start = time.perf_counter()
+        await asyncio.gather(*[worker(client) for _ in range(concurrency)])
+        elapsed = time.perf_counter() - start
+
+    return {
+        "base_url": base_url,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(1000 * percentile(latencies, 0.5), 2),
+        "p95_ms": round(1000 * percentile(latencies, 0.95), 2),
+        "p99_ms": round(1000 * percentile(latencies, 0.99), 2),
+        "max_ms": round(1000 * max(latencies, default=0.0), 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent GET throughput of the CRUD routers")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--path", action="append", dest="paths", help="Endpoint to hit, repeatable (default: all list endpoints)")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.base_url, args.paths or DEFAULT_PATHS, args.concurrency, args.requests, args.timeout))
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""Index advisor for the SQL the chat endpoint generates.
+
+Reads the chat SQL workload log, finds the columns the heaviest statements
+filter, join and sort on from their EXPLAIN plans, and tries each candidate
+index inside a transaction that is rolled back: the statements are planned
+(and, unless --no-measure, executed with EXPLAIN ANALYZE) with the index in
+place to estimate and measure the speedup. Run from the repository root:
+
+    python -m scripts.index_advisor --top 20
+    python -m scripts.index_advisor --apply
+
+Trying an index builds it for real inside the transaction and holds a lock
+that blocks writes to the table meanwhile, so run it off-peak or against a
+copy of the database. --apply creates the recommended indexes with
+CREATE INDEX CONCURRENTLY, which does not block writes.
+"""
+import argparse
+import json
+import re
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import DBAPIError
+
+from app.config.database import engine
+from app.models import models
+from app.utils.sql_utils import CHAT_RESULT_PAGE_SIZE, paginate_sql
+from app.utils.workload_utils import get_workload, summarize_workload
+
+# Entries with these statuses ran under the read-only guard; "rejected" ones
+# were never executed, so they are not replayed here either
+ANALYZABLE_STATUSES = {"ok", "timeout"}
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+TYPE_CAST = re.compile(r"::(?:\"[^\"]+\"|timestamp (?:with|without) time zone|time (?:with|without) time zone|character varying|double precision|[\w\[\]]+)")
+PARENTHESIZED_NAME = re.compile(r"\(((?:\"?\w+\"?\.)?\"?\w+\"?)\)")
+PREDICATE = re.compile(r"(?:\"?(\w+)\"?\.)?\"?(\w+)\"?\s*(=|<>|<=|>=|<|>|~~)\s*(?:ANY\b)?")
+JOIN_CONDITION = re.compile(r"(?:\"?(\w+)\"?\.)?\"?(\w+)\"?\s*=\s*(?:\"?(\w+)\"?\.)?\"?(\w+)\"?")
+SORT_KEY = re.compile(r"^\s*(?:\"?(\w+)\"?\.)?\"?(\w+)\"?")
+
+# ========= Plan analysis ========= #
+def explain(conn, statement: str, analyze: bool = False):
+    options = "ANALYZE, FORMAT JSON" if analyze else "FORMAT JSON"
+    plan = conn.execute(text(f"EXPLAIN ({options}) {statement}")).scalar()
+    return (json.loads(plan) if isinstance(plan, str) else plan)[0]
+
+def walk(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from walk(child)
+
+def clean_condition(condition: str) -> str:
+    condition = STRING_LITERAL.sub("?", condition)
+    condition = TYPE_CAST.sub("", condition)
+    # (status)::text = ... leaves "(status) = ..." once the cast is gone
+    return PARENTHESIZED_NAME.sub(r"\1", condition)
+
+def resolve(aliases, relations, qualifier, column):
+    """Table owning `column`, using the alias when the plan qualified it"""
+    if qualifier:
+        table = aliases.get(qualifier)
+        return table if table and column in models.Base.metadata.tables[table].c else None
+    owners = [table for table in relations if column in models.Base.metadata.tables[table].c]
+    return owners[0] if len(owners) == 1 else None
+
+def get_plan_columns(plan):
+    """{table: {"eq": [...], "range": [...], "join": [...], "sort": [...]}} referenced by non-indexed plan nodes"""
+    known = models.Base.metadata.tables
+    nodes = list(walk(plan))
+    aliases = {node.get("Alias", node["Relation Name"]): node["Relation Name"] for node in nodes if node.get("Relation Name") in known}
+    usage = {}
+
+    def add(table, kind, column):
+        if table:
+            columns = usage.setdefault(table, {"eq": [], "range": [], "join": [], "sort": []})[kind]
+            if column not in columns:
+                columns.append(column)
+
+    for node in nodes:
+        relations = sorted({aliases[child["Alias"]] for child in walk(node) if child.get("Alias") in aliases})
+        if node.get("Relation Name") in known and node.get("Filter"):
+            # Filters on a scan node refer to that relation only
+            for qualifier, column, operator in PREDICATE.findall(clean_condition(node["Filter"])):
+                table = resolve(aliases, [node["Relation Name"]], qualifier or None, column)
+                add(table, "eq" if operator == "=" else "range", column)
+        for key in ("Hash Cond", "Merge Cond", "Join Filter"):
+            if node.get(key):
+                for left_qualifier, left, right_qualifier, right in JOIN_CONDITION.findall(clean_condition(node[key])):
+                    add(resolve(aliases, relations, left_qualifier or None, left), "join", left)
+                    add(resolve(aliases, relations, right_qualifier or None, right), "join", right)
+        for key in node.get("Sort Key", []):
+            match = SORT_KEY.match(clean_condition(key))
+            if match:
+                add(resolve(aliases, relations, match.group(1), match.group(2)), "sort", match.group(2))
+    return usage
+
+def get_candidates(usage):
+    """Single column indexes for every referenced column, plus equality + range/sort composites"""
+    candidates = set()
+    for table, columns in usage.items():
+        for kind in ("eq", "join", "range", "sort"):
+            for column in columns[kind]:
+                candidates.add((table, (column,)))
+        for column in columns["eq"]:
+            for trailing in columns["range"][:1] + columns["sort"][:1]:
+                if trailing != column:
+                    candidates.add((table, (column, trailing)))
+    return candidates
+
+def get_existing_indexes(conn):
+    inspector = inspect(conn)
+    existing = {}
+    for table in models.Base.metadata.tables:
+        if not inspector.has_table(table):
+            continue
+        indexes = [tuple(index["column_names"]) for index in inspector.get_indexes(table)]
+        indexes.append(tuple(inspector.get_pk_constraint(table)["constrained_columns"]))
+        existing[table] = indexes
+    return existing
+
+def is_covered(columns, indexes):
+    """An existing index starting with the same columns already serves this candidate"""
+    return any(index[:len(columns)] == columns for index in indexes)
+
+def get_index_name(table, columns):
+    return f"ix_{table}_{'_'.join(columns)}"
+
+def get_column_list(columns):
+    # Quoted, some columns are named like keywords (timestamp)
+    return ", ".join(f'"{column}"' for column in columns)
+
+# ========= Measurement ========= #
+def timed(conn, statement: str, runs: int):
+    """Best execution time in ms over `runs` EXPLAIN ANALYZE runs, None on timeout or error"""
+    best = None
+    for _ in range(runs):
+        savepoint = conn.begin_nested()
+        try:
+            plan = explain(conn, statement, analyze=True)
+            best = plan["Execution Time"] if best is None else min(best, plan["Execution Time"])
+            savepoint.commit()
+        except DBAPIError:
+            savepoint.rollback()
+            return None
+    return best
+
+def weighted_ratio(queries, before_key, after_key):
+    before = sum(query["count"] * query[before_key] for query in queries if query.get(before_key) is not None and query.get(after_key) is not None)
+    after = sum(query["count"] * query[after_key] for query in queries if query.get(before_key) is not None and query.get(after_key) is not None)
+    return round(before / after, 2) if after else None
+
+def advise(top: int, entries: int, measure: bool, runs: int, timeout_ms: int, min_speedup: float):
+    workload = summarize_workload(get_workload(entries))
+    statements = [summary for summary in workload if set(summary["statuses"]) & ANALYZABLE_STATUSES][:top]
+
+    with engine.connect() as conn:
+        existing = get_existing_indexes(conn)
+        conn.rollback()
+
+        # Baseline plans, run read-only so a logged statement can never write
+        queries = []
+        with conn.begin():
+            conn.execute(text("SET TRANSACTION READ ONLY"))
+            conn.execute(text(f"SET LOCAL statement_timeout = {int(timeout_ms)}"))
+            for summary in statements:
+                statement = paginate_sql(summary["sql"], CHAT_RESULT_PAGE_SIZE + 1, 0)
+                savepoint = conn.begin_nested()
+                try:
+                    plan = explain(conn, statement)["Plan"]
+                    savepoint.commit()
+                except DBAPIError as e:
+                    savepoint.rollback()
+                    print(f"Skipping statement that no longer plans: {str(e.orig).strip()}")
+                    continue
+                queries.append({
+                    **summary,
+                    "statement": statement,
+                    "usage": get_plan_columns(plan),
+                    "cost_before": plan["Total Cost"],
+                    "ms_before": timed(conn, statement, runs) if measure else None,
+                })
+
+        candidates = {}
+        for query in queries:
+            for table, columns in get_candidates(query["usage"]):
+                if not is_covered(columns, existing.get(table, [])):
+                    candidates.setdefault((table, columns), []).append(query)
+
+        # Try each candidate with the index really built, then throw it away
+        results = []
+        for (table, columns), affected in sorted(candidates.items()):
+            name = get_index_name(table, columns)
+            tried = []
+            # Read-write only for the CREATE INDEX; the logged statements are then
+            # planned and executed read-only, like the chat endpoint runs them
+            with conn.begin() as transaction:
+                try:
+                    conn.execute(text(f"CREATE INDEX {name} ON {table} ({get_column_list(columns)})"))
+                except DBAPIError as e:
+                    print(f"Skipping {name}: {str(e.orig).strip()}")
+                    continue
+                conn.execute(text("SET LOCAL transaction_read_only = on"))
+                conn.execute(text(f"SET LOCAL statement_timeout = {int(timeout_ms)}"))
+                for query in affected:
+                    plan = explain(conn, query["statement"])["Plan"]
+                    tried.append({
+                        "count": query["count"],
+                        "cost_before": query["cost_before"],
+                        "cost_after": plan["Total Cost"],
+                        "ms_before": query["ms_before"],
+                        "ms_after": timed(conn, query["statement"], runs) if measure and query["ms_before"] is not None else None,
+                        "uses_index": any(node.get("Index Name") == name for node in walk(plan)),
+                        "sql": query["sql"],
+                    })
+                transaction.rollback()
+
+            estimated = weighted_ratio(tried, "cost_before", "cost_after")
+            results.append({
+                "table": table,
+                "columns": list(columns),
+                "ddl": f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({get_column_list(columns)})",
+                "statements": len(tried),
+                "executions": sum(query["count"] for query in tried),
+                "used_by": sum(query["uses_index"] for query in tried),
+                "estimated_speedup": estimated,
+                "measured_speedup": weighted_ratio(tried, "ms_before", "ms_after"),
+                "cost_saved": round(sum(query["count"] * (query["cost_before"] - query["cost_after"]) for query in tried), 2),
+                "queries": tried,
+            })
+
+    return {"entries": sum(summary["count"] for summary in workload), "statements": len(queries), "candidates": pick(results, min_speedup)}
+
+def pick(results, min_speedup: float):
+    """Mark the best candidates as recommended, skipping ones an already picked index covers"""
+    results.sort(key=lambda result: result["cost_saved"], reverse=True)
+    picked = {}
+    for result in results:
+        columns = tuple(result["columns"])
+        result["recommended"] = (
+            result["used_by"] > 0
+            and (result["estimated_speedup"] or 0) >= min_speedup
+            and not is_covered(columns, picked.get(result["table"], []))
+        )
+        if result["recommended"]:
+            picked.setdefault(result["table"], []).append(columns)
+    return results
+
+def apply(results):
+    # CONCURRENTLY cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for result in results:
+            if result["recommended"]:
+                print(f"Applying: {result['ddl']}")
+                conn.execute(text(result["ddl"]))
+                result["applied"] = True
+
+def main():
+    parser = argparse.ArgumentParser(description="Propose indexes for the logged chat SQL workload")
+    parser.add_argument("--top", type=int, default=20, help="Heaviest distinct statements to analyze")
+    parser.add_argument("--entries", type=int, default=None, help="Most recent log entries to read (default: all)")
+    parser.add_argument("--runs", type=int, default=3, help="EXPLAIN ANALYZE runs per measurement, the best is kept")
+    parser.add_argument("--timeout-ms", type=int, default=30000)
+    parser.add_argument("--min-speedup", type=float, default=1.2, help="Estimated speedup an index needs to be recommended")
+    parser.add_argument("--no-measure", action="store_true", help="Only compare plan costs, do not execute statements")
+    parser.add_argument("--verbose", action="store_true", help="Include the per-statement numbers")
+    parser.add_argument("--apply", action="store_true", help="Create the recommended indexes")
+    args = parser.parse_args()
+
+    report = advise(args.top, args.entries, not args.no_measure, args.runs, args.timeout_ms, args.min_speedup)
+    if args.apply:
+        apply(report["candidates"])
+    if not args.verbose:
+        for result in report["candidates"]:
+            result.pop("queries")
+    print(json.dumps(report, indent=2, default=str))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+import asyncio
+
+import pytest
+
+from app.config.database import async_engine
+from app.config.redis_client import async_redis_pool
+
+@pytest.fixture
+def run_async():
+    """Run a coroutine in a fresh event loop; pooled Redis and database connections are bound to the loop that opened them"""
+    def run(coro):
+        async def wrapper():
+            try:
+                return await coro
+            finally:
+                await async_redis_pool.disconnect()
+                await async_engine.dispose()
+        return asyncio.run(wrapper())
+    return run
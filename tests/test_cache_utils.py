@@ -0,0 +1,37 @@
+import pytest
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+
+import app.utils.cache_utils as cache_utils
+from app.config.redis_client import redis_client
+
+def test_result_cache_degrades_to_a_miss_when_redis_is_down(monkeypatch, run_async):
+    monkeypatch.setattr(cache_utils, "async_redis_client", aioredis.Redis(port=1, socket_connect_timeout=0.2))
+
+    async def run():
+        key = await cache_utils.get_result_cache_key("SELECT id FROM batches")
+        await cache_utils.store_cached_result("sql_result:any", {"rows": []})
+        return key, await cache_utils.get_cached_result("sql_result:any")
+
+    assert run_async(run()) == (None, None)
+
+def test_result_cache_key_keeps_string_literals_apart(run_async):
+    try:
+        redis_client.ping()
+    except RedisError:
+        pytest.skip("Redis is not reachable")
+
+    async def run():
+        return [
+            await cache_utils.get_result_cache_key(sql) for sql in (
+                "SELECT id FROM employees WHERE name = 'Ann  Lee'",
+                "SELECT id FROM employees WHERE name = 'Ann Lee'",
+                "  SELECT id FROM employees WHERE name = 'Ann Lee';",
+                "SELECT now() FROM employees",
+            )
+        ]
+
+    double_space, single_space, same_with_semicolon, volatile = run_async(run())
+    assert double_space != single_space
+    assert single_space == same_with_semicolon
+    assert volatile is None
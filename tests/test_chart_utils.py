@@ -0,0 +1,61 @@
+import numpy as np
+
+from app.utils.chart_utils import OTHER_LABEL, get_chart_source_sql, group_top, lttb, prepare_chart
+
+def test_lttb_keeps_the_ends_and_the_requested_number_of_points():
+    x = np.arange(1000, dtype=np.float64)
+    y = np.sin(x / 50)
+    indexes = lttb(x, y, 100)
+    assert len(indexes) == 100
+    assert indexes[0] == 0 and indexes[-1] == 999
+    assert np.all(np.diff(indexes) > 0)
+
+def test_lttb_keeps_a_spike():
+    x = np.arange(500, dtype=np.float64)
+    y = np.zeros(500)
+    y[321] = 100
+    assert 321 in lttb(x, y, 20)
+
+def test_lttb_passes_small_series_through():
+    x = np.arange(10, dtype=np.float64)
+    assert list(lttb(x, x, 10)) == list(range(10))
+    assert list(lttb(x, x, 2)) == list(range(10))
+
+def test_group_top_sums_the_remainder_into_other():
+    labels = np.array(["a", "b", "c", "d", "a"], dtype=object)
+    uniques, totals = group_top(labels, np.array([1.0, 5.0, 2.0, 1.0, 1.0]), 3)
+    assert list(uniques) == ["b", "a", OTHER_LABEL]
+    assert list(totals) == [5.0, 2.0, 3.0]
+
+def test_pie_counts_rows_per_label_with_other():
+    rows = [{"id": i, "status": "ABCDEFGHIJ"[i % 10]} for i in range(100)]
+    points, method = prepare_chart("pie_chart", rows)
+    assert method == "top_n"
+    assert len(points) == 8
+    assert points[-1] == {"status": OTHER_LABEL, "count": 30}
+    assert sum(point["count"] for point in points) == 100
+
+def test_pie_of_numbers_only_gets_an_other_slice():
+    rows = [{"year": 2000 + i, "total": i + 1} for i in range(12)]
+    points, method = prepare_chart("pie_chart", rows)
+    assert method == "top_n"
+    assert points[0] == {"year": "2011", "total": 12}
+    assert points[-1] == {"year": OTHER_LABEL, "total": 15}
+
+def test_small_results_are_unchanged():
+    rows = [{"status": "a", "n": 1}, {"status": "b", "n": 2}]
+    assert prepare_chart("pie_chart", rows) == (rows, "none")
+
+def test_events_are_bucketed_by_the_finest_unit_that_fits():
+    rows = [{"timestamp": f"2025-{month:02d}-{day:02d}T{hour}:00:00"} for month in range(1, 13) for day in (1, 10, 20) for hour in (10, 11)]
+    points, method = prepare_chart("bar_chart", rows, max_points=50)
+    assert method == "month_buckets"
+    assert points[0] == {"timestamp": "2025-01", "count": 6}
+    assert len(points) == 12
+
+def test_chart_source_sql_groups_categories_and_projects_series():
+    grouped = get_chart_source_sql("SELECT status FROM batch_tracking -- all;", {"label": "status", "value": None, "date": False})
+    assert grouped.startswith('SELECT "status", COUNT(*) AS count FROM (\nSELECT status FROM batch_tracking -- all\n)')
+    assert grouped.endswith("GROUP BY 1 ORDER BY 2 DESC NULLS LAST")
+    series = get_chart_source_sql("SELECT day, total FROM t", {"label": "day", "value": "total", "date": True})
+    assert series == 'SELECT "day", "total" FROM (\nSELECT day, total FROM t\n) AS chart_source'
@@ -0,0 +1,57 @@
+import app.utils.context_utils as context_utils
+
+def turns(count: int, tokens: int = 100):
+    """`count` user/assistant turns saved at t=1, 2, ..., each message `tokens` long"""
+    history = []
+    for turn in range(count):
+        history.append({"role": "user", "content": f"question {turn}", "ts": float(turn + 1), "tokens": tokens})
+        history.append({"role": "assistant", "content": f"answer {turn}", "ts": float(turn + 1), "tokens": tokens})
+    return history
+
+def build(monkeypatch, run_async, history, budget, covered_until=0.0):
+    folded = []
+
+    async def fake_tail(user_id, max_messages):
+        return history[-max_messages:], len(history)
+
+    async def fake_summary(user_id):
+        return {"summary": "earlier" if covered_until else "", "covered_until": covered_until}
+
+    monkeypatch.setattr(context_utils, "get_chat_tail", fake_tail)
+    monkeypatch.setattr(context_utils, "get_chat_summary", fake_summary)
+    monkeypatch.setattr(context_utils, "schedule_summary", lambda user_id, summary, pending: folded.append([m["content"] for m in pending]))
+    monkeypatch.setattr(context_utils, "CHAT_CONTEXT_TOKEN_BUDGET", budget)
+    monkeypatch.setattr(context_utils, "CHAT_SUMMARY_EVERY_TURNS", 2)
+    messages, usage = run_async(context_utils.build_chat_context("test"))
+    return [message.content for message in messages], usage, folded
+
+def test_everything_that_fits_is_replayed_without_a_summary(monkeypatch, run_async):
+    messages, usage, folded = build(monkeypatch, run_async, turns(3, tokens=10), budget=60)
+    assert messages[0] == "question 0" and len(messages) == 6
+    assert usage["verbatim_tokens"] == 60 and folded == []
+
+def test_turns_over_the_budget_are_left_out_and_folded_in_a_batch(monkeypatch, run_async):
+    messages, usage, folded = build(monkeypatch, run_async, turns(4), budget=400)
+    # Turns 2-3 fit; turns 0-1 are dropped rather than going over the budget
+    assert messages[::2] == ["question 2", "question 3"]
+    assert usage["verbatim_tokens"] == 400 and usage["pending_summary_messages"] == 4
+    assert folded == [["question 0", "answer 0", "question 1", "answer 1"]]
+
+def test_a_batch_also_takes_the_oldest_verbatim_turns_but_never_the_latest(monkeypatch, run_async):
+    messages, usage, folded = build(monkeypatch, run_async, turns(3), budget=400)
+    assert messages[0] == "question 1"
+    assert folded == [["question 0", "answer 0", "question 1", "answer 1"]]
+
+    _, _, folded = build(monkeypatch, run_async, turns(2), budget=200)
+    assert folded == [["question 0", "answer 0"]]
+
+def test_summarized_turns_are_not_replayed(monkeypatch, run_async):
+    messages, usage, folded = build(monkeypatch, run_async, turns(4), budget=1000, covered_until=2.0)
+    assert messages[0] == "Summary of the earlier conversation:\nearlier"
+    assert messages[1::2] == ["question 2", "question 3"]
+    assert usage["summarized_messages"] == 4 and folded == []
+
+def test_the_latest_turn_is_kept_even_over_the_budget(monkeypatch, run_async):
+    messages, usage, folded = build(monkeypatch, run_async, turns(2, tokens=500), budget=100)
+    assert messages[::2] == ["question 1"] and len(messages) == 2
+    assert folded == [["question 0", "answer 0"]]
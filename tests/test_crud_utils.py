@@ -0,0 +1,68 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select, text
+from sqlalchemy.exc import OperationalError
+
+from app.config.database import AsyncSessionLocal, engine
+from app.models import models
+from app.utils.crud_utils import create_row, delete_row, update_row
+
+@pytest.fixture
+def database():
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except OperationalError:
+        pytest.skip("database is not reachable")
+
+# One session per write, as in a request
+async def write(operation, *args, **kwargs):
+    async with AsyncSessionLocal() as db:
+        return await operation(db, *args, **kwargs)
+
+async def refused(operation, *args, **kwargs) -> HTTPException:
+    with pytest.raises(HTTPException) as e:
+        await write(operation, *args, **kwargs)
+    return e.value
+
+def test_versioned_writes_only_apply_to_the_version_read(database, run_async):
+    async def run():
+        department = await write(create_row, models.Department, {"name": "pytest versions"})
+        id = department["id"]
+        try:
+            return (
+                department,
+                await write(update_row, models.Department, id, {"name": "pytest renamed"}, version=1, name="Department"),
+                await refused(update_row, models.Department, id, {"name": "pytest stale"}, version=1, name="Department"),
+                await refused(delete_row, models.Department, id, version=1, name="Department"),
+                await refused(update_row, models.Department, -1, {"name": "pytest"}, name="Department"),
+                await write(update_row, models.Department, id, {"name": "pytest last"}),
+            )
+        finally:
+            await write(delete_row, models.Department, id)
+
+    department, updated, stale_update, stale_delete, missing, unversioned = run_async(run())
+    assert department["version"] == 1
+    assert (updated["name"], updated["version"]) == ("pytest renamed", 2)
+    assert stale_update.status_code == 409 and stale_update.detail == "Department was changed by someone else, it is now at version 2"
+    assert stale_delete.status_code == 409
+    assert missing.status_code == 404 and missing.detail == "Department not found"
+    assert (unversioned["name"], unversioned["version"]) == ("pytest last", 3)
+
+def test_integrity_errors_become_409_or_422(database, run_async):
+    with engine.connect() as conn:
+        email = conn.scalar(select(models.Employee.email).limit(1))
+    if email is None:
+        pytest.skip("no employee to duplicate")
+
+    async def run():
+        return (
+            await refused(create_row, models.Employee, {"name": "pytest duplicate", "email": email}),
+            await refused(create_row, models.Department, {"name": "pytest dangling", "head_id": -1}),
+            await refused(create_row, models.Department, {"name": None}),
+        )
+
+    duplicate, dangling, not_null = run_async(run())
+    assert duplicate.status_code == 409 and f"Key (email)=({email}) already exists" in duplicate.detail
+    assert dangling.status_code == 409 and "Key (head_id)=(-1)" in dangling.detail
+    assert not_null.status_code == 422 and '"name"' in not_null.detail
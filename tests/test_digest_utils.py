@@ -0,0 +1,45 @@
+import json
+
+from app.utils.digest_utils import attach_result, build_result_digest, describe_column, dump_digest, get_sample_indexes
+from app.utils.context_utils import count_tokens
+
+ROWS = [
+    {"id": i, "department": ["Sales", "Engineering", "Support"][i % 3], "salary": 1000 + 10 * i, "joined": f"0{1 + i % 9}-01-2024"}
+    for i in range(30)
+]
+
+def test_numeric_statistics():
+    stats = describe_column([1, 2, 3, None, 10], top_k=5)
+    assert stats == {"kind": "number", "nulls": 1, "min": 1, "max": 10, "mean": 4, "median": 2.5, "sum": 16, "distinct": 4}
+
+def test_text_and_date_statistics():
+    assert describe_column(["a", "b", "a"], top_k=1) == {"kind": "text", "nulls": 0, "distinct": 2, "top": [["a", 2]]}
+    dates = describe_column(["15-03-2024", "01-01-2024", "02-02-2025"], top_k=5)
+    assert (dates["min"], dates["max"]) == ("01-01-2024", "02-02-2025")
+
+def test_sample_spans_the_whole_result():
+    assert list(get_sample_indexes(100, 5)) == [0, 25, 50, 74, 99]
+    assert list(get_sample_indexes(3, 8)) == [0, 1, 2]
+    assert list(get_sample_indexes(0, 8)) == []
+
+def test_digest_scope_follows_has_more():
+    assert build_result_digest({"rows": ROWS, "has_more": False})["scope"] == "full_result"
+    digest = build_result_digest({"rows": ROWS, "has_more": True})
+    assert digest["scope"] == "first_page"
+    assert digest["row_count"] == 30 and digest["more_rows"]
+    assert digest["columns"]["salary"]["sum"] == sum(row["salary"] for row in ROWS)
+
+def test_digest_shrinks_to_the_token_budget():
+    rows = [{f"column_{c}": f"value {r} {c} " * 5 for c in range(20)} for r in range(50)]
+    digest = build_result_digest({"rows": rows, "has_more": False}, token_budget=400)
+    assert count_tokens(dump_digest(digest)) <= 400
+    assert digest["sample"] == []
+    assert digest["columns_not_shown"] > 0
+
+def test_attach_result_fills_components_pointing_at_the_result():
+    page = {"rows": ROWS[:2], "next_cursor": "abc:2"}
+    components = [{"component": "text", "content": "hi"}, {"component": "table", "content": "result"}]
+    attached = attach_result(components, page)
+    assert attached[0] == {"component": "text", "content": "hi"}
+    assert attached[1] == {"component": "table", "content": ROWS[:2], "next_cursor": "abc:2"}
+    assert json.dumps(attached)
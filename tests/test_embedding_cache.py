@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+import redis
+from redis.exceptions import RedisError
+
+import app.config.embedding_cache as embedding_cache
+from app.config.embedding_cache import EMBEDDING_CACHE_TTL_SECONDS, EmbeddingCache
+from app.config.redis_client import redis_client
+
+def test_each_entry_is_its_own_key_with_a_ttl():
+    try:
+        redis_client.ping()
+    except RedisError:
+        pytest.skip("Redis is not reachable")
+
+    cache = EmbeddingCache("test-model")
+    key = cache.redis_key(cache.text_key("How many batches?"))
+    redis_client.delete(key)
+    cache.put("How many batches?", np.array([1.0, 2.0]))
+
+    # A fresh process only has Redis to go on
+    fresh = EmbeddingCache("test-model")
+    assert fresh.contains("how many batches")
+    assert list(fresh.get("how many batches")) == [1.0, 2.0]
+    assert fresh.get_stats()["redis_hits"] == 1
+    assert 0 < redis_client.ttl(key) <= EMBEDDING_CACHE_TTL_SECONDS
+    redis_client.delete(key)
+
+def test_redis_errors_fall_back_to_the_local_tier(monkeypatch):
+    monkeypatch.setattr(embedding_cache, "redis_client", redis.Redis(port=1, socket_connect_timeout=0.2))
+    cache = EmbeddingCache("test-model")
+    cache.put("list vendors", np.array([3.0]))
+    assert list(cache.get("list vendors")) == [3.0]
+    assert cache.get("list assets") is None
+    assert not cache.contains("list assets")
@@ -0,0 +1,54 @@
+import io
+
+import pytest
+from fastapi import HTTPException, UploadFile
+from sqlalchemy import select, text
+from sqlalchemy.exc import OperationalError
+
+import app.utils.import_utils as import_utils
+from app.config.database import AsyncSessionLocal, engine
+from app.models import models
+from app.utils import schemas
+from app.utils.crud_utils import create_row
+
+@pytest.fixture
+def email():
+    try:
+        with engine.connect() as conn:
+            email = conn.scalar(select(models.Employee.email).limit(1))
+    except OperationalError:
+        pytest.skip("database is not reachable")
+    if email is None:
+        pytest.skip("no employee to duplicate")
+    return email
+
+def upload(content: str, filename: str = "employees.csv") -> UploadFile:
+    return UploadFile(file=io.BytesIO(content.encode()), filename=filename)
+
+async def import_employees(file: UploadFile, atomic: bool = False):
+    async with AsyncSessionLocal() as db:
+        return await import_utils.import_rows(db, file, models.Employee, schemas.EmployeeCreate, atomic=atomic)
+
+def test_invalid_rows_are_reported_by_number_across_batches(monkeypatch, email, run_async):
+    monkeypatch.setattr(import_utils, "IMPORT_BATCH_SIZE", 2)
+    rows = "\n".join(f"pytest import {i},pytest-import-{i}@example.com" for i in range(3))
+    content = f"name,email\n{rows}\nno email,\n"
+
+    result = run_async(import_employees(upload(content), atomic=True))
+    assert (result["rows_received"], result["rows_imported"], result["rows_failed"]) == (4, 0, 1)
+    assert [error["row"] for error in result["errors"]] == [4]
+    with engine.connect() as conn:
+        assert conn.scalar(text("SELECT count(*) FROM employees WHERE email LIKE 'pytest-import-%'")) == 0
+
+def test_integrity_errors_match_single_writes(email, run_async):
+    async def run():
+        with pytest.raises(HTTPException) as imported:
+            await import_employees(upload(f'{{"name": "pytest duplicate", "email": "{email}"}}\n', "employees.ndjson"))
+        async with AsyncSessionLocal() as db:
+            with pytest.raises(HTTPException) as created:
+                await create_row(db, models.Employee, {"name": "pytest duplicate", "email": email})
+        return imported.value, created.value
+
+    imported, created = run_async(run())
+    assert imported.status_code == created.status_code == 409
+    assert imported.detail == created.detail
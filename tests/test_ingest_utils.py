@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app.config.database import engine
+from app.utils.ingest_utils import BufferFull, TrackingBuffer
+
+def event(batch_id: int = 1) -> dict:
+    return {"batch_id": batch_id, "handled_by": 1, "location": "Dock 1", "status": "In Transit"}
+
+class RecordingBuffer(TrackingBuffer):
+    """Resolves every event without a database and records the flushes"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.flushed = []
+
+    async def flush(self, events):
+        self.flushed.append(len(events))
+        for i, (_, future) in enumerate(events):
+            future.set_result({"id": i})
+
+def test_a_full_buffer_flushes_at_once_in_flush_size_groups(run_async):
+    async def run():
+        buffer = RecordingBuffer(flush_size=3, flush_interval_ms=60_000)
+        first = buffer.add([event(), event()])
+        timer_armed = buffer.timer is not None
+        rest = buffer.add([event(), event(), event(), event()])
+        results = await asyncio.gather(*first, *rest)
+        return buffer, timer_armed, results
+
+    buffer, timer_armed, results = run_async(run())
+    assert timer_armed and buffer.timer is None
+    assert buffer.flushed == [3, 3]
+    assert [result["id"] for result in results] == [0, 1, 2, 0, 1, 2]
+
+def test_a_partial_buffer_flushes_after_the_interval(run_async):
+    async def run():
+        buffer = RecordingBuffer(flush_size=100, flush_interval_ms=10)
+        futures = buffer.add([event()])
+        flushed_before = list(buffer.flushed)
+        await asyncio.wait_for(futures[0], timeout=1)
+        return buffer, flushed_before
+
+    buffer, flushed_before = run_async(run())
+    assert flushed_before == [] and buffer.flushed == [1]
+    assert buffer.get_stats()["pending"] == 0
+
+def test_adding_past_max_pending_raises_buffer_full(run_async):
+    async def run():
+        buffer = RecordingBuffer(flush_size=100, flush_interval_ms=60_000, max_pending=3)
+        buffer.add([event(), event()])
+        with pytest.raises(BufferFull):
+            buffer.add([event(), event()])
+        pending = len(buffer.pending)
+        await buffer.close()
+        return buffer, pending
+
+    buffer, pending = run_async(run())
+    assert pending == 2
+    assert buffer.flushed == [2] and buffer.get_stats()["events"] == 2
+
+def test_events_for_unknown_batches_are_rejected_without_a_write(run_async):
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except OperationalError:
+        pytest.skip("database is not reachable")
+
+    async def run():
+        buffer = TrackingBuffer(flush_size=1)
+        futures = buffer.add([event(batch_id=-1)])
+        return buffer, await asyncio.wait_for(futures[0], timeout=10)
+
+    buffer, result = run_async(run())
+    assert result == {"error": "Batch not found"}
+    assert buffer.get_stats()["rejected"] == 1 and buffer.get_stats()["committed"] == 0
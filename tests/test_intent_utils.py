@@ -0,0 +1,68 @@
+import pytest
+
+from app.config.embedding_cache import normalize_query
+from app.utils.intent_utils import find_matches, pick_plan
+
+VOCABULARY = {
+    "department": {"engineering": ("Engineering", "Engineering"), "united sales": ("United Sales", "United Sales")},
+    "batch_code": {"b-1001": ("B-1001", "B-1001")},
+}
+
+def plan_for(query: str):
+    return pick_plan(list(find_matches(normalize_query(query))), VOCABULARY)
+
+@pytest.mark.parametrize("query, status", [
+    ("How many batches are in transit?", "IN_TRANSIT"),
+    ("how many batches are currently delivered", "DELIVERED"),
+    ("how many batches are on the way now", "IN_TRANSIT"),
+    ("how many batches are manufactured", "MANUFACTURED"),
+])
+def test_batch_status_resolves_exact_values_and_synonyms(query, status):
+    plan = plan_for(query)
+    assert plan["intent"]["name"] == "batch_count_by_status"
+    assert f"status = '{status}'" in plan["sql"]
+    assert plan["intent"]["confidence"] == 1.0
+
+@pytest.mark.parametrize("query", [
+    "How many batches are undelivered?",
+    "how many batches are not delivered",
+    "how many batches are non-delivered",
+    "how many batches are delivred",
+    "how many batches are in transitt",
+])
+def test_batch_status_is_never_fuzzy_matched(query):
+    assert plan_for(query) is None
+
+def test_department_tolerates_typos():
+    plan = plan_for("how many employees in enginering")
+    assert plan["intent"]["name"] == "employee_count_by_department"
+    assert "d.name = 'Engineering'" in plan["sql"]
+    assert plan["intent"]["confidence"] < 1.0
+
+@pytest.mark.parametrize("query", [
+    "how many employees in non engineering",
+    "how many employees in not engineering",
+    "how many employees in engineering and sales",
+])
+def test_department_negations_and_unknown_values_fall_through(query):
+    assert plan_for(query) is None
+
+def test_batch_code_matches_exactly_and_keeps_case():
+    plan = plan_for("where is batch b-1001?")
+    assert plan["intent"]["name"] == "batch_status"
+    assert "b.batch_code = 'B-1001'" in plan["sql"]
+    assert plan_for("status of batch B-1002") is None
+
+def test_dates_are_parsed_and_inlined_as_literals():
+    plan = plan_for("assets with warranty expiring before 1st March 2026")
+    assert "warranty_until < '2026-03-01'" in plan["sql"]
+    assert plan["text"].endswith("01-03-2026.")
+    assert plan_for("assets with warranty expiring before next quarter") is None
+
+def test_slot_values_are_escaped():
+    vocabulary = {"department": {"o'brien's": ("O'Brien's", "O'Brien's")}}
+    plan = pick_plan(list(find_matches(normalize_query("how many employees in o'brien's"))), vocabulary)
+    assert "d.name = 'O''Brien''s'" in plan["sql"]
+
+def test_other_questions_match_no_template():
+    assert list(find_matches(normalize_query("which vendor services the most assets"))) == []
@@ -0,0 +1,29 @@
+from datetime import date, datetime
+
+import pytest
+from fastapi import HTTPException
+
+from app.models import models
+from app.utils.list_utils import decode_cursor, encode_cursor
+
+def test_cursor_round_trip_keeps_types():
+    keys = [models.Batch.__table__.c.created_at, models.Batch.__table__.c.id]
+    cursor = encode_cursor("created_at", [datetime(2025, 3, 1, 12, 30), 42])
+    assert "=" not in cursor
+    assert decode_cursor(cursor, "created_at", keys) == [datetime(2025, 3, 1, 12, 30), 42]
+
+    keys = [models.Batch.__table__.c.manufactured_date, models.Batch.__table__.c.id]
+    cursor = encode_cursor("manufactured_date", [date(2025, 1, 31), 7])
+    assert decode_cursor(cursor, "manufactured_date", keys) == [date(2025, 1, 31), 7]
+
+def test_cursor_of_another_sort_order_is_rejected():
+    cursor = encode_cursor("id", [5])
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, "created_at", [models.Batch.__table__.c.created_at, models.Batch.__table__.c.id])
+    assert error.value.status_code == 400
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "", encode_cursor("id", ["seven"])])
+def test_malformed_cursor_is_a_bad_request(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, "id", [models.Batch.__table__.c.id])
+    assert error.value.status_code == 400
@@ -0,0 +1,36 @@
+from langchain.schema import AIMessage, HumanMessage, SystemMessage
+
+import app.routers.chat as chat
+from app.utils.prompt_utils import get_instructions, get_schema_block
+
+def schema(table: str) -> dict:
+    return {"metadata": {"table": table, "schema": f"{table}(id)"}, "document": f"All {table}"}
+
+def test_schema_block_does_not_depend_on_retrieval_order():
+    block = get_schema_block([schema("batches"), schema("assets")])
+    assert block == get_schema_block([schema("assets"), schema("batches"), schema("assets")])
+    assert block == "Schemas:\nassets(id), Description: All assets\nbatches(id), Description: All batches"
+
+def test_messages_go_from_the_most_to_the_least_stable_segment(monkeypatch, run_async):
+    history = [HumanMessage(content="how many assets?"), AIMessage(content="42")]
+
+    async def fake_chat_context(user_id):
+        return list(history), {}
+
+    monkeypatch.setattr(chat, "build_chat_context", fake_chat_context)
+    monkeypatch.setattr(chat.vector_store, "get_all_schema_results", lambda: [schema("batches"), schema("assets")])
+
+    monkeypatch.setattr(chat, "CHAT_PROMPT_SCHEMA_MODE", "full")
+    first, usage = run_async(chat.build_messages([schema("assets")], "and batches?"))
+    second, _ = run_async(chat.build_messages([schema("vendors")], "list vendors"))
+    monkeypatch.setattr(chat, "CHAT_PROMPT_SCHEMA_MODE", "retrieved")
+    retrieved, _ = run_async(chat.build_messages([schema("vendors")], "list vendors"))
+
+    assert [type(message) for message in first] == [SystemMessage, SystemMessage, HumanMessage, AIMessage, HumanMessage]
+    assert first[0].content == get_instructions()
+    assert first[2:] == [*history, HumanMessage(content="and batches?")]
+    assert usage["prefix_tokens"] > 0
+    # Every schema in full mode: the prefix is the same text whatever the question
+    assert [message.content for message in first[:2]] == [message.content for message in second[:2]]
+    assert retrieved[0].content == first[0].content
+    assert retrieved[1].content == get_schema_block([schema("vendors")])
@@ -0,0 +1,74 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app.config.database import engine
+from app.config.db_metrics import get_all_statement_stats, reset_db_metrics
+from app.routers import assets, batches, departments, employees, maintenance, vendors
+
+# A list page or a detail read costs one query, plus one SELECT ... IN per
+# expanded collection; many-to-one expansions are joined into the first one.
+app = FastAPI()
+for module in (assets, batches, departments, employees, maintenance, vendors):
+    app.include_router(module.router)
+
+@pytest.fixture(scope="module")
+def client():
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except OperationalError:
+        pytest.skip("database is not reachable")
+    with TestClient(app) as client:
+        yield client
+
+def get_with_count(client, path: str):
+    reset_db_metrics()
+    response = client.get(path)
+    assert response.status_code == 200, response.text
+    return response, get_all_statement_stats()["primary_async"]["statements"]
+
+def first_id(client, path: str) -> int:
+    rows = client.get(path, params={"limit": 1}).json()
+    if not rows:
+        pytest.skip(f"no rows at {path}")
+    return rows[0]["id"]
+
+@pytest.mark.parametrize("path, queries", [
+    ("/batches/?limit=50", 1),
+    ("/batches/?limit=50&expand=product,creator,current_status", 1),
+    ("/batches/?limit=5&expand=product,creator,tracking_records", 2),
+    ("/employees/?limit=50&expand=department", 1),
+    ("/departments/?limit=50&expand=employees,department_head", 2),
+    ("/assets/?limit=50&expand=assigned_employee,department,maintenance_logs,vendors", 3),
+    ("/maintenance/?limit=50&expand=asset,reporter,assigned_employee,assigned_vendor", 1),
+    ("/vendors/?limit=50&expand=assets_link", 2),
+])
+def test_list_query_count_does_not_grow_with_the_page(client, path, queries):
+    response, count = get_with_count(client, path)
+    if not response.json():
+        pytest.skip(f"no rows at {path}")
+    assert count == queries
+
+def test_next_page_costs_one_query(client):
+    first = client.get("/batches/", params={"limit": 5})
+    cursor = first.headers.get("X-Next-Cursor")
+    if cursor is None:
+        pytest.skip("fewer than two pages of batches")
+    response, count = get_with_count(client, f"/batches/?limit=5&cursor={cursor}")
+    assert count == 1
+    assert response.json()[0]["id"] > first.json()[-1]["id"]
+
+@pytest.mark.parametrize("path, expand, queries", [
+    ("/batches/", None, 1),
+    ("/batches/", "product,creator", 1),
+    ("/batches/", "product,tracking_records", 2),
+    ("/departments/", "employees,department_head", 2),
+    ("/assets/", "maintenance_logs,vendors", 3),
+])
+def test_detail_query_count(client, path, expand, queries):
+    id = first_id(client, path)
+    _, count = get_with_count(client, f"{path}{id}" + (f"?expand={expand}" if expand else ""))
+    assert count == queries
@@ -0,0 +1,35 @@
+from app.utils.render_utils import NO_ROWS_MESSAGE, choose_renderer, render_components
+
+def component_of(rows, hint=None):
+    return render_components({"text": "", "component": hint}, {"rows": rows})[-1]["component"]
+
+def test_the_result_shape_picks_the_component():
+    assert component_of([{"count": 12}]) == "number"
+    assert component_of([{"name": "Ann"}]) == "text"
+    assert component_of([{"name": "Ann", "email": "ann@example.com"}]) == "list"
+    assert component_of([{"status": "Delivered", "count": 3}, {"status": "In Transit", "count": 5}]) == "bar_chart"
+    assert component_of([{"day": "2025-01-01", "count": 3}, {"day": "2025-01-02", "count": 5}]) == "bar_chart"
+    assert component_of([{"name": "Ann", "email": "a@x"}, {"name": "Bob", "email": "b@x"}]) == "table"
+
+def test_the_plan_hint_is_kept_only_when_the_shape_allows_it():
+    statuses = [{"status": "Delivered", "count": 3}, {"status": "In Transit", "count": 5}]
+    assert component_of(statuses, "pie_chart") == "pie_chart"
+    assert component_of(statuses, "table") == "table"
+    # Dates, repeated labels and negative values cannot be pie slices
+    assert component_of([{"day": "2025-01-01", "count": 3}, {"day": "2025-01-02", "count": 5}], "pie_chart") == "bar_chart"
+    assert component_of([{"status": "Delivered", "count": 3}, {"status": "Delivered", "count": 5}], "pie_chart") == "table"
+    assert component_of([{"status": "Delivered", "count": -3}, {"status": "In Transit", "count": 5}], "pie_chart") == "bar_chart"
+
+def test_components_carry_the_rows_and_a_templated_fact():
+    page = {"rows": [{"status": "Delivered", "count": 1}, {"status": "In Transit", "count": 3}], "next_cursor": "abc:500"}
+    text, chart = render_components({"text": "Batches by status.", "component": "pie_chart"}, page)
+    assert text == {"component": "text", "content": "Batches by status. The highest count is 3 for In Transit, 75% of the total 4."}
+    assert chart == {"component": "pie_chart", "content": page["rows"], "next_cursor": "abc:500"}
+    assert render_components({"text": "x"}, {"rows": []}) == [{"component": "text", "content": NO_ROWS_MESSAGE}]
+
+def test_auto_mode_asks_the_model_only_for_explanations_and_long_text():
+    page = {"rows": [{"id": 1, "notes": "short"}]}
+    assert choose_renderer("auto", "list batches", page) == "local"
+    assert choose_renderer("auto", "Why are batches late?", page) == "llm"
+    assert choose_renderer("auto", "list notes", {"rows": [{"notes": "x" * 1000}]}) == "llm"
+    assert choose_renderer("local", "explain", page) == "local"
@@ -0,0 +1,47 @@
+import pytest
+from redis.exceptions import RedisError
+
+from app.config.redis_client import redis_client
+from app.utils.sql_utils import get_next_cursor, get_query_id, has_order_by, paginate_sql, resolve_cursor, strip_sql
+
+SQL = "SELECT name FROM employees WHERE name = 'Ann  Lee' -- exact name\nORDER BY name;"
+
+def test_generated_sql_is_wrapped_verbatim():
+    assert paginate_sql(SQL, 10, 20) == (
+        "SELECT * FROM (\nSELECT name FROM employees WHERE name = 'Ann  Lee' -- exact name\nORDER BY name\n)"
+        " AS chat_result LIMIT 10 OFFSET 20"
+    )
+
+def test_only_a_trailing_semicolon_is_stripped():
+    assert strip_sql("  SELECT ';' ;  ") == "SELECT ';'"
+    assert strip_sql("SELECT 1") == "SELECT 1"
+
+def test_query_id_keeps_literals_apart():
+    assert get_query_id(SQL) != get_query_id(SQL.replace("Ann  Lee", "Ann Lee"))
+    assert get_query_id(f"  {SQL}  ") == get_query_id(SQL)
+
+def test_only_a_top_level_order_by_counts():
+    assert has_order_by(SQL)
+    assert has_order_by("SELECT id FROM (SELECT id FROM batches) b ORDER\n  BY id")
+    assert not has_order_by("SELECT id FROM (SELECT id FROM batches ORDER BY id LIMIT 5) b")
+    assert not has_order_by("SELECT 'order by' AS x FROM batches -- order by id")
+    assert not has_order_by("SELECT id, row_number() OVER (ORDER BY id) FROM batches")
+
+def test_result_cursor_round_trip(run_async):
+    try:
+        redis_client.ping()
+    except RedisError:
+        pytest.skip("Redis is not reachable")
+
+    async def run():
+        cursor = await get_next_cursor(SQL, {"has_more": True, "offset": 500, "row_count": 500})
+        last = await get_next_cursor(SQL, {"has_more": False, "offset": 1000, "row_count": 20})
+        unordered = await get_next_cursor("SELECT name FROM employees", {"has_more": True, "offset": 0, "row_count": 500})
+        return cursor, last, unordered, await resolve_cursor(cursor), await resolve_cursor("0000:x"), await resolve_cursor("missing:10")
+
+    cursor, last, unordered, resolved, malformed, missing = run_async(run())
+    assert cursor == f"{get_query_id(SQL)}:1000"
+    assert last is None and unordered is None
+    # The stored statement runs as written, comments and spacing included
+    assert resolved == (strip_sql(SQL), 1000)
+    assert malformed is None and missing is None
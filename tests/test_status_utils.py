@@ -0,0 +1,66 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import delete, insert, select, text
+from sqlalchemy.exc import OperationalError
+
+from app.config.database import AsyncSessionLocal, engine
+from app.models import models
+from app.utils.status_utils import forget_tracking_event, get_latest_events, record_tracking_events
+
+def test_latest_event_per_batch_breaks_timestamp_ties_by_id():
+    rows = [
+        {"batch_id": 1, "id": 10, "timestamp": datetime(2025, 1, 2)},
+        {"batch_id": 1, "id": 11, "timestamp": datetime(2025, 1, 1)},
+        {"batch_id": 2, "id": 12, "timestamp": datetime(2025, 1, 1)},
+        {"batch_id": 2, "id": 13, "timestamp": datetime(2025, 1, 1)},
+    ]
+    assert sorted(row["id"] for row in get_latest_events(rows)) == [10, 13]
+
+def test_current_status_ignores_older_events_and_falls_back_on_delete(run_async):
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            batch_id = conn.scalar(select(models.Batch.id).limit(1))
+            employee_id = conn.scalar(select(models.Employee.id).limit(1))
+    except OperationalError:
+        pytest.skip("database is not reachable")
+    if batch_id is None or employee_id is None:
+        pytest.skip("no batch or employee to track")
+
+    tracking = models.BatchTracking.__table__
+    status = models.BatchCurrentStatus.__table__
+
+    async def track(db, location: str, timestamp: datetime):
+        row = (await db.execute(insert(tracking).values(
+            batch_id=batch_id, handled_by=employee_id, location=location,
+            status=models.BatchStatus.IN_TRANSIT, timestamp=timestamp,
+        ).returning(*tracking.c))).mappings().one()
+        await record_tracking_events(db, [row])
+        return row
+
+    async def current(db):
+        return (await db.execute(select(status.c.tracking_id, status.c.location).where(status.c.batch_id == batch_id))).one()
+
+    async def run():
+        # Everything happens in one transaction that is rolled back
+        async with AsyncSessionLocal() as db:
+            try:
+                newer = await track(db, "Dock 2", datetime(2999, 1, 2))
+                older = await track(db, "Dock 1", datetime(2999, 1, 1))
+                after_late_event = await current(db)
+
+                await db.execute(delete(tracking).where(tracking.c.id == newer["id"]))
+                await forget_tracking_event(db, newer["id"])
+                after_delete = await current(db)
+
+                # Deleting an event that is not the current one leaves the row alone
+                await forget_tracking_event(db, -1)
+                return newer, older, after_late_event, after_delete, await current(db)
+            finally:
+                await db.rollback()
+
+    newer, older, after_late_event, after_delete, unchanged = run_async(run())
+    assert tuple(after_late_event) == (newer["id"], "Dock 2")
+    assert tuple(after_delete) == (older["id"], "Dock 1")
+    assert unchanged == after_delete
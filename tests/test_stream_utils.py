@@ -0,0 +1,28 @@
+import json
+
+import pytest
+
+from app.utils.stream_utils import JsonFieldStreamer, format_sse
+
+def stream(document: str, size: int, field: str = "text") -> str:
+    streamer = JsonFieldStreamer(field)
+    return "".join(streamer.feed(document[i:i + size]) for i in range(0, len(document), size))
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1000])
+def test_field_is_decoded_whatever_the_chunk_size(size):
+    text = 'Line one\nsaid "hi" \\ café ✓'
+    document = json.dumps({"type": "sql", "text": text, "sql": "SELECT 1"})
+    assert stream(document, size) == text
+
+def test_streaming_stops_at_the_end_of_the_field():
+    streamer = JsonFieldStreamer("text")
+    assert streamer.feed('{"text": "ab') == "ab"
+    assert streamer.feed('c", "sql": "SELECT \\"x\\""}') == "c"
+    assert streamer.done
+    assert streamer.feed("more") == ""
+
+def test_missing_field_yields_nothing():
+    assert stream(json.dumps({"type": "generic"}), 4) == ""
+
+def test_format_sse():
+    assert format_sse("token", {"text": "a"}) == 'event: token\ndata: {"text": "a"}\n\n'
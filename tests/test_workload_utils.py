@@ -0,0 +1,51 @@
+import pytest
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+
+import app.utils.workload_utils as workload_utils
+from app.config.redis_client import redis_client
+from app.utils.workload_utils import get_workload, log_statement, summarize_workload
+
+@pytest.fixture
+def workload_key(monkeypatch):
+    try:
+        redis_client.ping()
+    except RedisError:
+        pytest.skip("Redis is not reachable")
+    monkeypatch.setattr(workload_utils, "CHAT_SQL_WORKLOAD_KEY", "chat_sql_workload:test")
+    redis_client.delete("chat_sql_workload:test")
+    yield "chat_sql_workload:test"
+    redis_client.delete("chat_sql_workload:test")
+
+def test_log_keeps_the_newest_entries_up_to_the_cap(monkeypatch, workload_key, run_async):
+    monkeypatch.setattr(workload_utils, "CHAT_SQL_WORKLOAD_MAX_ENTRIES", 2)
+
+    async def run():
+        await log_statement("SELECT 1", 0, "ok", 0.010, rows=1, plan={"total_cost": 1.5, "rows": 1})
+        await log_statement("SELECT 2", 0, "rejected", 0.002)
+        await log_statement("SELECT 3", 500, "timeout", 5.0)
+
+    run_async(run())
+    entries = get_workload()
+    assert [(entry["sql"], entry["status"], entry["offset"]) for entry in entries] == [("SELECT 3", "timeout", 500), ("SELECT 2", "rejected", 0)]
+    assert entries[0]["ms"] == 5000.0 and entries[1]["cost"] is None
+    assert get_workload(limit=1) == entries[:1]
+
+def test_log_is_skipped_when_disabled(monkeypatch, workload_key, run_async):
+    monkeypatch.setattr(workload_utils, "CHAT_SQL_WORKLOAD_ENABLED", False)
+    run_async(log_statement("SELECT 1", 0, "ok", 0.01))
+    assert get_workload() == []
+
+def test_log_survives_redis_errors(monkeypatch, run_async):
+    monkeypatch.setattr(workload_utils, "async_redis_client", aioredis.Redis(port=1, socket_connect_timeout=0.2))
+    run_async(log_statement("SELECT 1", 0, "ok", 0.01))
+
+def test_summary_groups_formatting_variants_heaviest_first():
+    entries = [
+        {"sql": "SELECT id FROM batches", "ms": 5.0, "status": "ok"},
+        {"sql": "SELECT  id\nFROM batches;", "ms": 7.0, "status": "timeout"},
+        {"sql": "SELECT id FROM products", "ms": 10.0, "status": "ok"},
+    ]
+    batches, products = summarize_workload(entries)
+    assert batches == {"sql": "SELECT id FROM batches", "count": 2, "total_ms": 12.0, "max_ms": 7.0, "statuses": {"ok": 1, "timeout": 1}}
+    assert products["count"] == 1